@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Paciente, ConflitoDados
+from .models import Paciente, ConflitoDados, ImportacaoPlanilha, ResultadoLinha, CandidatoDuplicata
 
 
 @admin.register(Paciente)
@@ -73,10 +73,11 @@ class ConflitoDadosAdmin(admin.ModelAdmin):
     list_filter = ['status', 'campo', 'data_conflito']
     search_fields = ['paciente__nome_paciente', 'campo']
     date_hierarchy = 'data_conflito'
+    raw_id_fields = ['paciente', 'importacao']
     
     fieldsets = (
         ('Informações do Conflito', {
-            'fields': ('paciente', 'campo', 'valor_existente', 'valor_novo')
+            'fields': ('paciente', 'importacao', 'campo', 'valor_existente', 'valor_novo')
         }),
         ('Resolução', {
             'fields': ('status', 'valor_escolhido', 'resolvido_por', 'data_resolucao')
@@ -84,3 +85,52 @@ class ConflitoDadosAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ['data_conflito']
+
+
+@admin.register(ImportacaoPlanilha)
+class ImportacaoPlanilhaAdmin(admin.ModelAdmin):
+    list_display = [
+        'nome_arquivo',
+        'tipo_planilha',
+        'status',
+        'linhas_processadas',
+        'total_linhas',
+        'data_criacao'
+    ]
+    list_filter = ['status', 'tipo_planilha', 'tudo_ou_nada', 'pular_inalteradas', 'data_criacao']
+    search_fields = ['nome_arquivo']
+    date_hierarchy = 'data_criacao'
+    
+    readonly_fields = [
+        'total_linhas', 'linhas_processadas', 'novos', 'atualizados',
+        'conflitos', 'erros', 'inalteradas', 'mensagem_erro', 'data_criacao',
+        'data_inicio', 'data_conclusao'
+    ]
+
+
+@admin.register(ResultadoLinha)
+class ResultadoLinhaAdmin(admin.ModelAdmin):
+    list_display = [
+        'importacao',
+        'linha',
+        'status',
+        'paciente_id',
+        'mensagem'
+    ]
+    list_filter = ['status']
+    list_select_related = ('importacao',)
+    raw_id_fields = ['importacao', 'paciente']
+
+
+@admin.register(CandidatoDuplicata)
+class CandidatoDuplicataAdmin(admin.ModelAdmin):
+    list_display = [
+        'paciente',
+        'duplicata',
+        'pontuacao',
+        'status',
+        'data_criacao'
+    ]
+    list_filter = ['status', 'cpf_igual']
+    search_fields = ['paciente__nome_paciente', 'duplicata__nome_paciente']
+    raw_id_fields = ['paciente', 'duplicata']
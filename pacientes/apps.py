@@ -1,6 +1,23 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def garantir_indice_historico(sender, using, **kwargs):
+    """
+    Depois de cada migrate, recria os triggers do índice FTS de histórico
+    caso alguma migração tenha recriado a tabela de pacientes.
+    """
+    from django.db import connections
+    from .busca_textual import garantir_indice_historico as garantir
+    garantir(connections[using])
 
 
 class PacientesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pacientes'
+    
+    def ready(self):
+        post_migrate.connect(garantir_indice_historico, sender=self)
+        # Registra os sinais que invalidam o cache do dashboard
+        # e que mantêm a lista de projetos
+        from . import estatisticas, signals  # noqa: F401
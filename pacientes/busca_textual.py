@@ -0,0 +1,116 @@
+"""
+Busca textual nos campos de histórico clínico usando SQLite FTS5.
+
+A tabela virtual pacientes_paciente_fts é um índice de "conteúdo externo":
+guarda só o índice invertido e lê o texto da própria pacientes_paciente.
+Triggers mantêm o índice em dia em qualquer INSERT/UPDATE/DELETE,
+inclusive bulk_create, bulk_update e QuerySet.update().
+"""
+import re
+
+from django.db.models import F, Q
+
+
+TABELA_FTS = 'pacientes_paciente_fts'
+TABELA_PACIENTE = 'pacientes_paciente'
+
+CAMPOS_HISTORICO = ['historico_materno', 'historico_gravidez', 'historico_familiar', 'info_parto']
+
+_COLUNAS = ', '.join(CAMPOS_HISTORICO)
+_NOVOS = ', '.join(f'new.{campo}' for campo in CAMPOS_HISTORICO)
+_ANTIGOS = ', '.join(f'old.{campo}' for campo in CAMPOS_HISTORICO)
+
+SQL_TABELA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_FTS} USING fts5("
+    f"{_COLUNAS}, content='{TABELA_PACIENTE}', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')"
+)
+
+SQL_TRIGGERS = {
+    f'{TABELA_FTS}_ai': (
+        f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ai AFTER INSERT ON {TABELA_PACIENTE} BEGIN "
+        f"INSERT INTO {TABELA_FTS}(rowid, {_COLUNAS}) VALUES (new.id, {_NOVOS}); "
+        f"END"
+    ),
+    f'{TABELA_FTS}_ad': (
+        f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_ad AFTER DELETE ON {TABELA_PACIENTE} BEGIN "
+        f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {_COLUNAS}) VALUES ('delete', old.id, {_ANTIGOS}); "
+        f"END"
+    ),
+    f'{TABELA_FTS}_au': (
+        f"CREATE TRIGGER IF NOT EXISTS {TABELA_FTS}_au AFTER UPDATE OF {_COLUNAS} ON {TABELA_PACIENTE} BEGIN "
+        f"INSERT INTO {TABELA_FTS}({TABELA_FTS}, rowid, {_COLUNAS}) VALUES ('delete', old.id, {_ANTIGOS}); "
+        f"INSERT INTO {TABELA_FTS}(rowid, {_COLUNAS}) VALUES (new.id, {_NOVOS}); "
+        f"END"
+    ),
+}
+
+
+def fts_disponivel(connection):
+    return connection.vendor == 'sqlite'
+
+
+def garantir_indice_historico(connection):
+    """
+    Cria a tabela FTS e os triggers se não existirem. Se algum trigger
+    estava faltando (o SQLite os descarta quando uma migração recria a
+    tabela de pacientes), reconstrói o índice a partir dos dados atuais.
+    """
+    if not fts_disponivel(connection):
+        return
+    
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+            [TABELA_PACIENTE]
+        )
+        existentes = {linha[0] for linha in cursor.fetchall()}
+        
+        cursor.execute(SQL_TABELA)
+        for sql in SQL_TRIGGERS.values():
+            cursor.execute(sql)
+        
+        if not set(SQL_TRIGGERS) <= existentes:
+            cursor.execute(f"INSERT INTO {TABELA_FTS}({TABELA_FTS}) VALUES ('rebuild')")
+
+
+def remover_indice_historico(connection):
+    if not fts_disponivel(connection):
+        return
+    
+    with connection.cursor() as cursor:
+        for nome in SQL_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        cursor.execute(f"DROP TABLE IF EXISTS {TABELA_FTS}")
+
+
+def montar_consulta(texto):
+    """
+    Converte o texto digitado em uma consulta FTS5 segura: cada palavra
+    vira um termo entre aspas com busca por prefixo, e todos precisam aparecer.
+    Ex.: 'parto prematuro' -> '"parto"* "prematuro"*'
+    """
+    palavras = re.findall(r'\w+', texto)
+    return ' '.join(f'"{palavra}"*' for palavra in palavras)
+
+
+def filtrar_por_historico(queryset, texto, connection):
+    """
+    Filtra os pacientes cujo histórico clínico contém as palavras de `texto`,
+    ordenados por relevância (bm25) quando o FTS5 está disponível.
+    Em outros bancos, cai para icontains em cada campo.
+    """
+    consulta = montar_consulta(texto)
+    if not consulta:
+        return queryset
+    
+    if not fts_disponivel(connection):
+        filtro = Q()
+        for campo in CAMPOS_HISTORICO:
+            filtro |= Q(**{f'{campo}__icontains': texto})
+        return queryset.filter(filtro)
+    
+    # JOIN com a tabela FTS (IndiceHistorico); o rank vem da própria consulta
+    return queryset.filter(indice_historico__consulta__casa=consulta).annotate(
+        relevancia=F('indice_historico__rank')
+    ).order_by('relevancia', 'id')
@@ -0,0 +1,92 @@
+"""
+Estatísticas do dashboard, guardadas em cache até a próxima escrita.
+
+Qualquer save/delete de Paciente ou ConflitoDados invalida o cache por
+sinal. Operações em massa (bulk_create, bulk_update, QuerySet.update) não
+disparam sinais, então quem as usa registra invalidar_estatisticas().
+A invalidação é registrada com transaction.on_commit: dentro de uma
+transação, limpar o cache antes do commit deixaria uma requisição no meio
+do caminho guardar de novo as contagens antigas (fora de transação, ela
+roda na hora).
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Paciente, ConflitoDados
+
+
+CHAVE_CACHE = 'pacientes:estatisticas'
+
+# Rede de segurança caso alguma escrita não invalide o cache
+TEMPO_CACHE = 60 * 60
+
+# Campos de amostras biológicas contados no dashboard
+CAMPOS_AMOSTRAS = [
+    'sangue', 'plasma', 'soro', 'pax_gene', 'saliva', 'scu',
+    'placenta', 'placenta_ffpe', 'dna', 'rna', 'proteina',
+]
+
+
+def _preenchido(campo):
+    return ~Q(**{f'{campo}__isnull': True}) & ~Q(**{campo: ''})
+
+
+def calcular_estatisticas():
+    """
+    Calcula todas as estatísticas do dashboard com três consultas.
+    """
+    totais = Paciente.objects.aggregate(
+        total=Count('id'),
+        **{campo: Count('id', filter=_preenchido(campo)) for campo in CAMPOS_AMOSTRAS}
+    )
+    
+    por_projeto = list(
+        Paciente.objects
+        .filter(_preenchido('id_projeto'))
+        .order_by()
+        .values('id_projeto')
+        .annotate(total=Count('id'))
+        .order_by('-total', 'id_projeto')
+    )
+    
+    por_amostra = [
+        {
+            'campo': campo,
+            'nome': Paciente._meta.get_field(campo).verbose_name,
+            'total': totais[campo],
+        }
+        for campo in CAMPOS_AMOSTRAS
+    ]
+    
+    return {
+        'total_pacientes': totais['total'],
+        'conflitos_pendentes': ConflitoDados.objects.filter(status='novo').count(),
+        'por_projeto': por_projeto,
+        'por_amostra': por_amostra,
+    }
+
+
+def obter_estatisticas():
+    """
+    Retorna as estatísticas do cache, recalculando só se tiverem sido invalidadas.
+    """
+    estatisticas = cache.get(CHAVE_CACHE)
+    if estatisticas is None:
+        estatisticas = calcular_estatisticas()
+        cache.set(CHAVE_CACHE, estatisticas, TEMPO_CACHE)
+    return estatisticas
+
+
+def invalidar_estatisticas():
+    cache.delete(CHAVE_CACHE)
+
+
+@receiver(post_save, sender=Paciente)
+@receiver(post_delete, sender=Paciente)
+@receiver(post_save, sender=ConflitoDados)
+@receiver(post_delete, sender=ConflitoDados)
+def invalidar_ao_gravar(sender, **kwargs):
+    transaction.on_commit(invalidar_estatisticas)
@@ -0,0 +1,181 @@
+from collections import namedtuple
+
+from django.db import models
+
+from .models import Paciente
+
+
+# Rótulos das colunas exportadas (Excel/CSV), na ordem de exportação
+ROTULOS_EXPORTACAO = {
+    'id': 'ID',
+    'nome_paciente': 'Nome Paciente',
+    'data_nascimento': 'Data Nascimento',
+    'nome_mae': 'Nome Mãe',
+    'id_projeto': 'ID Projeto',
+    'id_unico': 'ID Único',
+    'projeto_original': 'Projeto Original',
+    'sexo': 'Sexo',
+    'rg': 'RG',
+    'cpf': 'CPF',
+    'cid10': 'CID10',
+    'data_nascimento_mae': 'Data Nascimento Mãe',
+    'id_familiar': 'ID Familiar',
+    'id_lpc_biob': 'ID LPC BIOB',
+    'amostra_biologica': 'Amostra Biológica',
+    'sangue': 'Sangue',
+    'plasma': 'Plasma',
+    'soro': 'Soro',
+    'pax_gene': 'PaxGene',
+    'saliva': 'Saliva',
+    'scu': 'SCU',
+    'placenta': 'Placenta',
+    'placenta_ffpe': 'Placenta FFPE',
+    'dna': 'DNA',
+    'rna': 'RNA',
+    'proteina': 'Proteína',
+    'metiloma': 'Metiloma',
+    'dnam_gene': 'DNAm Gene',
+    'dna_seq': 'DNA Seq',
+    'exoma': 'Exoma',
+    'rna_seq': 'RNA Seq',
+    'mi_rna': 'miRNA',
+    'comprimento_telomerico': 'Comprimento Telomérico',
+    'citocinas': 'Citocinas',
+    'cortisol': 'Cortisol',
+    'exossomos': 'Exossomos',
+    'prs': 'PRS',
+    'outros_bioinfo': 'Outros (Bioinfo)',
+    'historico_materno': 'Histórico Materno',
+    'historico_gravidez': 'Histórico Gravidez',
+    'historico_familiar': 'Histórico Familiar',
+    'info_parto': 'Info Parto',
+    'cars': 'CARS',
+    'qi': 'QI',
+    'comunicacao_vineland': 'Comunicação Vineland',
+    'hab_dia_vineland': 'Hab. Dia a Dia Vineland',
+    'socializacao_vineland': 'Socialização Vineland',
+    'adi_total': 'ADI Total',
+    'cbcl_internal': 'CBCL Internal',
+    'cbcl_external': 'CBCL External',
+    'score_psiquiatrico_mae': 'Score Psiquiátrico Mãe',
+    'score_exposicao_ambiental': 'Score Exposição Ambiental',
+    'score_estresse_materno': 'Score Estresse Materno',
+    'escolaridade_materna': 'Escolaridade Materna',
+    'renda_familiar': 'Renda Familiar',
+    'data_cadastro': 'Data Cadastro',
+    'data_atualizacao': 'Data Atualização',
+}
+
+# Rótulos abreviados usados na visualização para impressão
+ROTULOS_CURTOS = {
+    'comprimento_telomerico': 'Compr. Telomérico',
+    'comunicacao_vineland': 'Com. Vineland',
+    'hab_dia_vineland': 'Hab. Dia Vineland',
+    'socializacao_vineland': 'Soc. Vineland',
+    'score_psiquiatrico_mae': 'Score Psiq. Mãe',
+    'score_exposicao_ambiental': 'Score Exp. Amb.',
+    'score_estresse_materno': 'Score Estresse Mat.',
+    'escolaridade_materna': 'Escolaridade Mat.',
+}
+
+# Campos exportados quando nenhum campo é selecionado
+CAMPOS_PADRAO = ['id', 'nome_paciente', 'data_nascimento', 'nome_mae']
+
+# Quantidade de linhas buscadas por vez no banco durante a exportação
+TAMANHO_BLOCO = 2000
+
+
+ColunaExportacao = namedtuple('ColunaExportacao', ['campo', 'rotulo', 'rotulo_curto', 'formatador', 'texto'])
+
+
+def _formatador(field):
+    """
+    Escolhe o formatador da coluna pelo tipo do campo no modelo.
+    Recebe apenas valores preenchidos.
+    """
+    # DateTimeField é subclasse de DateField, por isso vem primeiro
+    if isinstance(field, models.DateTimeField):
+        return lambda valor: valor.strftime('%d/%m/%Y %H:%M')
+    if isinstance(field, models.DateField):
+        return lambda valor: valor.strftime('%d/%m/%Y')
+    return None
+
+
+def _montar_colunas():
+    """
+    Monta o registro de colunas exportáveis a partir de Paciente._meta.
+    """
+    colunas = {}
+    for campo, rotulo in ROTULOS_EXPORTACAO.items():
+        field = Paciente._meta.get_field(campo)
+        colunas[campo] = ColunaExportacao(
+            campo=campo,
+            rotulo=rotulo,
+            rotulo_curto=ROTULOS_CURTOS.get(campo, rotulo),
+            formatador=_formatador(field),
+            texto=isinstance(field, (models.CharField, models.TextField)),
+        )
+    return colunas
+
+
+COLUNAS_EXPORTACAO = _montar_colunas()
+
+
+def campos_exportacao(campos_selecionados=None):
+    """
+    Lista de campos a exportar: o ID mais os selecionados, ou os 3 campos-chave.
+    """
+    if campos_selecionados:
+        return ['id'] + list(campos_selecionados)
+    return list(CAMPOS_PADRAO)
+
+
+def cabecalhos(campos, curtos=False):
+    """
+    Rótulos das colunas, na ordem dos campos.
+    """
+    if curtos:
+        return [COLUNAS_EXPORTACAO[campo].rotulo_curto for campo in campos]
+    return [COLUNAS_EXPORTACAO[campo].rotulo for campo in campos]
+
+
+def compilar_formatador(campos, vazio='', limite_texto=None):
+    """
+    Compila, uma única vez por exportação, a função que formata uma linha
+    (tupla vinda de values_list) em uma lista de valores prontos para saída.
+    - vazio: valor usado para campos não preenchidos
+    - limite_texto: trunca textos maiores que esse tamanho (com '...')
+    """
+    funcoes = []
+    for campo in campos:
+        coluna = COLUNAS_EXPORTACAO[campo]
+        funcao = coluna.formatador
+        if funcao is None and coluna.texto and limite_texto:
+            funcao = _truncador(limite_texto)
+        funcoes.append(funcao or _identidade)
+    
+    def formatar(valores):
+        return [funcao(valor) if valor else vazio for funcao, valor in zip(funcoes, valores)]
+    
+    return formatar
+
+
+def _identidade(valor):
+    return valor
+
+
+def _truncador(limite):
+    def truncar(valor):
+        return valor[:limite - 3] + '...' if len(valor) > limite else valor
+    return truncar
+
+
+def iterar_linhas(pacientes, campos, **opcoes):
+    """
+    Percorre o queryset buscando apenas as colunas pedidas (values_list)
+    em blocos, e gera cada linha já formatada.
+    Aceita as mesmas opções de compilar_formatador.
+    """
+    formatar = compilar_formatador(campos, **opcoes)
+    for valores in pacientes.values_list(*campos).iterator(chunk_size=TAMANHO_BLOCO):
+        yield formatar(valores)
@@ -76,6 +76,20 @@ class UploadPlanilhaForm(forms.Form):
         initial=False,
         help_text='Se marcado, dados conflitantes serão atualizados sem perguntar. Se desmarcado, você será questionado sobre conflitos.'
     )
+    
+    tudo_ou_nada = forms.BooleanField(
+        label='Importar tudo ou nada',
+        required=False,
+        initial=False,
+        help_text='Se marcado, uma linha com erro cancela a importação inteira. Se desmarcado, as linhas com erro são apenas reportadas.'
+    )
+    
+    pular_inalteradas = forms.BooleanField(
+        label='Pular linhas já importadas sem alteração',
+        required=False,
+        initial=True,
+        help_text='Se marcado, as linhas idênticas às de importações anteriores não são processadas de novo. Desmarque para reaplicar a planilha inteira (ex.: para preencher de novo campos apagados manualmente).'
+    )
 
 
 class ResolverConflitoForm(forms.Form):
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pacientes.vinculacao import LIMIAR_PADRAO, gravar_candidatos
+
+
+class Command(BaseCommand):
+    """
+    Roda a vinculação aproximada de registros sobre todos os pacientes e
+    grava os pares prováveis de duplicatas para revisão (ver vinculacao.py).
+    """
+    help = 'Procura pacientes duplicados por semelhança (nomes, data de nascimento e CPF)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limiar',
+            type=float,
+            default=LIMIAR_PADRAO,
+            help='Pontuação mínima (0 a 1) para registrar um par como candidato'
+        )
+    
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        
+        def progresso(total):
+            self.stdout.write(f'{total} par(es) encontrado(s)...')
+        
+        total = gravar_candidatos(options['limiar'], progresso=progresso)
+        
+        self.stdout.write(self.style.SUCCESS(
+            f'Concluído em {time.perf_counter() - inicio:.1f}s: {total} par(es) com pontuação '
+            f'>= {options["limiar"]:.2f}. Revise em Duplicatas.'
+        ))
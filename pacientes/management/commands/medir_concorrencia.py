@@ -0,0 +1,178 @@
+import multiprocessing
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, connections
+from django.test import RequestFactory
+
+from pacientes.utils import importar_planilha
+from pacientes.views import listar_pacientes
+
+
+# Perfil padrão do Django: journal_mode=DELETE, BEGIN DEFERRED, sem PRAGMAs,
+# conexão nova a cada requisição
+PERFIL_PADRAO = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'CONN_MAX_AGE': 0,
+    'CONN_HEALTH_CHECKS': False,
+    'OPTIONS': {},
+}
+
+
+def gerar_planilha(linhas, semente):
+    """
+    CSV sintético de Amostras Biológicas, com parte das linhas repetindo
+    pacientes (para gerar atualizações e conflitos).
+    """
+    aleatorio = random.Random(semente)
+    conteudo = ['Nome paciente,Data de nascimento,Nome da mãe,ID_Projeto,Sexo,CPF,Sangue,DNA']
+    for i in range(linhas):
+        numero = aleatorio.randrange(linhas) if aleatorio.random() < 0.2 else i
+        conteudo.append(
+            f'Paciente {semente} {numero},{1 + numero % 28:02d}/{1 + numero % 12:02d}/{1990 + numero % 30},'
+            f'Mae {numero},P{numero % 7},{"MF"[numero % 2]},,{aleatorio.choice(["sim", "nao", ""])},'
+            f'{aleatorio.randrange(3)}'
+        )
+    return '\n'.join(conteudo).encode()
+
+
+def importar(planilha, fila):
+    """
+    Processo de importação: importa a planilha em lotes, como o worker.
+    """
+    inicio = time.perf_counter()
+    try:
+        resultados = importar_planilha(ContentFile(planilha, name='medicao.csv'), 'amostras', em_lote=True)
+        fila.put(('importacao', time.perf_counter() - inicio, resultados['erros'], None))
+    except OperationalError as e:
+        fila.put(('importacao', time.perf_counter() - inicio, None, str(e)))
+    finally:
+        connection.close()
+
+
+def ler(parar, fila):
+    """
+    Processo leitor: abre a lista de pacientes em loop até `parar`.
+    """
+    fabrica = RequestFactory()
+    tempos = []
+    erros = 0
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        try:
+            listar_pacientes(fabrica.get('/'))
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        except OperationalError:
+            erros += 1
+        # Simula o fim da requisição (fecha a conexão se CONN_MAX_AGE=0)
+        connection.close_if_unusable_or_obsolete()
+    connection.close()
+    fila.put(('leitura', tempos, erros, None))
+
+
+class Command(BaseCommand):
+    """
+    Mede a lista de pacientes enquanto planilhas são importadas ao mesmo
+    tempo (processos separados, como o servidor web e os workers), com o
+    SQLite no perfil padrão do Django e no perfil de produção
+    (settings.SQLITE_PERFIL_PRODUCAO). Cada medição usa um banco temporário novo: o banco
+    configurado não é alterado.
+    """
+    help = 'Mede leituras durante importações com o perfil padrão e o de produção do SQLite'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas',
+            type=int,
+            default=20000,
+            help='Linhas de cada planilha sintética'
+        )
+        parser.add_argument(
+            '--importacoes',
+            type=int,
+            default=2,
+            help='Importações simultâneas (como vários workers)'
+        )
+        parser.add_argument(
+            '--leitores',
+            type=int,
+            default=4,
+            help='Processos abrindo a lista de pacientes durante as importações'
+        )
+    
+    def handle(self, *args, **options):
+        configuracao = connections.settings['default']
+        original = {
+            chave: configuracao[chave]
+            for chave in ('NAME', 'ENGINE', 'CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'OPTIONS')
+        }
+        perfis = {
+            'padrão': PERFIL_PADRAO,
+            'produção': settings.SQLITE_PERFIL_PRODUCAO,
+        }
+        planilhas = [gerar_planilha(options['linhas'], semente) for semente in range(options['importacoes'])]
+        
+        try:
+            with tempfile.TemporaryDirectory() as pasta:
+                for numero, (nome, perfil) in enumerate(perfis.items()):
+                    self.stdout.write(self.style.MIGRATE_HEADING(f'Perfil {nome}'))
+                    self.configurar(Path(pasta) / f'medicao_{numero}.sqlite3', perfil)
+                    call_command('migrate', verbosity=0)
+                    self.medir(planilhas, options['leitores'])
+        finally:
+            self.configurar(original['NAME'], original)
+    
+    def configurar(self, nome, perfil):
+        """
+        Troca o banco 'default' (as conexões são recriadas com a nova configuração).
+        """
+        connections.close_all()
+        connections.settings['default'].update(perfil, NAME=nome)
+        del connections['default']
+    
+    def medir(self, planilhas, quantidade_leitores):
+        # Os processos filhos abrem as próprias conexões
+        connections.close_all()
+        contexto = multiprocessing.get_context('fork')
+        parar = contexto.Event()
+        fila = contexto.Queue()
+        
+        leitores = [contexto.Process(target=ler, args=(parar, fila)) for _ in range(quantidade_leitores)]
+        importacoes = [contexto.Process(target=importar, args=(planilha, fila)) for planilha in planilhas]
+        for processo in leitores + importacoes:
+            processo.start()
+        
+        resultados = {'importacao': [], 'leitura': []}
+        while len(resultados['importacao']) < len(importacoes):
+            tipo, *resultado = fila.get()
+            resultados[tipo].append(resultado)
+        parar.set()
+        while len(resultados['leitura']) < len(leitores):
+            tipo, *resultado = fila.get()
+            resultados[tipo].append(resultado)
+        for processo in leitores + importacoes:
+            processo.join()
+        
+        for duracao, erros, falha in resultados['importacao']:
+            if falha:
+                self.stdout.write(self.style.ERROR(f'Importação interrompida após {duracao:.1f} s: {falha}'))
+            else:
+                self.stdout.write(f'Importação: {duracao:.1f} s, {erros} linha(s) com erro')
+        
+        tempos = sorted(tempo for lista, _, _ in resultados['leitura'] for tempo in lista)
+        erros = sum(erros for _, erros, _ in resultados['leitura'])
+        if not tempos:
+            self.stdout.write(self.style.ERROR(f'Nenhuma leitura concluída ({erros} com erro)'))
+            return
+        self.stdout.write(
+            f'Leituras: {len(tempos)} (mediana {statistics.median(tempos):.1f} ms, '
+            f'p95 {tempos[int(len(tempos) * 0.95)]:.1f} ms, máx {tempos[-1]:.1f} ms), '
+            f'{erros} com "database is locked"'
+        )
@@ -0,0 +1,191 @@
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.utils import timezone
+
+from pacientes.models import Paciente, ConflitoDados
+
+
+# Índices de ConflitoDados (migração 0013) e a restrição de unicidade (0012)
+INDICES_CONFLITOS = [indice.name for indice in ConflitoDados._meta.indexes] + [
+    restricao.name for restricao in ConflitoDados._meta.constraints
+]
+
+CAMPOS = ['sexo', 'cpf', 'rg', 'id_projeto', 'dna', 'sangue', 'plasma', 'qi', 'cars', 'nome_mae']
+
+TAMANHO_PAGINA = 50
+
+
+class Command(BaseCommand):
+    """
+    Mede a latência das consultas de conflitos (contagem, fila, fila por
+    campo, página seguinte e conflitos de um paciente) com uma massa de dados
+    sintética, com e sem os índices de ConflitoDados.
+    A medição usa um banco temporário novo: o banco configurado não é
+    alterado nem fica travado (pelo app ou pelo worker) durante a medição.
+    """
+    help = 'Mede as consultas de conflitos com e sem os índices de ConflitoDados'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--linhas',
+            type=int,
+            default=1_000_000,
+            help='Quantidade de conflitos sintéticos'
+        )
+        parser.add_argument(
+            '--pendentes',
+            type=float,
+            default=0.2,
+            help='Fração dos conflitos que ficam pendentes'
+        )
+        parser.add_argument(
+            '--repeticoes',
+            type=int,
+            default=5,
+            help='Execuções de cada consulta (é mostrada a mediana)'
+        )
+    
+    def handle(self, *args, **options):
+        configuracao = connections.settings['default']
+        original = {chave: configuracao[chave] for chave in ('NAME', 'ENGINE', 'CONN_MAX_AGE', 'OPTIONS')}
+        
+        try:
+            with tempfile.TemporaryDirectory() as pasta:
+                self.configurar(Path(pasta) / 'medicao_conflitos.sqlite3', original)
+                call_command('migrate', verbosity=0)
+                self.comparar(options)
+        finally:
+            self.configurar(original['NAME'], original)
+    
+    def configurar(self, nome, perfil):
+        """
+        Troca o banco 'default' (as conexões são recriadas com a nova configuração).
+        """
+        connections.close_all()
+        connections.settings['default'].update(perfil, NAME=nome)
+        del connections['default']
+    
+    def comparar(self, options):
+        with transaction.atomic():
+            self.popular(options['linhas'], options['pendentes'])
+        
+        self.stdout.write(self.style.MIGRATE_HEADING('Com os índices'))
+        com_indices = self.medir(options['repeticoes'])
+        
+        self.remover_indices()
+        self.stdout.write(self.style.MIGRATE_HEADING('Sem os índices (apenas o índice da FK)'))
+        sem_indices = self.medir(options['repeticoes'])
+        
+        self.stdout.write(self.style.MIGRATE_HEADING('Resumo (ms)'))
+        for nome in com_indices:
+            self.stdout.write(
+                f'{nome:<20} {sem_indices[nome]:>10.2f} -> {com_indices[nome]:>8.2f}'
+            )
+        
+        # Fecha a conexão antes de a pasta temporária ser apagada
+        connections.close_all()
+    
+    def popular(self, linhas, fracao_pendentes):
+        self.stdout.write(f'Gerando {linhas} conflitos sintéticos...')
+        aleatorio = random.Random(0)
+        
+        quantidade_pacientes = max(linhas // 20, 1)
+        agora = timezone.now()
+        pacientes = Paciente.objects.bulk_create([
+            Paciente(
+                nome_paciente=f'Paciente Medicao {i}',
+                nome_paciente_normalizado=f'paciente medicao {i}',
+                data_nascimento=agora.date(),
+                nome_mae=f'Mae Medicao {i}',
+                nome_mae_normalizado=f'mae medicao {i}',
+                id_unico=f'MEDICAO{i}',
+            )
+            for i in range(quantidade_pacientes)
+        ], batch_size=1000)
+        ids_pacientes = [paciente.pk for paciente in pacientes]
+        self.paciente_exemplo = ids_pacientes[0]
+        
+        tabela = ConflitoDados._meta.db_table
+        sql = (
+            f'INSERT INTO {tabela} '
+            '(paciente_id, campo, valor_existente, valor_novo, status, data_conflito) '
+            'VALUES (%s, %s, %s, %s, %s, %s)'
+        )
+        with connection.cursor() as cursor:
+            for inicio in range(0, linhas, 10000):
+                cursor.executemany(sql, [
+                    (
+                        aleatorio.choice(ids_pacientes),
+                        aleatorio.choice(CAMPOS),
+                        'antigo',
+                        f'novo {i}',
+                        'novo' if aleatorio.random() < fracao_pendentes else 'resolvido',
+                        agora - timedelta(seconds=linhas - i),
+                    )
+                    for i in range(inicio, min(inicio + 10000, linhas))
+                ])
+            cursor.execute('ANALYZE')
+    
+    def remover_indices(self):
+        tabela = ConflitoDados._meta.db_table
+        with connection.cursor() as cursor:
+            for indice in INDICES_CONFLITOS:
+                cursor.execute(f'DROP INDEX IF EXISTS {indice}')
+            cursor.execute(f'CREATE INDEX medicao_paciente_fk ON {tabela} (paciente_id)')
+            cursor.execute('ANALYZE')
+    
+    def consultas(self):
+        pendentes = ConflitoDados.objects.filter(status='novo')
+        fila = pendentes.order_by('-data_conflito', '-id')
+        # Cursor de uma página no meio da fila
+        posicao = min(TAMANHO_PAGINA * 100, max(pendentes.count() - 1, 0))
+        meio = fila.values_list('data_conflito', 'id')[posicao]
+        
+        return {
+            'contagem': lambda: pendentes.count(),
+            'fila': lambda: list(fila[:TAMANHO_PAGINA + 1]),
+            'fila por campo': lambda: list(fila.filter(campo='cpf')[:TAMANHO_PAGINA + 1]),
+            'página seguinte': lambda: list(
+                fila.filter(data_conflito__lte=meio[0])
+                .exclude(data_conflito=meio[0], id__gte=meio[1])[:TAMANHO_PAGINA + 1]
+            ),
+            'paciente': lambda: list(pendentes.filter(paciente_id=self.paciente_exemplo)),
+        }
+    
+    def medir(self, repeticoes):
+        resultados = {}
+        
+        for nome, consulta in self.consultas().items():
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                consulta()
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            resultados[nome] = statistics.median(tempos)
+            
+            plano = self.plano(consulta)
+            self.stdout.write(f'{nome:<20} {resultados[nome]:>10.2f} ms   {plano}')
+        
+        return resultados
+    
+    def plano(self, consulta):
+        """
+        Plano de execução (EXPLAIN QUERY PLAN) da última consulta executada.
+        """
+        with connection.execute_wrapper(self._capturar):
+            consulta()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {self._sql}', self._parametros)
+            return ' | '.join(linha[-1] for linha in cursor.fetchall())
+    
+    def _capturar(self, execute, sql, params, many, context):
+        self._sql, self._parametros = sql, params
+        return execute(sql, params, many, context)
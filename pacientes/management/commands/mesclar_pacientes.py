@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from pacientes.models import CandidatoDuplicata
+from pacientes.mesclagem import mesclar_em_lote, pares_de_candidatos
+
+
+class Command(BaseCommand):
+    """
+    Mescla pacientes duplicados numa única transação (ver mesclagem.py):
+    pares informados como PRINCIPAL:SECUNDARIO (ids) ou os candidatos a
+    duplicata pendentes acima de uma pontuação.
+    """
+    help = 'Mescla pacientes duplicados (o secundário é incorporado ao principal e removido)'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'pares',
+            nargs='*',
+            help='Pares de ids no formato PRINCIPAL:SECUNDARIO'
+        )
+        parser.add_argument(
+            '--candidatos',
+            type=float,
+            metavar='PONTUACAO_MINIMA',
+            help='Mescla os candidatos a duplicata pendentes com pontuação >= o valor informado'
+        )
+    
+    def handle(self, *args, **options):
+        pares = []
+        for par in options['pares']:
+            try:
+                principal, secundario = (int(pk) for pk in par.split(':'))
+            except ValueError:
+                raise CommandError(f'Par inválido: {par} (use PRINCIPAL:SECUNDARIO)')
+            pares.append((principal, secundario))
+        
+        if options['candidatos'] is not None:
+            candidatos = CandidatoDuplicata.objects.filter(
+                status='pendente',
+                pontuacao__gte=options['candidatos']
+            ).order_by('-pontuacao', 'id')
+            pares.extend(pares_de_candidatos(candidatos))
+        
+        if not pares:
+            raise CommandError('Informe pares PRINCIPAL:SECUNDARIO ou --candidatos PONTUACAO_MINIMA')
+        
+        try:
+            resultados = mesclar_em_lote(pares)
+        except Exception as e:
+            raise CommandError(f'Nenhuma mesclagem foi gravada: {e}')
+        
+        for principal, secundario_id, campos_atualizados, conflitos in resultados:
+            self.stdout.write(
+                f'#{secundario_id} -> #{principal.pk} {principal.nome_paciente}: '
+                f'{len(campos_atualizados)} campo(s) preenchido(s), {len(conflitos)} conflito(s)'
+            )
+        
+        self.stdout.write(self.style.SUCCESS(f'{len(resultados)} paciente(s) mesclado(s).'))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from pacientes.models import ImportacaoPlanilha
+from pacientes.utils import processar_importacao
+
+
+class Command(BaseCommand):
+    """
+    Worker que processa a fila de planilhas enviadas pelo upload.
+    Vários workers podem rodar ao mesmo tempo para importar planilhas em paralelo.
+    A cada volta, as importações abandonadas por um worker que morreu são
+    marcadas como erro (ver ImportacaoPlanilha.encerrar_abandonadas).
+    """
+    help = 'Processa as importações de planilhas pendentes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--uma-vez',
+            action='store_true',
+            help='Processa as importações pendentes e encerra, em vez de aguardar novas'
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2.0,
+            help='Segundos de espera entre consultas à fila quando ela está vazia'
+        )
+    
+    def handle(self, *args, **options):
+        while True:
+            for abandonada in ImportacaoPlanilha.encerrar_abandonadas():
+                self.stdout.write(self.style.WARNING(
+                    f'{abandonada.nome_arquivo} (#{abandonada.pk}) estava sem atividade e foi encerrada'
+                ))
+            
+            importacao = ImportacaoPlanilha.reservar_proxima()
+            
+            if importacao is None:
+                if options['uma_vez']:
+                    return
+                time.sleep(options['intervalo'])
+                continue
+            
+            self.stdout.write(f'Processando {importacao.nome_arquivo} (#{importacao.pk})...')
+            importacao = processar_importacao(importacao)
+            
+            if importacao.status == 'erro':
+                self.stdout.write(self.style.ERROR(f'Erro: {importacao.mensagem_erro}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Concluída! Novos: {importacao.novos}, '
+                    f'Atualizados: {importacao.atualizados}, '
+                    f'Conflitos: {importacao.conflitos}, '
+                    f'Erros: {importacao.erros}'
+                ))
@@ -0,0 +1,180 @@
+"""
+Mesclagem de pacientes duplicados: o paciente principal (que permanece)
+recebe os dados do secundário, que é removido.
+- campos vazios no principal são preenchidos com os valores do secundário
+- valores divergentes viram ConflitoDados pendentes no principal
+- os conflitos do secundário passam para o principal (os pendentes são
+  comparados com o valor atual do principal)
+- os outros pares de possíveis duplicatas do secundário passam para o principal
+- as assinaturas de linhas importadas do secundário passam para o principal,
+  para que reimportar a planilha não recrie o secundário
+"""
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .models import Paciente, ConflitoDados, CandidatoDuplicata, AssinaturaLinha
+from .estatisticas import invalidar_estatisticas
+from .utils import comparar_dados, mesmo_valor
+
+
+# Campos de dados do paciente considerados na mesclagem (sem id, ID único,
+# datas de cadastro/atualização e campos normalizados)
+CAMPOS_MESCLAGEM = [
+    campo.name for campo in Paciente._meta.concrete_fields
+    if campo.editable and not campo.primary_key
+]
+
+
+def _transferir_conflitos_pendentes(principal, secundario):
+    """
+    Passa os conflitos pendentes do secundário para o principal, com o valor
+    atual do principal como valor existente. Os que já estão pendentes no
+    principal, ou cujo valor novo já é o valor do principal, são descartados.
+    """
+    pendentes_principal = ConflitoDados.objects.filter(
+        paciente=principal,
+        status='novo',
+        campo=OuterRef('campo'),
+        valor_novo=OuterRef('valor_novo')
+    )
+    pendentes = ConflitoDados.objects.filter(paciente=secundario, status='novo')
+    pendentes.filter(Exists(pendentes_principal)).delete()
+    
+    transferidos = []
+    descartados = []
+    for conflito in pendentes:
+        valor_atual = getattr(principal, conflito.campo)
+        if valor_atual is not None and mesmo_valor(valor_atual, conflito.valor_novo):
+            descartados.append(conflito.pk)
+            continue
+        conflito.paciente = principal
+        conflito.valor_existente = '' if valor_atual is None else str(valor_atual)
+        transferidos.append(conflito)
+    
+    ConflitoDados.objects.filter(pk__in=descartados).delete()
+    ConflitoDados.objects.bulk_update(transferidos, ['paciente', 'valor_existente'])
+
+
+def _transferir_candidatos(principal, secundario):
+    """
+    Recria os pares de possíveis duplicatas do secundário com o principal
+    (com o menor id em `paciente`), para que continuem na revisão. Pares
+    com o próprio principal ou que ele já tem são ignorados; os antigos
+    somem junto com o secundário.
+    """
+    candidatos = CandidatoDuplicata.objects.filter(Q(paciente=secundario) | Q(duplicata=secundario))
+    
+    novos = []
+    for candidato in candidatos:
+        outro = candidato.duplicata_id if candidato.paciente_id == secundario.pk else candidato.paciente_id
+        if outro == principal.pk:
+            continue
+        candidato.pk = None
+        candidato.paciente_id, candidato.duplicata_id = sorted([principal.pk, outro])
+        novos.append(candidato)
+    
+    CandidatoDuplicata.objects.bulk_create(novos, ignore_conflicts=True)
+
+
+def _transferir_assinaturas(principal, secundario):
+    """
+    Passa as assinaturas de linhas do secundário para o principal (as que ele
+    já tem são ignoradas). Sem isso elas somem com o secundário e a próxima
+    reimportação da planilha o cadastraria de novo.
+    """
+    assinaturas = AssinaturaLinha.objects.filter(paciente=secundario)
+    AssinaturaLinha.objects.bulk_create(
+        [
+            AssinaturaLinha(paciente=principal, tipo_planilha=tipo_planilha, assinatura=assinatura)
+            for tipo_planilha, assinatura in assinaturas.values_list('tipo_planilha', 'assinatura')
+        ],
+        ignore_conflicts=True
+    )
+    assinaturas.delete()
+
+
+def mesclar_pacientes(principal, secundario):
+    """
+    Mescla `secundario` em `principal` e remove o secundário, numa transação.
+    Retorna (campos preenchidos, conflitos criados).
+    """
+    dados = {campo: getattr(secundario, campo) for campo in CAMPOS_MESCLAGEM}
+    # Na mesclagem, nome e data de nascimento divergentes também viram conflito
+    campos_atualizados, conflitos = comparar_dados(principal, dados, campos_ignorados=())
+    
+    with transaction.atomic():
+        _transferir_conflitos_pendentes(principal, secundario)
+        # Os já resolvidos passam como histórico, sem alteração
+        ConflitoDados.objects.filter(paciente=secundario).update(paciente=principal)
+        _transferir_candidatos(principal, secundario)
+        _transferir_assinaturas(principal, secundario)
+        
+        if campos_atualizados:
+            principal.save(update_fields=campos_atualizados + ['data_atualizacao'])
+        
+        ConflitoDados.objects.bulk_create(conflitos, ignore_conflicts=True)
+        
+        secundario.delete()
+    
+    return campos_atualizados, conflitos
+
+
+def mesclar_em_lote(pares):
+    """
+    Mescla uma lista de pares (id do principal, id do secundário) numa única
+    transação: se algum par falhar, nada é gravado.
+    Pares encadeados (B em A e depois C em B) são resolvidos para o
+    paciente que sobrou. Retorna a lista de
+    (principal, id do secundário, campos preenchidos, conflitos criados).
+    """
+    ids = {pk for par in pares for pk in par}
+    pacientes = Paciente.objects.in_bulk(ids)
+    
+    # Secundário já mesclado -> paciente que o absorveu
+    absorvidos = {}
+    
+    def sobrevivente(pk):
+        while pk in absorvidos:
+            pk = absorvidos[pk]
+        return pk
+    
+    resultados = []
+    with transaction.atomic():
+        for principal_id, secundario_id in pares:
+            principal_id, secundario_id = sobrevivente(principal_id), sobrevivente(secundario_id)
+            if principal_id == secundario_id:
+                continue
+            
+            principal = pacientes.get(principal_id)
+            secundario = pacientes.get(secundario_id)
+            if principal is None or secundario is None:
+                raise Paciente.DoesNotExist(
+                    f'Paciente {principal_id if principal is None else secundario_id} não encontrado'
+                )
+            
+            campos_atualizados, conflitos = mesclar_pacientes(principal, secundario)
+            absorvidos[secundario_id] = principal_id
+            resultados.append((principal, secundario_id, campos_atualizados, conflitos))
+    
+    # UPDATE/bulk_create dos conflitos não disparam os sinais do dashboard
+    transaction.on_commit(invalidar_estatisticas)
+    
+    return resultados
+
+
+def pares_de_candidatos(candidatos):
+    """
+    Converte candidatos a duplicata em pares (principal, secundário),
+    mantendo o cadastro mais antigo (menor id) como principal.
+    """
+    return [(candidato.paciente_id, candidato.duplicata_id) for candidato in candidatos]
+
+
+def mesclar_candidatos(candidatos):
+    """
+    Mescla os pares de um queryset de CandidatoDuplicata pendentes numa única
+    transação. Os pares somem junto com o paciente secundário.
+    """
+    return mesclar_em_lote(pares_de_candidatos(
+        candidatos.filter(status='pendente').order_by('-pontuacao', 'id')
+    ))
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:55
+
+from django.db import migrations, models
+
+
+def inicializar_sequencia(apps, schema_editor):
+    """
+    Inicia a sequência do ID_unico depois do maior número já usado,
+    para que os IDs existentes (PSB_Un{id}) continuem válidos e únicos.
+    """
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    Sequencia = apps.get_model('pacientes', 'Sequencia')
+    
+    maior = Paciente.objects.aggregate(maior=models.Max('id'))['maior'] or 0
+    for id_unico in Paciente.objects.filter(id_unico__startswith='PSB_Un').values_list('id_unico', flat=True):
+        sufixo = id_unico[len('PSB_Un'):]
+        if sufixo.isdigit():
+            maior = max(maior, int(sufixo))
+    
+    Sequencia.objects.update_or_create(nome='id_unico', defaults={'valor': maior})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0004_remove_paciente_fonte_dados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Sequencia',
+            fields=[
+                ('nome', models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name='Nome')),
+                ('valor', models.BigIntegerField(default=0, verbose_name='Último Valor Usado')),
+            ],
+            options={
+                'verbose_name': 'Sequência',
+                'verbose_name_plural': 'Sequências',
+            },
+        ),
+        migrations.RunPython(inicializar_sequencia, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0005_sequencia_id_unico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportacaoPlanilha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('arquivo', models.FileField(upload_to='importacoes/', verbose_name='Arquivo')),
+                ('nome_arquivo', models.CharField(max_length=255, verbose_name='Nome do Arquivo')),
+                ('tipo_planilha', models.CharField(default='auto', max_length=20, verbose_name='Tipo de Planilha')),
+                ('criar_conflitos', models.BooleanField(default=True, verbose_name='Criar Conflitos')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluida', 'Concluída'), ('erro', 'Erro')], default='pendente', max_length=20, verbose_name='Status')),
+                ('total_linhas', models.PositiveIntegerField(default=0, verbose_name='Total de Linhas')),
+                ('linhas_processadas', models.PositiveIntegerField(default=0, verbose_name='Linhas Processadas')),
+                ('novos', models.PositiveIntegerField(default=0, verbose_name='Novos')),
+                ('atualizados', models.PositiveIntegerField(default=0, verbose_name='Atualizados')),
+                ('conflitos', models.PositiveIntegerField(default=0, verbose_name='Conflitos')),
+                ('erros', models.PositiveIntegerField(default=0, verbose_name='Erros')),
+                ('mensagem_erro', models.TextField(blank=True, null=True, verbose_name='Mensagem de Erro')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, verbose_name='Data de Envio')),
+                ('data_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Início do Processamento')),
+                ('data_conclusao', models.DateTimeField(blank=True, null=True, verbose_name='Fim do Processamento')),
+            ],
+            options={
+                'verbose_name': 'Importação de Planilha',
+                'verbose_name_plural': 'Importações de Planilhas',
+                'ordering': ['-data_criacao'],
+                'indexes': [models.Index(fields=['status', 'data_criacao'], name='pacientes_i_status_a1a12a_idx')],
+            },
+        ),
+    ]
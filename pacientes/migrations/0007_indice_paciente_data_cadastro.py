@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0006_importacaoplanilha'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='paciente',
+            options={'ordering': ['-data_cadastro', '-id'], 'verbose_name': 'Paciente', 'verbose_name_plural': 'Pacientes'},
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['data_cadastro', 'id'], name='pacientes_p_data_ca_601f8a_idx'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:01
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalizar_texto(valor):
+    # Cópia de pacientes.models.normalizar_texto (migrações não devem depender do código atual)
+    if not valor:
+        return ''
+    sem_acentos = ''.join(
+        c for c in unicodedata.normalize('NFKD', valor) if not unicodedata.combining(c)
+    )
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def preencher_nomes_normalizados(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    
+    lote = []
+    for paciente in Paciente.objects.only('id', 'nome_paciente', 'nome_mae').iterator(chunk_size=2000):
+        paciente.nome_paciente_normalizado = normalizar_texto(paciente.nome_paciente)
+        paciente.nome_mae_normalizado = normalizar_texto(paciente.nome_mae)
+        lote.append(paciente)
+        if len(lote) >= 2000:
+            Paciente.objects.bulk_update(lote, ['nome_paciente_normalizado', 'nome_mae_normalizado'])
+            lote = []
+    if lote:
+        Paciente.objects.bulk_update(lote, ['nome_paciente_normalizado', 'nome_mae_normalizado'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0007_indice_paciente_data_cadastro'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='nome_mae_normalizado',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255, verbose_name='Nome da Mãe (busca)'),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='nome_paciente_normalizado',
+            field=models.CharField(default='', editable=False, max_length=255, verbose_name='Nome do Paciente (busca)'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['nome_paciente_normalizado', 'data_nascimento'], name='pacientes_p_nome_pa_121a45_idx'),
+        ),
+        migrations.RunPython(preencher_nomes_normalizados, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+
+# Cópia do SQL de pacientes.busca_textual (migrações não devem depender do código atual)
+COLUNAS = 'historico_materno, historico_gravidez, historico_familiar, info_parto'
+NOVOS = 'new.historico_materno, new.historico_gravidez, new.historico_familiar, new.info_parto'
+ANTIGOS = 'old.historico_materno, old.historico_gravidez, old.historico_familiar, old.info_parto'
+
+SQL_TABELA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS pacientes_paciente_fts USING fts5("
+    f"{COLUNAS}, content='pacientes_paciente', content_rowid='id', "
+    f"tokenize='unicode61 remove_diacritics 2')"
+)
+
+SQL_TRIGGERS = {
+    'pacientes_paciente_fts_ai': (
+        f"CREATE TRIGGER IF NOT EXISTS pacientes_paciente_fts_ai AFTER INSERT ON pacientes_paciente BEGIN "
+        f"INSERT INTO pacientes_paciente_fts(rowid, {COLUNAS}) VALUES (new.id, {NOVOS}); "
+        f"END"
+    ),
+    'pacientes_paciente_fts_ad': (
+        f"CREATE TRIGGER IF NOT EXISTS pacientes_paciente_fts_ad AFTER DELETE ON pacientes_paciente BEGIN "
+        f"INSERT INTO pacientes_paciente_fts(pacientes_paciente_fts, rowid, {COLUNAS}) VALUES ('delete', old.id, {ANTIGOS}); "
+        f"END"
+    ),
+    'pacientes_paciente_fts_au': (
+        f"CREATE TRIGGER IF NOT EXISTS pacientes_paciente_fts_au AFTER UPDATE OF {COLUNAS} ON pacientes_paciente BEGIN "
+        f"INSERT INTO pacientes_paciente_fts(pacientes_paciente_fts, rowid, {COLUNAS}) VALUES ('delete', old.id, {ANTIGOS}); "
+        f"INSERT INTO pacientes_paciente_fts(rowid, {COLUNAS}) VALUES (new.id, {NOVOS}); "
+        f"END"
+    ),
+}
+
+
+def criar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(SQL_TABELA)
+        for sql in SQL_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute("INSERT INTO pacientes_paciente_fts(pacientes_paciente_fts) VALUES ('rebuild')")
+
+
+def remover_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    
+    with schema_editor.connection.cursor() as cursor:
+        for nome in SQL_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {nome}")
+        cursor.execute("DROP TABLE IF EXISTS pacientes_paciente_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0008_nomes_normalizados'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:04
+
+from django.db import migrations, models
+
+
+def preencher_projetos(apps, schema_editor):
+    Paciente = apps.get_model('pacientes', 'Paciente')
+    Projeto = apps.get_model('pacientes', 'Projeto')
+    
+    codigos = set(
+        Paciente.objects.exclude(id_projeto__isnull=True).exclude(id_projeto='')
+        .order_by().values_list('id_projeto', flat=True).distinct()
+    )
+    Projeto.objects.bulk_create([Projeto(codigo=codigo) for codigo in codigos], ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0009_indice_fts_historico'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Projeto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=100, unique=True, verbose_name='ID do Projeto')),
+            ],
+            options={
+                'verbose_name': 'Projeto',
+                'verbose_name_plural': 'Projetos',
+                'ordering': ['codigo'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['id_projeto'], name='pacientes_p_id_proj_e17b41_idx'),
+        ),
+        migrations.RunPython(preencher_projetos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:06
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0010_projetos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conflitodados',
+            name='importacao',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='conflitos_gerados', to='pacientes.importacaoplanilha', verbose_name='Importação'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:08
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def remover_conflitos_duplicados(apps, schema_editor):
+    ConflitoDados = apps.get_model('pacientes', 'ConflitoDados')
+    
+    # Mantém o conflito pendente mais antigo de cada (paciente, campo, valor_novo)
+    primeiros = (
+        ConflitoDados.objects.filter(status='novo')
+        .order_by()
+        .values('paciente', 'campo', 'valor_novo')
+        .annotate(primeiro=Min('id'))
+        .values('primeiro')
+    )
+    ConflitoDados.objects.filter(status='novo').exclude(id__in=primeiros).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0011_conflito_importacao'),
+    ]
+
+    operations = [
+        migrations.RunPython(remover_conflitos_duplicados, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conflitodados',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'novo')), fields=('paciente', 'campo', 'valor_novo'), name='conflito_pendente_unico'),
+        ),
+    ]
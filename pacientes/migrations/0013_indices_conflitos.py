@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0012_conflito_pendente_unico'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='conflitodados',
+            name='paciente',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='conflitos', to='pacientes.paciente', verbose_name='Paciente'),
+        ),
+        migrations.AddIndex(
+            model_name='conflitodados',
+            index=models.Index(fields=['status', 'data_conflito'], name='pacientes_c_status_8d4af4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conflitodados',
+            index=models.Index(condition=models.Q(('status', 'novo')), fields=['campo', 'data_conflito', 'id'], name='conflito_pendente_campo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conflitodados',
+            index=models.Index(fields=['paciente', 'status', 'data_conflito'], name='pacientes_c_pacient_622729_idx'),
+        ),
+    ]
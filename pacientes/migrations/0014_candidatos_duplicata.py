@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0013_indices_conflitos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CandidatoDuplicata',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pontuacao', models.FloatField(verbose_name='Pontuação')),
+                ('similaridade_nome', models.FloatField(blank=True, null=True, verbose_name='Similaridade do Nome')),
+                ('similaridade_mae', models.FloatField(blank=True, null=True, verbose_name='Similaridade do Nome da Mãe')),
+                ('similaridade_data', models.FloatField(blank=True, null=True, verbose_name='Similaridade da Data de Nascimento')),
+                ('cpf_igual', models.BooleanField(blank=True, null=True, verbose_name='CPF Igual')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('mesclado', 'Mesclado'), ('descartado', 'Descartado')], default='pendente', max_length=20, verbose_name='Status')),
+                ('data_criacao', models.DateTimeField(auto_now_add=True, verbose_name='Data da Detecção')),
+                ('data_revisao', models.DateTimeField(blank=True, null=True, verbose_name='Data da Revisão')),
+                ('duplicata', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='pacientes.paciente', verbose_name='Possível Duplicata')),
+                ('paciente', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='candidatos_duplicata', to='pacientes.paciente', verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Candidato a Duplicata',
+                'verbose_name_plural': 'Candidatos a Duplicata',
+                'ordering': ['-pontuacao', 'id'],
+                'indexes': [models.Index(fields=['status', '-pontuacao', 'id'], name='pacientes_c_status_940d00_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='candidatoduplicata',
+            constraint=models.UniqueConstraint(fields=('paciente', 'duplicata'), name='candidato_duplicata_unico'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0014_candidatos_duplicata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='candidatoduplicata',
+            name='status',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('descartado', 'Descartado')], default='pendente', max_length=20, verbose_name='Status'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0015_remover_status_mesclado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacaoplanilha',
+            name='tudo_ou_nada',
+            field=models.BooleanField(default=False, help_text='Se alguma linha der erro, nada da planilha é gravado', verbose_name='Tudo ou Nada'),
+        ),
+    ]
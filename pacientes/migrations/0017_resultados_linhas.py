@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0016_importacao_tudo_ou_nada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResultadoLinha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('linha', models.PositiveIntegerField(verbose_name='Linha')),
+                ('status', models.PositiveSmallIntegerField(choices=[(1, 'Novo'), (2, 'Atualizado'), (3, 'Conflito'), (4, 'Erro')], verbose_name='Status')),
+                ('mensagem', models.TextField(blank=True, null=True, verbose_name='Mensagem de Erro')),
+                ('importacao', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='resultados_linhas', to='pacientes.importacaoplanilha', verbose_name='Importação')),
+                ('paciente', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='pacientes.paciente', verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Resultado de Linha',
+                'verbose_name_plural': 'Resultados de Linhas',
+                'ordering': ['importacao', 'linha'],
+                'indexes': [models.Index(fields=['importacao', 'status', 'linha'], name='pacientes_r_importa_b02811_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0017_resultados_linhas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacaoplanilha',
+            name='inalteradas',
+            field=models.PositiveIntegerField(default=0, verbose_name='Inalteradas'),
+        ),
+        migrations.AddField(
+            model_name='importacaoplanilha',
+            name='pular_inalteradas',
+            field=models.BooleanField(default=True, help_text='Linhas iguais às já importadas (ver AssinaturaLinha) não são processadas de novo', verbose_name='Pular Linhas Inalteradas'),
+        ),
+        migrations.CreateModel(
+            name='AssinaturaLinha',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo_planilha', models.CharField(max_length=20, verbose_name='Tipo de Planilha')),
+                ('assinatura', models.CharField(max_length=32, verbose_name='Assinatura')),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assinaturas_linhas', to='pacientes.paciente', verbose_name='Paciente')),
+            ],
+            options={
+                'verbose_name': 'Assinatura de Linha',
+                'verbose_name_plural': 'Assinaturas de Linhas',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='assinaturalinha',
+            constraint=models.UniqueConstraint(fields=('tipo_planilha', 'assinatura', 'paciente'), name='assinatura_linha_unica'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:36
+
+from django.db import migrations, models
+
+
+def inicializar_ultima_atividade(apps, schema_editor):
+    """
+    Importações já em andamento contam a partir do início do processamento,
+    para que as abandonadas antes desta migração também sejam encerradas.
+    """
+    ImportacaoPlanilha = apps.get_model('pacientes', 'ImportacaoPlanilha')
+    ImportacaoPlanilha.objects.filter(status='processando').update(
+        ultima_atividade=models.F('data_inicio')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0018_assinaturas_linhas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importacaoplanilha',
+            name='ultima_atividade',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Última Atividade do Worker'),
+        ),
+        migrations.RunPython(inicializar_ultima_atividade, migrations.RunPython.noop),
+    ]
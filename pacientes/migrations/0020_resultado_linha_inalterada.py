@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0019_importacao_ultima_atividade'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resultadolinha',
+            name='status',
+            field=models.PositiveSmallIntegerField(choices=[(1, 'Novo'), (2, 'Atualizado'), (3, 'Conflito'), (4, 'Erro'), (5, 'Inalterada')], verbose_name='Status'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pacientes', '0020_resultado_linha_inalterada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceHistorico',
+            fields=[
+                ('paciente', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='indice_historico', serialize=False, to='pacientes.paciente')),
+                ('consulta', models.TextField(db_column='pacientes_paciente_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'pacientes_paciente_fts',
+                'managed': False,
+            },
+        ),
+    ]
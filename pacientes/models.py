@@ -1,5 +1,63 @@
-from django.db import models
+import unicodedata
+from datetime import timedelta
+
+from django.db import models, connection, transaction, OperationalError
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+
+def normalizar_texto(valor):
+    """
+    Normaliza um nome para busca e comparação: sem acentos, minúsculo e
+    com espaços simples. Ex.: '  José  da SILVA ' -> 'jose da silva'.
+    """
+    if not valor:
+        return ''
+    sem_acentos = ''.join(
+        c for c in unicodedata.normalize('NFKD', valor) if not unicodedata.combining(c)
+    )
+    return ' '.join(sem_acentos.casefold().split())
+
+
+class Sequencia(models.Model):
+    """
+    Contadores usados para gerar identificadores sem precisar de um
+    segundo UPDATE depois do INSERT (ex.: ID_unico dos pacientes).
+    """
+    nome = models.CharField(max_length=50, primary_key=True, verbose_name="Nome")
+    valor = models.BigIntegerField(default=0, verbose_name="Último Valor Usado")
+    
+    class Meta:
+        verbose_name = "Sequência"
+        verbose_name_plural = "Sequências"
+    
+    def __str__(self):
+        return f"{self.nome}: {self.valor}"
+    
+    @classmethod
+    def reservar(cls, nome, quantidade=1):
+        """
+        Reserva `quantidade` valores consecutivos da sequência com um único
+        UPDATE ... RETURNING e retorna o primeiro deles.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {cls._meta.db_table} SET valor = valor + %s WHERE nome = %s RETURNING valor',
+                [quantidade, nome]
+            )
+            linha = cursor.fetchone()
+        
+        if linha is None:
+            # Sequência ainda não existe: cria e tenta novamente
+            cls.objects.get_or_create(nome=nome)
+            return cls.reservar(nome, quantidade)
+        
+        return linha[0] - quantidade + 1
+
+
+# Prefixo e sequência usados na geração do ID_unico dos pacientes
+PREFIXO_ID_UNICO = 'PSB_Un'
+SEQUENCIA_ID_UNICO = 'id_unico'
 
 
 class Paciente(models.Model):
@@ -94,12 +152,22 @@ class Paciente(models.Model):
     data_cadastro = models.DateTimeField(auto_now_add=True, verbose_name="Data de Cadastro")
     data_atualizacao = models.DateTimeField(auto_now=True, verbose_name="Data de Atualização")
     
+    # ===== CAMPOS DE BUSCA (mantidos pelo save, ver normalizar_texto) =====
+    nome_paciente_normalizado = models.CharField(max_length=255, default='', editable=False, verbose_name="Nome do Paciente (busca)")
+    nome_mae_normalizado = models.CharField(max_length=255, default='', editable=False, db_index=True, verbose_name="Nome da Mãe (busca)")
+    
     class Meta:
         verbose_name = "Paciente"
         verbose_name_plural = "Pacientes"
-        ordering = ['-data_cadastro']
+        ordering = ['-data_cadastro', '-id']
         indexes = [
             models.Index(fields=['nome_paciente', 'data_nascimento', 'nome_mae']),
+            # Ordenação da listagem e paginação por chave
+            models.Index(fields=['data_cadastro', 'id']),
+            # Busca de duplicatas e busca por prefixo do nome
+            models.Index(fields=['nome_paciente_normalizado', 'data_nascimento']),
+            # Filtro por projeto
+            models.Index(fields=['id_projeto']),
         ]
     
     def __str__(self):
@@ -107,40 +175,190 @@ class Paciente(models.Model):
     
     def save(self, *args, **kwargs):
         """
-        Gera ID_unico automaticamente se não existir.
-        Formato: PSB_UnXXXX onde XXXX é o ID do registro.
+        Gera ID_unico automaticamente se não existir, antes do INSERT (sem
+        um UPDATE depois dele). A reserva do número e o INSERT ficam na mesma
+        transação: se o INSERT falhar, o número não é consumido.
         """
-        if not self.id_unico:
-            # Primeiro, salva para obter o ID
-            super().save(*args, **kwargs)
-            # Depois, gera o ID_unico baseado no ID do registro
-            self.id_unico = f"PSB_Un{self.id}"
-            # Salva novamente com o ID_unico
-            super().save(update_fields=['id_unico'])
-        else:
+        self.atualizar_campos_normalizados()
+        
+        # Com update_fields, os campos de busca acompanham os nomes
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if 'nome_paciente' in update_fields:
+                update_fields.add('nome_paciente_normalizado')
+            if 'nome_mae' in update_fields:
+                update_fields.add('nome_mae_normalizado')
+            kwargs['update_fields'] = update_fields
+        
+        if self.id_unico:
             super().save(*args, **kwargs)
+            return
+        
+        try:
+            with transaction.atomic():
+                self.id_unico = self.gerar_ids_unicos(1)[0]
+                super().save(*args, **kwargs)
+        except Exception:
+            # O número reservado foi desfeito junto com o INSERT
+            self.id_unico = None
+            raise
+    
+    def atualizar_campos_normalizados(self):
+        """
+        Recalcula os campos de busca. Chamado pelo save e, antes de
+        bulk_create/bulk_update, por quem grava sem passar pelo save.
+        """
+        self.nome_paciente_normalizado = normalizar_texto(self.nome_paciente)
+        self.nome_mae_normalizado = normalizar_texto(self.nome_mae)
+    
+    @classmethod
+    def gerar_ids_unicos(cls, quantidade):
+        """
+        Gera `quantidade` IDs únicos novos no formato PSB_UnXXXX, onde XXXX
+        vem da sequência 'id_unico'. Usado também antes de bulk_create.
+        """
+        if quantidade <= 0:
+            return []
+        inicio = Sequencia.reservar(SEQUENCIA_ID_UNICO, quantidade)
+        return [f"{PREFIXO_ID_UNICO}{numero}" for numero in range(inicio, inicio + quantidade)]
     
     @classmethod
     def buscar_duplicata(cls, nome_paciente, data_nascimento, nome_mae):
         """
-        Busca pacientes duplicados com base em Nome + Data de Nascimento.
+        Busca pacientes duplicados com base em Nome + Data de Nascimento,
+        ignorando acentos e maiúsculas/minúsculas (ver normalizar_texto).
         Nome da mãe é verificado como campo de conflito se divergir.
         Retorna o paciente encontrado ou None.
         """
+        candidatos = cls.objects.filter(
+            nome_paciente_normalizado=normalizar_texto(nome_paciente),
+            data_nascimento=data_nascimento
+        )
         try:
-            return cls.objects.get(
-                nome_paciente__iexact=nome_paciente,
-                data_nascimento=data_nascimento
-            )
+            return candidatos.get()
         except cls.DoesNotExist:
             return None
         except cls.MultipleObjectsReturned:
-            # Se houver múltiplos, retorna o primeiro
-            return cls.objects.filter(
-                nome_paciente__iexact=nome_paciente,
-                data_nascimento=data_nascimento,
-                nome_mae__iexact=nome_mae
+            # Se houver múltiplos, desempata pelo nome da mãe
+            return candidatos.filter(
+                nome_mae_normalizado=normalizar_texto(nome_mae)
             ).first()
+    
+    @classmethod
+    def buscar_por_prefixo(cls, queryset, campo, texto):
+        """
+        Filtra `queryset` pelos registros cujo campo normalizado começa com
+        `texto`. Usa um intervalo (>= prefixo e < prefixo + maior caractere),
+        que o SQLite resolve pelo índice, ao contrário de LIKE/icontains.
+        """
+        prefixo = normalizar_texto(texto)
+        if not prefixo:
+            return queryset
+        return queryset.filter(**{
+            f'{campo}__gte': prefixo,
+            f'{campo}__lt': prefixo + chr(0x10FFFF),
+        })
+    
+    @classmethod
+    def buscar_por_nome(cls, queryset, campo, texto):
+        """
+        Busca pelo início do nome (pelo índice, ver buscar_por_prefixo). Se
+        nenhum registro de `queryset` começar com `texto`, busca o texto em
+        qualquer parte do nome (ex.: "silva" encontra "José da Silva"), o que
+        percorre a tabela. Retorna (queryset, se a busca foi em qualquer parte).
+        """
+        por_prefixo = cls.buscar_por_prefixo(queryset, campo, texto)
+        if por_prefixo.exists():
+            return por_prefixo, False
+        return queryset.filter(**{f'{campo}__contains': normalizar_texto(texto)}), True
+
+
+class CampoBuscaTextual(models.TextField):
+    """
+    Coluna oculta de uma tabela FTS5, que tem o nome da própria tabela e
+    recebe a consulta do MATCH. Só serve ao lookup `casa`.
+    """
+
+
+@CampoBuscaTextual.register_lookup
+class Casa(models.Lookup):
+    lookup_name = 'casa'
+    
+    def as_sql(self, compiler, connection):
+        lhs, params_lhs = self.process_lhs(compiler, connection)
+        rhs, params_rhs = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', params_lhs + params_rhs
+
+
+class IndiceHistorico(models.Model):
+    """
+    Tabela virtual FTS5 com o índice dos históricos clínicos, criada e
+    mantida pelos triggers de busca_textual.py (não é gerenciada pelo Django).
+    Mapeada como modelo só para a busca entrar na consulta como um JOIN:
+    Paciente.objects.filter(indice_historico__consulta__casa=...).
+    `rank` é a relevância (bm25) da linha na consulta; menor é melhor.
+    """
+    paciente = models.OneToOneField(
+        Paciente,
+        primary_key=True,
+        db_column='rowid',
+        on_delete=models.DO_NOTHING,
+        related_name='indice_historico'
+    )
+    consulta = CampoBuscaTextual(db_column='pacientes_paciente_fts')
+    rank = models.FloatField()
+    
+    class Meta:
+        managed = False
+        db_table = 'pacientes_paciente_fts'
+
+
+class Projeto(models.Model):
+    """
+    Lista materializada dos projetos (id_projeto) que existem nos pacientes,
+    usada no filtro da listagem sem consultar a tabela de pacientes.
+    Mantida pelos sinais de Paciente e pela importação em lote.
+    """
+    codigo = models.CharField(max_length=100, unique=True, verbose_name="ID do Projeto")
+    
+    class Meta:
+        verbose_name = "Projeto"
+        verbose_name_plural = "Projetos"
+        ordering = ['codigo']
+    
+    def __str__(self):
+        return self.codigo
+    
+    @classmethod
+    def registrar(cls, codigos):
+        """
+        Garante que os projetos informados existam na lista (INSERT OR IGNORE).
+        """
+        codigos = {codigo for codigo in codigos if codigo}
+        if codigos:
+            cls.objects.bulk_create([cls(codigo=codigo) for codigo in codigos], ignore_conflicts=True)
+    
+    @classmethod
+    def limpar(cls, codigos):
+        """
+        Remove da lista os projetos informados que não têm mais pacientes.
+        """
+        for codigo in {codigo for codigo in codigos if codigo}:
+            if not Paciente.objects.filter(id_projeto=codigo).exists():
+                cls.objects.filter(codigo=codigo).delete()
+    
+    @classmethod
+    def reconstruir(cls):
+        """
+        Refaz a lista inteira a partir dos pacientes.
+        """
+        codigos = set(
+            Paciente.objects.exclude(id_projeto__isnull=True).exclude(id_projeto='')
+            .order_by().values_list('id_projeto', flat=True).distinct()
+        )
+        cls.objects.exclude(codigo__in=codigos).delete()
+        cls.registrar(codigos)
 
 
 class ConflitoDados(models.Model):
@@ -157,8 +375,17 @@ class ConflitoDados(models.Model):
         Paciente,
         on_delete=models.CASCADE,
         related_name='conflitos',
+        db_index=False,  # coberto pelo índice (paciente, status)
         verbose_name="Paciente"
     )
+    importacao = models.ForeignKey(
+        'ImportacaoPlanilha',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='conflitos_gerados',
+        verbose_name="Importação"
+    )
     campo = models.CharField(max_length=100, verbose_name="Campo em Conflito")
     valor_existente = models.TextField(verbose_name="Valor Existente no Banco")
     valor_novo = models.TextField(verbose_name="Valor Novo a Ser Inserido")
@@ -186,6 +413,333 @@ class ConflitoDados(models.Model):
         verbose_name = "Conflito de Dados"
         verbose_name_plural = "Conflitos de Dados"
         ordering = ['-data_conflito']
+        indexes = [
+            # Contagem e fila por status em ordem de data (o id entra implicitamente
+            # no índice, então serve também à paginação por chave)
+            models.Index(fields=['status', 'data_conflito']),
+            # Fila de pendentes filtrada por campo
+            models.Index(
+                fields=['campo', 'data_conflito', 'id'],
+                condition=models.Q(status='novo'),
+                name='conflito_pendente_campo_idx'
+            ),
+            # Conflitos pendentes de um paciente, já na ordem padrão
+            models.Index(fields=['paciente', 'status', 'data_conflito']),
+        ]
+        constraints = [
+            # Reimportar a mesma planilha não duplica conflitos pendentes
+            models.UniqueConstraint(
+                fields=['paciente', 'campo', 'valor_novo'],
+                condition=models.Q(status='novo'),
+                name='conflito_pendente_unico'
+            ),
+        ]
     
     def __str__(self):
         return f"Conflito: {self.paciente.nome_paciente} - {self.campo}"
+
+
+class ImportacaoPlanilha(models.Model):
+    """
+    Planilha enviada para importação em segundo plano.
+    O upload só grava o arquivo e cria este registro; o processamento é
+    feito pelo comando `manage.py processar_importacoes`. O arquivo é
+    apagado quando a importação termina (concluída ou com erro).
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('processando', 'Processando'),
+        ('concluida', 'Concluída'),
+        ('erro', 'Erro'),
+    ]
+    
+    # Sem sinal de vida do worker por mais que isso, uma importação em
+    # 'processando' é considerada abandonada (worker morto ou encerrado)
+    TEMPO_SEM_ATIVIDADE = timedelta(minutes=10)
+    
+    arquivo = models.FileField(upload_to='importacoes/', verbose_name="Arquivo")
+    nome_arquivo = models.CharField(max_length=255, verbose_name="Nome do Arquivo")
+    tipo_planilha = models.CharField(max_length=20, default='auto', verbose_name="Tipo de Planilha")
+    criar_conflitos = models.BooleanField(default=True, verbose_name="Criar Conflitos")
+    tudo_ou_nada = models.BooleanField(
+        default=False,
+        verbose_name="Tudo ou Nada",
+        help_text="Se alguma linha der erro, nada da planilha é gravado"
+    )
+    pular_inalteradas = models.BooleanField(
+        default=True,
+        verbose_name="Pular Linhas Inalteradas",
+        help_text="Linhas iguais às já importadas (ver AssinaturaLinha) não são processadas de novo"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pendente',
+        verbose_name="Status"
+    )
+    
+    # ===== PROGRESSO E RESULTADOS =====
+    total_linhas = models.PositiveIntegerField(default=0, verbose_name="Total de Linhas")
+    linhas_processadas = models.PositiveIntegerField(default=0, verbose_name="Linhas Processadas")
+    novos = models.PositiveIntegerField(default=0, verbose_name="Novos")
+    atualizados = models.PositiveIntegerField(default=0, verbose_name="Atualizados")
+    conflitos = models.PositiveIntegerField(default=0, verbose_name="Conflitos")
+    erros = models.PositiveIntegerField(default=0, verbose_name="Erros")
+    inalteradas = models.PositiveIntegerField(default=0, verbose_name="Inalteradas")
+    mensagem_erro = models.TextField(null=True, blank=True, verbose_name="Mensagem de Erro")
+    
+    # ===== METADADOS =====
+    data_criacao = models.DateTimeField(auto_now_add=True, verbose_name="Data de Envio")
+    data_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Início do Processamento")
+    # Atualizada pelo worker ao reservar a importação e a cada lote gravado
+    ultima_atividade = models.DateTimeField(null=True, blank=True, verbose_name="Última Atividade do Worker")
+    data_conclusao = models.DateTimeField(null=True, blank=True, verbose_name="Fim do Processamento")
+    
+    class Meta:
+        verbose_name = "Importação de Planilha"
+        verbose_name_plural = "Importações de Planilhas"
+        ordering = ['-data_criacao']
+        indexes = [
+            models.Index(fields=['status', 'data_criacao']),
+        ]
+    
+    def __str__(self):
+        return f"{self.nome_arquivo} ({self.get_status_display()})"
+    
+    @property
+    def percentual(self):
+        if not self.total_linhas:
+            return 100 if self.status == 'concluida' else 0
+        return int(self.linhas_processadas * 100 / self.total_linhas)
+    
+    @property
+    def finalizada(self):
+        return self.status in ('concluida', 'erro')
+    
+    @property
+    def abandonada(self):
+        return (
+            self.status == 'processando'
+            and self.ultima_atividade is not None
+            and self.ultima_atividade < timezone.now() - self.TEMPO_SEM_ATIVIDADE
+        )
+    
+    def apagar_arquivo(self):
+        """
+        Apaga a planilha enviada do MEDIA_ROOT (não é salvo no banco).
+        """
+        if self.arquivo:
+            self.arquivo.delete(save=False)
+            self.arquivo = ''
+    
+    @classmethod
+    def reservar_proxima(cls):
+        """
+        Marca a importação pendente mais antiga como 'processando' e a retorna.
+        O UPDATE condicional garante que dois workers não peguem a mesma.
+        Retorna None se a fila estiver vazia.
+        """
+        while True:
+            importacao = cls.objects.filter(status='pendente').order_by('data_criacao').first()
+            if importacao is None:
+                return None
+            
+            agora = timezone.now()
+            reservada = cls.objects.filter(pk=importacao.pk, status='pendente').update(
+                status='processando',
+                data_inicio=agora,
+                ultima_atividade=agora
+            )
+            if reservada:
+                importacao.refresh_from_db()
+                return importacao
+    
+    @classmethod
+    def encerrar_abandonadas(cls):
+        """
+        Marca como 'erro' as importações em 'processando' sem sinal de vida
+        do worker há mais de TEMPO_SEM_ATIVIDADE e apaga os arquivos delas.
+        Os lotes já confirmados continuam gravados; reenviar a planilha
+        completa o resto (as linhas já importadas são puladas).
+        Retorna as importações encerradas.
+        """
+        limite = timezone.now() - cls.TEMPO_SEM_ATIVIDADE
+        encerradas = []
+        for importacao in cls.objects.filter(status='processando', ultima_atividade__lt=limite):
+            try:
+                # UPDATE condicional: o worker pode ter dado sinal de vida nesse meio tempo
+                encerrada = cls.objects.filter(
+                    pk=importacao.pk,
+                    status='processando',
+                    ultima_atividade__lt=limite
+                ).update(
+                    status='erro',
+                    arquivo='',
+                    mensagem_erro=(
+                        'O processamento foi interrompido (o worker parou de responder). '
+                        'As linhas já gravadas foram mantidas; envie a planilha de novo para concluir.'
+                    ),
+                    data_conclusao=timezone.now()
+                )
+            except OperationalError:
+                # Banco ocupado por uma transação longa (ex.: importação tudo ou
+                # nada, cujos sinais de vida só aparecem no commit): o worker
+                # está vivo, e a verificação é refeita na próxima vez
+                break
+            if encerrada:
+                importacao.apagar_arquivo()
+                importacao.refresh_from_db()
+                encerradas.append(importacao)
+        return encerradas
+
+
+class ResultadoLinha(models.Model):
+    """
+    Resultado de cada linha de uma importação, gravado junto com o lote da
+    linha. Fica guardado só o essencial (status, paciente e, para erros, a
+    mensagem), para que a importação não precise manter os resultados em
+    memória e eles possam ser consultados depois.
+    """
+    NOVO = 1
+    ATUALIZADO = 2
+    CONFLITO = 3
+    ERRO = 4
+    INALTERADA = 5
+    STATUS_CHOICES = [
+        (NOVO, 'Novo'),
+        (ATUALIZADO, 'Atualizado'),
+        (CONFLITO, 'Conflito'),
+        (ERRO, 'Erro'),
+        (INALTERADA, 'Inalterada'),
+    ]
+    # Status dos resultados de processar_linha/processar_lote -> código
+    CODIGOS = {
+        'novo': NOVO,
+        'atualizado': ATUALIZADO,
+        'conflito': CONFLITO,
+        'erro': ERRO,
+        'inalterada': INALTERADA,
+    }
+    
+    importacao = models.ForeignKey(
+        ImportacaoPlanilha,
+        on_delete=models.CASCADE,
+        related_name='resultados_linhas',
+        db_index=False,  # coberto pelo índice (importacao, status, linha)
+        verbose_name="Importação"
+    )
+    linha = models.PositiveIntegerField(verbose_name="Linha")
+    status = models.PositiveSmallIntegerField(choices=STATUS_CHOICES, verbose_name="Status")
+    # Sem restrição nem índice: o paciente pode ser mesclado ou excluído
+    # depois, sem que o histórico da importação precise ser atualizado
+    paciente = models.ForeignKey(
+        Paciente,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name="Paciente"
+    )
+    mensagem = models.TextField(null=True, blank=True, verbose_name="Mensagem de Erro")
+    
+    class Meta:
+        verbose_name = "Resultado de Linha"
+        verbose_name_plural = "Resultados de Linhas"
+        ordering = ['importacao', 'linha']
+        indexes = [
+            # Linhas de um status (ex.: erros) de uma importação, em ordem
+            models.Index(fields=['importacao', 'status', 'linha']),
+        ]
+    
+    def __str__(self):
+        return f"{self.importacao} - linha {self.linha}: {self.get_status_display()}"
+
+
+class AssinaturaLinha(models.Model):
+    """
+    Assinatura (hash do conteúdo normalizado) de uma linha já importada para
+    o paciente, por tipo de planilha. Numa reimportação, as linhas cuja
+    assinatura já está gravada já foram aplicadas ao cadastro e são
+    puladas, sem busca de duplicata nem comparação de campos.
+    Um paciente com várias linhas na planilha tem uma assinatura por linha.
+    """
+    paciente = models.ForeignKey(
+        Paciente,
+        on_delete=models.CASCADE,
+        related_name='assinaturas_linhas',
+        verbose_name="Paciente"
+    )
+    tipo_planilha = models.CharField(max_length=20, verbose_name="Tipo de Planilha")
+    assinatura = models.CharField(max_length=32, verbose_name="Assinatura")
+    
+    class Meta:
+        verbose_name = "Assinatura de Linha"
+        verbose_name_plural = "Assinaturas de Linhas"
+        constraints = [
+            # Também serve de índice para a busca das assinaturas de um lote
+            models.UniqueConstraint(
+                fields=['tipo_planilha', 'assinatura', 'paciente'],
+                name='assinatura_linha_unica'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.paciente} - {self.tipo_planilha}: {self.assinatura}"
+
+
+class CandidatoDuplicata(models.Model):
+    """
+    Par de pacientes que provavelmente são a mesma pessoa, encontrado pela
+    vinculação aproximada de registros (ver vinculacao.py) e aguardando revisão.
+    O paciente de menor id fica em `paciente` e o outro em `duplicata`.
+    Ao mesclar o par (ver mesclagem.py) o registro some junto com a duplicata.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('descartado', 'Descartado'),
+    ]
+    
+    paciente = models.ForeignKey(
+        Paciente,
+        on_delete=models.CASCADE,
+        related_name='candidatos_duplicata',
+        db_index=False,  # coberto pela restrição (paciente, duplicata)
+        verbose_name="Paciente"
+    )
+    duplicata = models.ForeignKey(
+        Paciente,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name="Possível Duplicata"
+    )
+    pontuacao = models.FloatField(verbose_name="Pontuação")
+    similaridade_nome = models.FloatField(null=True, blank=True, verbose_name="Similaridade do Nome")
+    similaridade_mae = models.FloatField(null=True, blank=True, verbose_name="Similaridade do Nome da Mãe")
+    similaridade_data = models.FloatField(null=True, blank=True, verbose_name="Similaridade da Data de Nascimento")
+    cpf_igual = models.BooleanField(null=True, blank=True, verbose_name="CPF Igual")
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pendente',
+        verbose_name="Status"
+    )
+    data_criacao = models.DateTimeField(auto_now_add=True, verbose_name="Data da Detecção")
+    data_revisao = models.DateTimeField(null=True, blank=True, verbose_name="Data da Revisão")
+    
+    class Meta:
+        verbose_name = "Candidato a Duplicata"
+        verbose_name_plural = "Candidatos a Duplicata"
+        ordering = ['-pontuacao', 'id']
+        constraints = [
+            # Cada par é registrado uma única vez (inclusive se descartado)
+            models.UniqueConstraint(fields=['paciente', 'duplicata'], name='candidato_duplicata_unico'),
+        ]
+        indexes = [
+            # Fila de revisão: pendentes por pontuação
+            models.Index(fields=['status', '-pontuacao', 'id']),
+        ]
+    
+    def __str__(self):
+        return f"{self.paciente} ~ {self.duplicata} ({self.pontuacao:.2f})"
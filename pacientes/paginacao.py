@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from django.db.models import Q
+
+
+# Separador entre o valor da chave e o id dentro do cursor
+SEPARADOR_CURSOR = '~'
+
+
+def codificar_cursor(valor, pk):
+    """
+    Monta o cursor de paginação a partir do valor da chave e do id.
+    """
+    return f"{valor.isoformat()}{SEPARADOR_CURSOR}{pk}"
+
+
+def decodificar_cursor(cursor):
+    """
+    Lê um cursor gerado por codificar_cursor.
+    Retorna (valor, pk) ou None se o cursor for inválido.
+    """
+    try:
+        valor, pk = cursor.rsplit(SEPARADOR_CURSOR, 1)
+        return datetime.fromisoformat(valor), int(pk)
+    except (ValueError, AttributeError):
+        return None
+
+
+def paginar_por_chave(queryset, campo, cursor=None, anterior=False, tamanho=100):
+    """
+    Paginação por chave (keyset/seek) em ordem decrescente de (campo, id).
+    Em vez de OFFSET, cada página começa logo após o último registro da
+    anterior, então qualquer página custa o mesmo que a primeira quando
+    existe um índice em (campo, id).
+    
+    Retorna um dicionário com:
+    - itens: registros da página
+    - cursor_proximo / cursor_anterior: cursores para navegar (ou None)
+    """
+    posicao = decodificar_cursor(cursor) if cursor else None
+    
+    if posicao is None:
+        anterior = False
+        queryset = queryset.order_by(f'-{campo}', '-id')
+    else:
+        valor, pk = posicao
+        if anterior:
+            # Registros "depois" do cursor na ordem decrescente, lidos ao contrário
+            queryset = queryset.filter(
+                Q(**{f'{campo}__gte': valor}) & ~Q(**{campo: valor, 'id__lte': pk})
+            ).order_by(campo, 'id')
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{campo}__lte': valor}) & ~Q(**{campo: valor, 'id__gte': pk})
+            ).order_by(f'-{campo}', '-id')
+    
+    # Busca um registro a mais só para saber se existe outra página
+    itens = list(queryset[:tamanho + 1])
+    tem_mais = len(itens) > tamanho
+    itens = itens[:tamanho]
+    
+    if anterior:
+        itens.reverse()
+        tem_proxima, tem_anterior = True, tem_mais
+    else:
+        tem_proxima, tem_anterior = tem_mais, posicao is not None
+    
+    def cursor_de(item):
+        return codificar_cursor(getattr(item, campo), item.pk)
+    
+    return {
+        'itens': itens,
+        'cursor_proximo': cursor_de(itens[-1]) if itens and tem_proxima else None,
+        'cursor_anterior': cursor_de(itens[0]) if itens and tem_anterior else None,
+    }
+
+
+def paginar_por_posicao(queryset, cursor=None, tamanho=100):
+    """
+    Paginação por posição (OFFSET), com o mesmo retorno de paginar_por_chave.
+    Usada quando a ordem não vem de um índice (ex.: relevância da busca
+    textual), caso em que o banco precisa calcular todos os resultados de
+    qualquer forma. O cursor é a posição inicial da página.
+    """
+    try:
+        inicio = max(int(cursor), 0) if cursor else 0
+    except ValueError:
+        inicio = 0
+    
+    itens = list(queryset[inicio:inicio + tamanho + 1])
+    tem_proxima = len(itens) > tamanho
+    
+    return {
+        'itens': itens[:tamanho],
+        'cursor_proximo': str(inicio + tamanho) if tem_proxima else None,
+        'cursor_anterior': str(max(inicio - tamanho, 0)) if inicio else None,
+    }
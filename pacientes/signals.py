@@ -0,0 +1,32 @@
+"""
+Sinais que mantêm a lista materializada de projetos (Projeto).
+Operações em massa não disparam sinais: quem as usa chama
+Projeto.registrar/limpar diretamente.
+"""
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Paciente, Projeto
+
+
+@receiver(post_init, sender=Paciente)
+def guardar_projeto_original(sender, instance, **kwargs):
+    # Valor carregado do banco, para saber se o projeto mudou no save
+    instance._id_projeto_original = instance.__dict__.get('id_projeto')
+
+
+@receiver(post_save, sender=Paciente)
+def atualizar_projetos_ao_salvar(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'id_projeto' not in update_fields:
+        return
+    original = getattr(instance, '_id_projeto_original', None)
+    if created or instance.id_projeto != original:
+        Projeto.registrar([instance.id_projeto])
+        if not created:
+            Projeto.limpar([original])
+    instance._id_projeto_original = instance.id_projeto
+
+
+@receiver(post_delete, sender=Paciente)
+def atualizar_projetos_ao_deletar(sender, instance, **kwargs):
+    Projeto.limpar([instance.id_projeto])
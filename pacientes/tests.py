@@ -1,3 +1,1107 @@
-from django.test import TestCase
+import importlib
+import sqlite3
+import tempfile
+from datetime import date, datetime, timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+import pandas as pd
+from openpyxl import Workbook, load_workbook
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DatabaseError, IntegrityError, connection
+from django.db.utils import ConnectionHandler
+from django.contrib.messages import get_messages
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .busca_textual import filtrar_por_historico
+from .estatisticas import CHAVE_CACHE, obter_estatisticas
+from .exportacao import COLUNAS_EXPORTACAO, compilar_formatador
+from .forms import FiltroExportacaoForm
+from .mesclagem import mesclar_em_lote, mesclar_pacientes
+from .models import (
+    AssinaturaLinha, CandidatoDuplicata, ConflitoDados, ImportacaoPlanilha, Paciente, Projeto, ResultadoLinha,
+    Sequencia, normalizar_texto
+)
+from .paginacao import paginar_por_chave
+from .vinculacao import LIMIAR_PADRAO, Registro, gravar_candidatos, pontuar
+from .utils import (
+    TAMANHO_CONSULTA_IN, carregar_candidatos, estimar_total_linhas, importar_planilha, ler_planilha_em_blocos,
+    mapear_colunas_amostras, mapear_planilha, previsualizar_planilha, resolver_conflitos_filtrados,
+    snapshot_somente_leitura
+)
+
+
+CABECALHO_AMOSTRAS = 'Nome paciente,Data de nascimento,Nome da mãe,ID_Projeto,Sexo,CPF,Amostra_biologica,Sangue,Plasma,Soro,DNA,RNA'
+
+
+def planilha(*linhas):
+    """
+    Monta um CSV de amostras biológicas com as linhas informadas.
+    """
+    conteudo = '\n'.join((CABECALHO_AMOSTRAS,) + linhas) + '\n'
+    return SimpleUploadedFile('amostras.csv', conteudo.encode('utf-8'))
+
+
+def estado_do_banco():
+    """
+    Pacientes e conflitos sem ids, datas e ID único, para comparar duas importações.
+    """
+    ignorados = {'id', 'id_unico', 'data_cadastro', 'data_atualizacao'}
+    pacientes = sorted(
+        (
+            {campo: valor for campo, valor in paciente.items() if campo not in ignorados}
+            for paciente in Paciente.objects.values()
+        ),
+        key=lambda paciente: paciente['nome_paciente']
+    )
+    conflitos = sorted(ConflitoDados.objects.values_list(
+        'paciente__nome_paciente', 'campo', 'valor_existente', 'valor_novo', 'status'
+    ))
+    return pacientes, conflitos
+
+
+class ImportacaoEmLoteTests(TestCase):
+    
+    linhas = (
+        'Ana Souza,01/02/2001,Mae Ana,P1,F,,x,sim,,,1,',
+        'Bruno Lima,03/04/2002,Mae Bruno,P1,M,,x,,a,,,',
+        # Duplicatas dentro do mesmo lote: preenchem campos vazios e/ou geram conflito
+        'ana souza,01/02/2001,Mae Ana,P1,F,,x,sim,b,,2,',
+        'Bruno Lima,03/04/2002,Mae Bruno,P2,M,,x,nao,a,,,',
+        'Bruno Lima,03/04/2002,Mae Bruno,,M,,x,,,s,,',
+        'Carla Dias,05/06/2003,Mae Carla,,F,123,x,,,,,',
+        # O mesmo conflito de novo não é duplicado
+        'Ana Souza,01/02/2001,Mae Ana,P1,F,,x,sim,b,,2,',
+    )
+    
+    def importar(self, em_lote):
+        Paciente.objects.create(
+            nome_paciente='Carla Dias', data_nascimento='2003-06-05', nome_mae='Mae Carla', cpf='999'
+        )
+        resultados = importar_planilha(planilha(*self.linhas), 'amostras', em_lote=em_lote)
+        contagens = {chave: resultados[chave] for chave in ('novos', 'atualizados', 'conflitos', 'erros')}
+        return contagens, estado_do_banco()
+    
+    def test_lote_equivale_a_linha_a_linha(self):
+        linha_a_linha = self.importar(em_lote=False)
+        Paciente.objects.all().delete()
+        em_lote = self.importar(em_lote=True)
+        
+        self.assertEqual(em_lote, linha_a_linha)
+        contagens, (pacientes, conflitos) = em_lote
+        self.assertEqual(contagens, {'novos': 2, 'atualizados': 1, 'conflitos': 4, 'erros': 0})
+        self.assertEqual(
+            [(p['nome_paciente'], p['sangue'], p['plasma'], p['soro'], p['dna']) for p in pacientes],
+            [('Ana Souza', 'sim', 'b', None, '1'), ('Bruno Lima', 'nao', 'a', 's', None), ('Carla Dias', None, None, None, None)]
+        )
+        self.assertEqual(conflitos, [
+            ('Ana Souza', 'dna', '1', '2', 'novo'),
+            ('Bruno Lima', 'id_projeto', 'P1', 'P2', 'novo'),
+            ('Carla Dias', 'cpf', '999', '123', 'novo'),
+        ])
+    
+    def test_falha_na_gravacao_em_lote_refaz_linha_a_linha(self):
+        # Um gatilho recusa um dos pacientes: o bulk_create do lote falha e
+        # só essa linha deve sair como erro
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TRIGGER recusa_paciente BEFORE INSERT ON pacientes_paciente "
+                "WHEN NEW.nome_paciente = 'Recusado' BEGIN SELECT RAISE(ABORT, 'paciente recusado'); END"
+            )
+        
+        resultados = importar_planilha(planilha(
+            'Ana Souza,01/02/2001,Mae Ana,P1,F,,,,,,,',
+            'Recusado,03/04/2002,Mae R,P1,M,,,,,,,',
+            'Bruno Lima,05/06/2003,Mae Bruno,P1,M,,,,,,,',
+        ), 'amostras', em_lote=True)
+        
+        self.assertEqual((resultados['novos'], resultados['erros']), (2, 1))
+        self.assertEqual(
+            sorted(Paciente.objects.values_list('nome_paciente', flat=True)), ['Ana Souza', 'Bruno Lima']
+        )
+
+
+class ReimportacaoTests(TestCase):
+    
+    def test_valores_legados_com_ponto_zero_nao_geram_conflito(self):
+        # Importações antigas gravavam números lidos como float ('10.0')
+        Paciente.objects.create(
+            nome_paciente='Ana', data_nascimento='2000-01-01', nome_mae='Mae A',
+            id_projeto='10.0', cpf='1234567890.0', dna='2.0'
+        )
+        
+        resultados = importar_planilha(planilha('Ana,01/01/2000,Mae A,10,F,1234567890,x,,,,2,'), 'amostras')
+        
+        self.assertEqual(resultados['conflitos'], 0)
+        self.assertFalse(ConflitoDados.objects.exists())
+    
+    def test_reimportacao_nao_duplica_conflitos_e_os_passa_para_a_importacao_atual(self):
+        Paciente.objects.create(nome_paciente='Ana', data_nascimento='2000-01-01', nome_mae='Mae A', sangue='nao')
+        linha = 'Ana,01/01/2000,Mae A,,F,,x,sim,,,,'
+        importar_planilha(planilha(linha), 'amostras')
+        
+        for em_lote in (False, True):
+            with self.subTest(em_lote=em_lote):
+                importacao = ImportacaoPlanilha.objects.create(tipo_planilha='amostras', status='processando')
+                importar_planilha(
+                    planilha(linha), 'amostras',
+                    em_lote=em_lote, importacao=importacao, pular_inalteradas=False
+                )
+                
+                conflito = ConflitoDados.objects.get()
+                self.assertEqual(conflito.importacao, importacao)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class InvalidacaoEstatisticasTests(TestCase):
+    
+    def test_importacao_invalida_cache_depois_do_commit(self):
+        obsoletas = {'total_pacientes': -1}
+        
+        def progresso(processadas, total):
+            # Outra requisição guarda as contagens antigas no meio da importação
+            cache.set(CHAVE_CACHE, obsoletas)
+        
+        for em_lote in (False, True):
+            with self.subTest(em_lote=em_lote):
+                cache.clear()
+                with self.captureOnCommitCallbacks(execute=True):
+                    importar_planilha(
+                        planilha(f'Paciente {int(em_lote)},01/01/2000,Mae,,F,,x,,,,,'), 'amostras',
+                        em_lote=em_lote, progresso=progresso
+                    )
+                
+                self.assertEqual(obter_estatisticas()['total_pacientes'], Paciente.objects.count())
+
+
+class PaginacaoPorChaveTests(TestCase):
+    
+    def setUp(self):
+        for i in range(7):
+            Paciente.objects.create(nome_paciente=f'Paciente {i}', data_nascimento='2000-01-01', nome_mae='Mae')
+        # Cinco pacientes com a mesma data de cadastro
+        empatados = Paciente.objects.order_by('id').values_list('id', flat=True)[1:6]
+        Paciente.objects.filter(id__in=list(empatados)).update(
+            data_cadastro=timezone.make_aware(datetime(2024, 1, 1))
+        )
+        self.ordem = list(Paciente.objects.order_by('-data_cadastro', '-id').values_list('id', flat=True))
+    
+    def test_percorre_empates_sem_repetir_nem_pular(self):
+        paginas = []
+        cursor = None
+        while True:
+            pagina = paginar_por_chave(Paciente.objects.all(), 'data_cadastro', cursor=cursor, tamanho=2)
+            paginas.append([paciente.id for paciente in pagina['itens']])
+            cursor = pagina['cursor_proximo']
+            if cursor is None:
+                break
+        
+        self.assertEqual([pk for pagina in paginas for pk in pagina], self.ordem)
+        
+        # Voltando a partir da última página, as páginas se repetem na ordem inversa
+        voltando = []
+        cursor = pagina['cursor_anterior']
+        while cursor is not None:
+            pagina = paginar_por_chave(Paciente.objects.all(), 'data_cadastro', cursor=cursor, anterior=True, tamanho=2)
+            voltando.append([paciente.id for paciente in pagina['itens']])
+            cursor = pagina['cursor_anterior']
+        
+        self.assertEqual(voltando, paginas[-2::-1])
+
+
+class MesclagemTests(TestCase):
+    
+    def criar(self, nome, **campos):
+        return Paciente.objects.create(nome_paciente=nome, data_nascimento='2001-03-04', nome_mae='Mae', **campos)
+    
+    def test_conflitos_pendentes_e_candidatos_passam_para_o_principal(self):
+        principal = self.criar('Ana', qi='5', sangue='b')
+        secundario = self.criar('Ana', qi='1', sangue='a')
+        outro_c = self.criar('Ana C')
+        outro_d = self.criar('Ana D')
+        ConflitoDados.objects.create(paciente=secundario, campo='qi', valor_existente='1', valor_novo='2')
+        # O valor novo já é o valor do principal: o conflito é descartado
+        ConflitoDados.objects.create(paciente=secundario, campo='sangue', valor_existente='a', valor_novo='b')
+        for paciente, duplicata in ((principal, secundario), (secundario, outro_c), (secundario, outro_d), (principal, outro_d)):
+            CandidatoDuplicata.objects.create(paciente=paciente, duplicata=duplicata, pontuacao=0.9)
+        
+        mesclar_pacientes(principal, secundario)
+        
+        self.assertFalse(Paciente.objects.filter(pk=secundario.pk).exists())
+        self.assertEqual(sorted(ConflitoDados.objects.values_list('paciente', 'campo', 'valor_existente', 'valor_novo')), [
+            (principal.pk, 'qi', '5', '1'),
+            (principal.pk, 'qi', '5', '2'),
+            (principal.pk, 'sangue', 'b', 'a'),
+        ])
+        self.assertEqual(
+            sorted(CandidatoDuplicata.objects.values_list('paciente', 'duplicata')),
+            [(principal.pk, outro_c.pk), (principal.pk, outro_d.pk)]
+        )
+    
+    def test_mesclar_em_lote_resolve_pares_encadeados(self):
+        a = self.criar('Ana')
+        b = self.criar('Ana', rna='s')
+        c = self.criar('Ana', dna='1')
+        
+        resultados = mesclar_em_lote([(a.pk, b.pk), (b.pk, c.pk)])
+        
+        self.assertEqual([secundario for _, secundario, _, _ in resultados], [b.pk, c.pk])
+        self.assertEqual(list(Paciente.objects.values_list('id', 'rna', 'dna')), [(a.pk, 's', '1')])
+
+
+class BuscaHistoricoTests(TestCase):
+    
+    def test_busca_ignora_acentos_e_ordena_por_relevancia(self):
+        pouco = Paciente.objects.create(
+            nome_paciente='Ana', data_nascimento='2000-01-01', nome_mae='Mae',
+            historico_gravidez='Gestação sem intercorrências; parto cesárea com anestesia geral e internação prolongada'
+        )
+        muito = Paciente.objects.create(
+            nome_paciente='Bia', data_nascimento='2000-01-01', nome_mae='Mae',
+            info_parto='Cesárea de urgência', historico_materno='Cesárea anterior'
+        )
+        Paciente.objects.create(nome_paciente='Caio', data_nascimento='2000-01-01', nome_mae='Mae', info_parto='Normal')
+        
+        encontrados = filtrar_por_historico(Paciente.objects.all(), 'cesarea', connection)
+        
+        self.assertEqual([paciente.pk for paciente in encontrados], [muito.pk, pouco.pk])
+
+
+class ReimportacaoIncrementalTests(TestCase):
+    
+    linhas = (
+        'Ana Souza,01/02/2001,Mae Ana,P1,F,,x,sim,,,1,',
+        'Bruno Lima,03/04/2002,Mae Bruno,P1,M,,x,,a,,,',
+        'Ana Souza,01/02/2001,Mae Ana,P1,F,,x,sim,,,1,',
+        'Carla Dias,05/06/2003,Mae Carla,,F,123,x,,,,,',
+    )
+    
+    def contagens(self, resultados):
+        return {chave: resultados[chave] for chave in ('novos', 'atualizados', 'conflitos', 'erros', 'inalteradas')}
+    
+    def test_contagens_nao_dependem_do_tamanho_do_lote(self):
+        alteradas = self.linhas + (
+            'Bruno Lima,03/04/2002,Mae Bruno,P2,M,,x,,a,,,',
+            'Bruno Lima,03/04/2002,Mae Bruno,P2,M,,x,,a,,,',
+            'Davi Reis,07/08/2004,Mae Davi,,M,,x,,,,,',
+        )
+        
+        por_tamanho = {}
+        for tamanho in (1000, 2, 1):
+            Paciente.objects.all().delete()
+            importar_planilha(planilha(*self.linhas), 'amostras', linhas_por_transacao=tamanho)
+            resultados = importar_planilha(planilha(*alteradas), 'amostras', linhas_por_transacao=tamanho)
+            por_tamanho[tamanho] = self.contagens(resultados)
+        
+        self.assertEqual(por_tamanho[2], por_tamanho[1000])
+        self.assertEqual(por_tamanho[1], por_tamanho[1000])
+        self.assertEqual(
+            por_tamanho[1000],
+            {'novos': 1, 'atualizados': 0, 'conflitos': 1, 'erros': 0, 'inalteradas': 5}
+        )
+    
+    def test_sem_pular_inalteradas_todas_as_linhas_sao_processadas(self):
+        importar_planilha(planilha(*self.linhas), 'amostras')
+        
+        resultados = importar_planilha(planilha(*self.linhas), 'amostras', pular_inalteradas=False)
+        
+        self.assertEqual(resultados['inalteradas'], 0)
+        self.assertEqual(resultados['atualizados'], 4)
+    
+    def test_reimportacao_depois_de_mesclar_nao_recria_o_secundario(self):
+        linhas = (
+            'Joao da Silva,01/02/2001,Mae Joao,,M,,x,sim,,,,',
+            'Joao da Silvaa,01/02/2001,Mae Joao,,M,,x,sim,,,,',
+        )
+        importar_planilha(planilha(*linhas), 'amostras')
+        principal, secundario = Paciente.objects.order_by('id')
+        
+        mesclar_pacientes(principal, secundario)
+        resultados = importar_planilha(planilha(*linhas), 'amostras')
+        
+        self.assertEqual(resultados['novos'], 0)
+        self.assertEqual(resultados['inalteradas'], 2)
+        self.assertEqual(list(Paciente.objects.values_list('id', flat=True)), [principal.pk])
+        self.assertEqual(AssinaturaLinha.objects.filter(paciente=principal).count(), 2)
+
+
+class PerfilProducaoSqliteTests(SimpleTestCase):
+    
+    def setUp(self):
+        pasta = tempfile.TemporaryDirectory()
+        self.addCleanup(pasta.cleanup)
+        self.caminho = Path(pasta.name) / 'perfil.sqlite3'
+        conexoes = ConnectionHandler({'default': {**settings.SQLITE_PERFIL_PRODUCAO, 'NAME': self.caminho}})
+        self.conexao = conexoes['default']
+        self.addCleanup(self.conexao.close)
+    
+    def test_pragmas_aplicados_na_conexao_nova(self):
+        with self.conexao.cursor() as cursor:
+            valores = {
+                pragma: cursor.execute(f'PRAGMA {pragma}').fetchone()[0]
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout')
+            }
+        
+        # synchronous=NORMAL é lido como 1
+        self.assertEqual(valores, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 30000})
+    
+    def test_transacao_pega_o_lock_de_escrita_no_begin(self):
+        self.conexao.ensure_connection()
+        self.conexao._start_transaction_under_autocommit()
+        self.addCleanup(self.conexao.connection.rollback)
+        
+        # Outra conexão não consegue escrever, mesmo sem escrita nesta transação
+        outra = sqlite3.connect(self.caminho, timeout=0)
+        self.addCleanup(outra.close)
+        with self.assertRaisesMessage(sqlite3.OperationalError, 'database is locked'):
+            outra.execute('CREATE TABLE t (x)')
+
+
+class IndiceDuplicatasTests(TestCase):
+    
+    def test_carrega_candidatos_sem_passar_do_limite_de_parametros(self):
+        pacientes = [
+            Paciente(
+                nome_paciente=f'Paciente {i}', data_nascimento=date(1990, 1, 1) + timedelta(days=i),
+                nome_mae=f'Mae {i}', id_unico=f'T{i}'
+            )
+            for i in range(TAMANHO_CONSULTA_IN * 2)
+        ]
+        for paciente in pacientes:
+            paciente.atualizar_campos_normalizados()
+        Paciente.objects.bulk_create(pacientes)
+        chaves = [(normalizar_texto(p.nome_paciente), p.data_nascimento) for p in pacientes]
+        # Chave com nome e data existentes, mas de pacientes diferentes
+        chaves.append((chaves[0][0], chaves[1][1]))
+        
+        parametros = []
+        
+        def contar_parametros(executar, sql, params, many, contexto):
+            parametros.append(len(params or ()))
+            return executar(sql, params, many, contexto)
+        
+        with connection.execute_wrapper(contar_parametros):
+            indice = carregar_candidatos(chaves, {})
+        
+        self.assertLessEqual(max(parametros), TAMANHO_CONSULTA_IN)
+        self.assertEqual(len(indice), len(chaves))
+        self.assertEqual([candidato.nome_mae_normalizado for candidato in indice[chaves[5]]], ['mae 5'])
+        self.assertEqual(indice[chaves[-1]], [])
+
+
+class IndicesConflitosTests(TestCase):
+    
+    def plano(self, queryset):
+        sql, parametros = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', parametros)
+            return ' | '.join(linha[-1] for linha in cursor.fetchall())
+    
+    def test_consultas_da_fila_usam_os_indices(self):
+        paciente = Paciente.objects.create(nome_paciente='Ana', data_nascimento='2000-01-01', nome_mae='Mae')
+        campos = ['sexo', 'cpf', 'rg', 'id_projeto', 'dna', 'sangue', 'plasma', 'qi', 'cars', 'nome_mae']
+        ConflitoDados.objects.bulk_create([
+            ConflitoDados(
+                paciente=paciente, campo=campos[i % len(campos)], valor_existente='antigo',
+                valor_novo=f'novo {i}', status='novo' if i % 5 == 0 else 'resolvido'
+            )
+            for i in range(2000)
+        ])
+        # Estatísticas para o planejador, como numa base real (ver medir_conflitos)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        
+        pendentes = ConflitoDados.objects.filter(status='novo')
+        fila = pendentes.order_by('-data_conflito', '-id')
+        status, _, do_paciente = (indice.name for indice in ConflitoDados._meta.indexes)
+        
+        casos = [
+            ('contagem', pendentes.order_by(), status),
+            ('fila', fila[:51], status),
+            ('fila por campo', fila.filter(campo='cpf')[:51], 'conflito_pendente_campo_idx'),
+            ('paciente', pendentes.filter(paciente=paciente), do_paciente),
+        ]
+        for nome, queryset, indice in casos:
+            with self.subTest(nome):
+                plano = self.plano(queryset).replace('COVERING INDEX', 'INDEX')
+                self.assertIn(f'USING INDEX {indice}', plano)
+                self.assertNotIn('TEMP B-TREE', plano)
+
+
+class IdUnicoTests(TestCase):
+    
+    def criar(self, nome, **campos):
+        return Paciente.objects.create(nome_paciente=nome, data_nascimento='2000-01-01', nome_mae='Mae', **campos)
+    
+    def test_ids_seguem_a_sequencia(self):
+        Sequencia.objects.update_or_create(nome='id_unico', defaults={'valor': 41})
+        
+        primeiro = self.criar('Ana')
+        lote = Paciente.gerar_ids_unicos(3)
+        segundo = self.criar('Bia')
+        informado = self.criar('Caio', id_unico='MANUAL1')
+        
+        self.assertEqual(primeiro.id_unico, 'PSB_Un42')
+        self.assertEqual(lote, ['PSB_Un43', 'PSB_Un44', 'PSB_Un45'])
+        self.assertEqual(segundo.id_unico, 'PSB_Un46')
+        self.assertEqual(informado.id_unico, 'MANUAL1')
+        self.assertEqual(Sequencia.objects.get(nome='id_unico').valor, 46)
+    
+    def test_insert_com_erro_nao_consome_numero(self):
+        Sequencia.objects.update_or_create(nome='id_unico', defaults={'valor': 10})
+        
+        invalido = Paciente(nome_paciente=None, data_nascimento='2000-01-01', nome_mae='Mae')
+        with self.assertRaises(IntegrityError):
+            invalido.save()
+        
+        self.assertIsNone(invalido.id_unico)
+        self.assertEqual(self.criar('Ana').id_unico, 'PSB_Un11')
+    
+    def test_migracao_inicia_sequencia_depois_do_maior_id_existente(self):
+        self.criar('Ana', id_unico='PSB_Un500')
+        self.criar('Bia', id_unico='PSB_UnXYZ')
+        self.criar('Caio', id_unico='OUTRO900')
+        Sequencia.objects.all().delete()
+        
+        migracao = importlib.import_module('pacientes.migrations.0005_sequencia_id_unico')
+        migracao.inicializar_sequencia(apps, None)
+        
+        self.assertEqual(Sequencia.objects.get(nome='id_unico').valor, 500)
+        self.assertEqual(self.criar('Davi').id_unico, 'PSB_Un501')
+
+
+class ResolucaoFiltradaTests(TestCase):
+    
+    def setUp(self):
+        self.ana = Paciente.objects.create(
+            nome_paciente='Ana', data_nascimento='2000-01-01', nome_mae='Mae', id_projeto='P1', sangue='a'
+        )
+        self.bia = Paciente.objects.create(
+            nome_paciente='Bia', data_nascimento='2000-01-01', nome_mae='Mae', id_projeto='P1', sangue='a'
+        )
+        Projeto.reconstruir()
+    
+    def conflito(self, paciente, campo, valor_novo):
+        return ConflitoDados.objects.create(
+            paciente=paciente, campo=campo,
+            valor_existente=getattr(paciente, campo) or '', valor_novo=valor_novo
+        )
+    
+    def test_aceitar_novos_aplica_o_valor_mais_recente_e_atualiza_projetos(self):
+        self.conflito(self.ana, 'sangue', 'b')
+        self.conflito(self.ana, 'sangue', 'c')
+        self.conflito(self.bia, 'nome_mae', 'Mãe Nova')
+        self.conflito(self.ana, 'id_projeto', 'P2')
+        
+        total = resolver_conflitos_filtrados(ConflitoDados.objects.all(), 'novo')
+        
+        self.assertEqual(total, 4)
+        self.assertFalse(ConflitoDados.objects.filter(status='novo').exists())
+        self.ana.refresh_from_db()
+        self.bia.refresh_from_db()
+        self.assertEqual((self.ana.sangue, self.ana.id_projeto), ('c', 'P2'))
+        self.assertEqual((self.bia.nome_mae, self.bia.nome_mae_normalizado), ('Mãe Nova', 'mae nova'))
+        self.assertEqual(sorted(Projeto.objects.values_list('codigo', flat=True)), ['P1', 'P2'])
+    
+    def test_manter_existentes_so_resolve_o_conjunto_filtrado(self):
+        self.conflito(self.ana, 'sangue', 'b')
+        self.conflito(self.bia, 'sangue', 'b')
+        outro = self.conflito(self.ana, 'dna', '1')
+        
+        total = resolver_conflitos_filtrados(ConflitoDados.objects.filter(campo='sangue'), 'existente')
+        
+        self.assertEqual(total, 2)
+        self.assertEqual(list(ConflitoDados.objects.filter(status='novo')), [outro])
+        self.assertEqual(set(ConflitoDados.objects.filter(campo='sangue').values_list('valor_escolhido', flat=True)), {'a'})
+        self.assertEqual(Paciente.objects.filter(sangue='a').count(), 2)
+    
+    def test_erro_ao_aplicar_valores_e_informado_sem_resolver_nada(self):
+        # Aceitar o ID único da Ana para a Bia viola a unicidade do campo
+        self.conflito(self.bia, 'id_unico', self.ana.id_unico)
+        self.conflito(self.bia, 'sangue', 'b')
+        
+        resposta = self.client.post(reverse('resolver_conflitos'), {'acao': 'aceitar_novos'})
+        
+        self.assertRedirects(resposta, reverse('resolver_conflitos'), fetch_redirect_response=False)
+        mensagens = [str(mensagem) for mensagem in get_messages(resposta.wsgi_request)]
+        self.assertEqual(len(mensagens), 1)
+        self.assertTrue(mensagens[0].startswith('Nenhum conflito foi resolvido'))
+        self.assertEqual(ConflitoDados.objects.filter(status='novo').count(), 2)
+        self.bia.refresh_from_db()
+        self.assertEqual(self.bia.sangue, 'a')
+    
+    def test_valor_invalido_na_pagina_e_informado_sem_resolver_nada(self):
+        invalido = self.conflito(self.ana, 'data_nascimento_mae', '31/02/1970')
+        valido = self.conflito(self.ana, 'sangue', 'b')
+        
+        resposta = self.client.post(reverse('resolver_conflitos'), {
+            f'conflito_{invalido.pk}': 'novo',
+            f'conflito_{valido.pk}': 'novo',
+        })
+        
+        mensagens = [str(mensagem) for mensagem in get_messages(resposta.wsgi_request)]
+        self.assertEqual(len(mensagens), 1)
+        self.assertTrue(mensagens[0].startswith('Nenhum conflito foi resolvido'))
+        self.assertEqual(ConflitoDados.objects.filter(status='novo').count(), 2)
+
+
+class BuscaPorNomeTests(TestCase):
+    
+    def setUp(self):
+        for nome, mae in (('José da Silva', 'Maria Souza'), ('Silvana Reis', 'Ana Lima'), ('João Pedro', 'Márcia Silva')):
+            Paciente.objects.create(nome_paciente=nome, data_nascimento='2000-01-01', nome_mae=mae)
+    
+    def nomes(self, **parametros):
+        resposta = self.client.get(reverse('listar_pacientes'), parametros)
+        pacientes = sorted(paciente.nome_paciente for paciente in resposta.context['pacientes'])
+        return pacientes, resposta.context['buscas_parciais']
+    
+    def test_busca_pelo_inicio_sem_acentos_nem_maiusculas(self):
+        self.assertEqual(self.nomes(busca_nome='JOSE'), (['José da Silva'], []))
+        self.assertEqual(self.nomes(busca_mae='marcia'), (['João Pedro'], []))
+    
+    def test_prefixo_encontrado_nao_busca_no_meio_do_nome(self):
+        self.assertEqual(self.nomes(busca_nome='silv'), (['Silvana Reis'], []))
+    
+    def test_sem_prefixo_busca_em_qualquer_parte_e_avisa(self):
+        self.assertEqual(self.nomes(busca_nome='da silva'), (['José da Silva'], ['Nome do Paciente']))
+        self.assertEqual(self.nomes(busca_mae='SOUZA'), (['José da Silva'], ['Nome da Mãe']))
+        
+        resposta = self.client.get(reverse('listar_pacientes'), {'busca_nome': 'pedro'})
+        self.assertContains(resposta, 'mostrando os pacientes em que ele aparece')
+        self.assertContains(resposta, 'João Pedro')
+
+
+class VinculacaoTests(TestCase):
+    
+    MAE = 'maria aparecida silva'
+    
+    def pontuacao(self, nome_a, data_a, nome_b, data_b, cpf_a=None, cpf_b=None, mae_b=MAE):
+        registro_a = Registro(1, nome_a, self.MAE, date.fromisoformat(data_a), cpf_a)
+        registro_b = Registro(2, nome_b, mae_b, date.fromisoformat(data_b), cpf_b)
+        return pontuar(registro_a, registro_b)[0]
+    
+    def test_irmaos_nao_sao_candidatos(self):
+        # Mesma mãe, mesmos sobrenomes, mesmo ano e mês: só o primeiro nome e o dia mudam
+        irmaos = [
+            ('joao pedro santos', '2010-03-05', 'maria clara santos', '2010-03-17'),
+            ('lucas oliveira costa', '2015-07-01', 'pedro oliveira costa', '2015-07-28'),
+            ('ana souza lima', '2008-11-02', 'julia souza lima', '2008-11-09'),
+            ('rafael ferreira', '2012-01-10', 'gabriel ferreira', '2012-01-30'),
+        ]
+        for nome_a, data_a, nome_b, data_b in irmaos:
+            with self.subTest(nome_a=nome_a, nome_b=nome_b):
+                self.assertLess(self.pontuacao(nome_a, data_a, nome_b, data_b), LIMIAR_PADRAO)
+        
+        for nome_a, data_a, nome_b, data_b in irmaos:
+            for nome, data in ((nome_a, data_a), (nome_b, data_b)):
+                Paciente.objects.create(nome_paciente=nome, data_nascimento=data, nome_mae=self.MAE)
+        self.assertEqual(gravar_candidatos(), 0)
+        self.assertFalse(CandidatoDuplicata.objects.exists())
+    
+    def test_duplicatas_continuam_sendo_candidatas(self):
+        duplicatas = [
+            # Erro de digitação no primeiro nome
+            ('fernanda lima costa', '2001-05-04', 'fernamda lima costa', '2001-05-04'),
+            # Dia e mês trocados
+            ('carlos eduardo rocha', '1999-03-07', 'carlos eduardo rocha', '1999-07-03'),
+            # Ordem das palavras trocada
+            ('silva joana', '1985-10-20', 'joana silva', '1985-10-20'),
+            # Primeiro nome abreviado
+            ('m santos oliveira', '1990-02-14', 'marcos santos oliveira', '1990-02-14'),
+        ]
+        for nome_a, data_a, nome_b, data_b in duplicatas:
+            with self.subTest(nome_a=nome_a, nome_b=nome_b):
+                self.assertGreaterEqual(self.pontuacao(nome_a, data_a, nome_b, data_b), LIMIAR_PADRAO)
+    
+    def test_cpf_igual_confirma_mesmo_com_primeiro_nome_diferente(self):
+        # Sem CPF, mesmo nascimento e primeiros nomes diferentes são gêmeos;
+        # com o mesmo CPF é a mesma pessoa cadastrada com outro primeiro nome
+        self.assertLess(
+            self.pontuacao('joao santos', '2010-03-05', 'lucas santos', '2010-03-05'),
+            LIMIAR_PADRAO
+        )
+        self.assertGreaterEqual(
+            self.pontuacao('joao santos', '2010-03-05', 'lucas santos', '2010-03-05', '12345678900', '12345678900'),
+            LIMIAR_PADRAO
+        )
+
+
+class ResultadoLinhaTests(TestCase):
+    
+    def importar(self, *linhas, **opcoes):
+        importacao = ImportacaoPlanilha.objects.create(
+            tipo_planilha='amostras', status='processando', nome_arquivo='amostras.csv'
+        )
+        resultados = importar_planilha(planilha(*linhas), 'amostras', importacao=importacao, **opcoes)
+        return importacao, resultados
+    
+    def test_um_resultado_por_linha_com_a_mensagem_so_nos_erros(self):
+        importar_planilha(planilha('Ana Souza,01/01/2000,Maria,P1,F,,,,,,,'), 'amostras')
+        importacao, resultados = self.importar(
+            'Bruno Lima,02/02/1990,Clara,P1,M,,,,,,,',
+            'Ana Souza,01/01/2000,Maria,P1,F,,,,,,,',
+            'Ana Souza,01/01/2000,Joana,P1,F,,,,,,,',
+            ',03/03/1980,Rita,P1,F,,,,,,,',
+        )
+        
+        self.assertEqual(resultados['total'], 4)
+        linhas = list(importacao.resultados_linhas.order_by('linha').values_list('linha', 'status', 'mensagem'))
+        self.assertEqual([linha for linha, _, _ in linhas], [2, 3, 4, 5])
+        self.assertEqual(
+            [status for _, status, _ in linhas],
+            [ResultadoLinha.NOVO, ResultadoLinha.INALTERADA, ResultadoLinha.CONFLITO, ResultadoLinha.ERRO]
+        )
+        self.assertEqual([mensagem is None for _, _, mensagem in linhas], [True, True, True, False])
+        
+        bruno = Paciente.objects.get(nome_paciente='Bruno Lima')
+        self.assertEqual(importacao.resultados_linhas.get(linha=2).paciente_id, bruno.pk)
+    
+    def test_tudo_ou_nada_guarda_so_as_linhas_com_erro(self):
+        importacao, resultados = self.importar(
+            'Bruno Lima,02/02/1990,Clara,P1,M,,,,,,,',
+            ',03/03/1980,Rita,P1,F,,,,,,,',
+            tudo_ou_nada=True,
+        )
+        
+        self.assertIn('erro', resultados)
+        self.assertFalse(Paciente.objects.exists())
+        self.assertEqual(
+            list(importacao.resultados_linhas.values_list('linha', 'status')),
+            [(3, ResultadoLinha.ERRO)]
+        )
+    
+    def test_pagina_da_importacao_lista_as_linhas_com_erro(self):
+        importacao, _ = self.importar(
+            'Bruno Lima,02/02/1990,Clara,P1,M,,,,,,,',
+            ',03/03/1980,Rita,P1,F,,,,,,,',
+        )
+        importacao.status = 'concluida'
+        importacao.save()
+        
+        resposta = self.client.get(reverse('acompanhar_importacao', args=[importacao.pk]))
+        self.assertEqual([resultado.linha for resultado in resposta.context['linhas_com_erro']], [3])
+    
+    def test_admin_nao_consulta_a_importacao_de_cada_linha(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'senha'))
+        url = reverse('admin:pacientes_resultadolinha_changelist')
+        
+        self.importar('Bruno Lima,02/02/1990,Clara,P1,M,,,,,,,')
+        with CaptureQueriesContext(connection) as uma_importacao:
+            self.client.get(url)
+        for indice in range(5):
+            self.importar(f'Paciente {indice},02/02/1990,Clara,P1,M,,,,,,,')
+        with CaptureQueriesContext(connection) as varias_importacoes:
+            resposta = self.client.get(url)
+        
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(varias_importacoes), len(uma_importacao))
+
+
+class MapeamentoVetorizadoTests(SimpleTestCase):
+    
+    def test_planilha_inteira_equivale_a_linha_a_linha(self):
+        df = pd.DataFrame({
+            'Nome paciente': ['  Ana Souza ', 'Bruno', '', None, 'Carla'],
+            'Data de nascimento': [
+                '01/02/2001', '2002-04-03', pd.Timestamp('2003-06-05'), 'data inválida', datetime(1850, 1, 1)
+            ],
+            'Nome da mãe': ['Mae Ana', '   ', float('nan'), 'Mae', 'Mae Carla'],
+            'CPF': [12345678900, None, 1.5, 0, 99],
+            'Sangue': [pd.Timestamp('2020-01-01 10:30'), None, 'sim', ' ', 'x'],
+        })
+        
+        por_linha = [mapear_colunas_amostras(linha) for _, linha in df.iterrows()]
+        self.assertEqual(mapear_planilha(df, 'amostras'), por_linha)
+        self.assertEqual(
+            [(dados['nome_paciente'], dados['data_nascimento'], dados['nome_mae']) for dados in por_linha],
+            [
+                ('Ana Souza', date(2001, 2, 1), 'Mae Ana'),
+                ('Bruno', date(2002, 4, 3), None),
+                (None, date(2003, 6, 5), None),
+                (None, None, 'Mae'),
+                ('Carla', date(1850, 1, 1), 'Mae Carla'),
+            ]
+        )
+        # Colunas ausentes na planilha ficam vazias
+        self.assertTrue(all(dados['rna'] is None for dados in por_linha))
+
+
+class FilaImportacaoTests(TestCase):
+    
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        configuracao = override_settings(MEDIA_ROOT=self.media.name)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+    
+    def enviar(self, *linhas):
+        resposta = self.client.post(reverse('upload_planilha'), {
+            'arquivo': planilha(*linhas), 'tipo_planilha': 'amostras',
+        })
+        importacao = ImportacaoPlanilha.objects.latest('pk')
+        self.assertRedirects(resposta, reverse('acompanhar_importacao', args=[importacao.pk]))
+        return importacao
+    
+    def status(self, importacao):
+        return self.client.get(reverse('status_importacao', args=[importacao.pk])).json()
+    
+    def test_upload_so_enfileira_e_o_worker_processa(self):
+        importacao = self.enviar('Ana Souza,01/01/2000,Maria,P1,F,,,,,,,', ',02/02/2000,Rita,P1,F,,,,,,,')
+        
+        self.assertEqual(importacao.status, 'pendente')
+        self.assertFalse(Paciente.objects.exists())
+        self.assertEqual(self.status(importacao)['finalizada'], False)
+        
+        call_command('processar_importacoes', '--uma-vez', stdout=StringIO())
+        
+        status = self.status(importacao)
+        self.assertEqual(
+            {chave: status[chave] for chave in ('status', 'finalizada', 'total', 'processadas', 'percentual', 'novos', 'erros')},
+            {'status': 'concluida', 'finalizada': True, 'total': 2, 'processadas': 2, 'percentual': 100, 'novos': 1, 'erros': 1}
+        )
+        importacao.refresh_from_db()
+        self.assertFalse(importacao.arquivo)
+        self.assertEqual(list(Path(self.media.name).rglob('*.csv')), [])
+    
+    def test_reserva_a_mais_antiga_uma_unica_vez(self):
+        primeira = self.enviar('Ana Souza,01/01/2000,Maria,P1,F,,,,,,,')
+        segunda = self.enviar('Bruno Lima,01/01/2000,Clara,P1,M,,,,,,,')
+        
+        self.assertEqual(ImportacaoPlanilha.reservar_proxima().pk, primeira.pk)
+        self.assertEqual(ImportacaoPlanilha.reservar_proxima().pk, segunda.pk)
+        self.assertIsNone(ImportacaoPlanilha.reservar_proxima())
+        
+        primeira.refresh_from_db()
+        self.assertEqual(primeira.status, 'processando')
+        self.assertIsNotNone(primeira.ultima_atividade)
+    
+    def test_importacao_sem_sinal_de_vida_e_encerrada_pelo_status(self):
+        importacao = self.enviar('Ana Souza,01/01/2000,Maria,P1,F,,,,,,,')
+        ImportacaoPlanilha.reservar_proxima()
+        
+        # Com sinal de vida recente, continua processando
+        self.assertEqual(self.status(importacao)['status'], 'processando')
+        
+        ImportacaoPlanilha.objects.filter(pk=importacao.pk).update(
+            ultima_atividade=timezone.now() - ImportacaoPlanilha.TEMPO_SEM_ATIVIDADE - timedelta(minutes=1)
+        )
+        status = self.status(importacao)
+        self.assertEqual((status['status'], status['finalizada']), ('erro', True))
+        self.assertIn('interrompido', status['mensagem_erro'])
+        self.assertEqual(list(Path(self.media.name).rglob('*.csv')), [])
+
+
+class ExportacaoTests(TestCase):
+    
+    def setUp(self):
+        Paciente.objects.create(
+            nome_paciente='Ana Souza', data_nascimento='2001-02-01', nome_mae='Maria', id_projeto='P1', sangue='sim'
+        )
+        Paciente.objects.create(nome_paciente='Bruno Lima', data_nascimento='2002-04-03', nome_mae='Clara', id_projeto='P2')
+    
+    def exportar(self, formato, campos=(), projeto=''):
+        return self.client.post(reverse('exportar_dados'), {
+            'formato': formato, 'campos_selecionados': list(campos), 'projeto': projeto,
+        })
+    
+    def test_csv_em_streaming_so_com_as_colunas_pedidas(self):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.exportar('csv', ['nome_paciente', 'data_nascimento', 'sangue'], projeto='P1')
+            conteudo = b''.join(resposta.streaming_content).decode('utf-8')
+        
+        self.assertTrue(resposta.streaming)
+        ana = Paciente.objects.get(nome_paciente='Ana Souza')
+        self.assertEqual(conteudo, f'\ufeffID,Nome Paciente,Data Nascimento,Sangue\n{ana.pk},Ana Souza,01/02/2001,sim\n')
+        sql = ' '.join(consulta['sql'] for consulta in consultas)
+        self.assertNotIn('nome_mae', sql)
+    
+    def test_excel_com_cabecalho_em_negrito_e_campos_vazios_em_branco(self):
+        resposta = self.exportar('excel', ['nome_paciente', 'data_nascimento', 'sangue'])
+        arquivo = BytesIO(b''.join(resposta.streaming_content))
+        
+        self.assertEqual(
+            resposta['Content-Type'], 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        planilha_exportada = load_workbook(arquivo)['Pacientes']
+        linhas = list(planilha_exportada.iter_rows(values_only=True))
+        self.assertEqual(linhas[0], ('ID', 'Nome Paciente', 'Data Nascimento', 'Sangue'))
+        self.assertEqual(
+            sorted(linha[1:] for linha in linhas[1:]),
+            [('Ana Souza', '01/02/2001', 'sim'), ('Bruno Lima', '03/04/2002', None)]
+        )
+        self.assertTrue(all(celula.font.b for celula in planilha_exportada[1]))
+    
+    def test_registro_cobre_os_campos_do_formulario_e_formata_cada_tipo(self):
+        self.assertTrue(set(campo for campo, _ in FiltroExportacaoForm.CAMPOS_DISPONIVEIS) <= set(COLUNAS_EXPORTACAO))
+        
+        formatar = compilar_formatador(['data_nascimento', 'data_cadastro', 'nome_paciente', 'sangue'], limite_texto=10)
+        self.assertEqual(
+            formatar([date(2001, 2, 1), datetime(2024, 5, 6, 7, 8), 'Ana Souza Lima', None]),
+            ['01/02/2001', '06/05/2024 07:08', 'Ana Sou...', '']
+        )
+    
+    def test_visualizacao_usa_rotulos_curtos_e_trunca_textos(self):
+        Paciente.objects.filter(nome_paciente='Ana Souza').update(historico_materno='x' * 80)
+        
+        resposta = self.exportar('visualizar', ['nome_paciente', 'historico_materno', 'comunicacao_vineland'], projeto='P1')
+        
+        self.assertEqual(resposta.context['cabecalhos'], ['ID', 'Nome Paciente', 'Histórico Materno', 'Com. Vineland'])
+        ana = Paciente.objects.get(nome_paciente='Ana Souza')
+        self.assertEqual(resposta.context['dados'], [[ana.pk, 'Ana Souza', 'x' * 47 + '...', '-']])
+
+
+class ProjetoTests(TestCase):
+    
+    def projetos(self):
+        return list(Projeto.objects.values_list('codigo', flat=True))
+    
+    def test_sinais_mantem_a_lista_ao_criar_mudar_e_apagar(self):
+        ana = Paciente.objects.create(nome_paciente='Ana', data_nascimento='2000-01-01', nome_mae='Maria', id_projeto='P1')
+        bruno = Paciente.objects.create(nome_paciente='Bruno', data_nascimento='2000-01-01', nome_mae='Clara', id_projeto='P1')
+        self.assertEqual(self.projetos(), ['P1'])
+        
+        # P1 continua enquanto o Bruno estiver nele
+        ana.id_projeto = 'P2'
+        ana.save()
+        self.assertEqual(self.projetos(), ['P1', 'P2'])
+        
+        # Gravar outros campos não mexe na lista
+        bruno.sexo = 'M'
+        bruno.save(update_fields=['sexo'])
+        self.assertEqual(self.projetos(), ['P1', 'P2'])
+        
+        bruno.delete()
+        self.assertEqual(self.projetos(), ['P2'])
+    
+    def test_importacao_em_lote_registra_os_projetos(self):
+        importar_planilha(planilha(
+            'Ana Souza,01/01/2000,Maria,P1,F,,,,,,,',
+            'Bruno Lima,01/01/2000,Clara,P2,M,,,,,,,',
+            'Carla Dias,01/01/2000,Rita,,F,,,,,,,',
+        ), 'amostras', em_lote=True)
+        
+        self.assertEqual(self.projetos(), ['P1', 'P2'])
+        resposta = self.client.get(reverse('listar_pacientes'))
+        self.assertEqual(list(resposta.context['projetos']), ['P1', 'P2'])
+    
+    def test_reconstruir_corrige_alteracoes_em_massa(self):
+        Paciente.objects.create(nome_paciente='Ana', data_nascimento='2000-01-01', nome_mae='Maria', id_projeto='P1')
+        # UPDATE em massa não dispara os sinais
+        Paciente.objects.update(id_projeto='P3')
+        self.assertEqual(self.projetos(), ['P1'])
+        
+        Projeto.reconstruir()
+        self.assertEqual(self.projetos(), ['P3'])
+
+
+class ResolucaoPorPaginaTests(TestCase):
+    
+    CAMPOS = ['sangue', 'plasma', 'soro', 'dna', 'rna', 'saliva']
+    
+    def setUp(self):
+        self.ana = Paciente.objects.create(
+            nome_paciente='Ana', data_nascimento='2000-01-01', nome_mae='Mae', id_projeto='P1', sangue='a'
+        )
+    
+    def resolver(self, escolhas):
+        return self.client.post(reverse('resolver_conflitos'), {
+            f'conflito_{conflito.pk}': escolha for conflito, escolha in escolhas
+        })
+    
+    def conflitos(self, quantidade):
+        return [
+            ConflitoDados.objects.create(paciente=self.ana, campo=campo, valor_existente='', valor_novo=f'{campo} novo')
+            for campo in self.CAMPOS[:quantidade]
+        ]
+    
+    def test_consultas_nao_dependem_da_quantidade_de_conflitos(self):
+        poucos = self.conflitos(2)
+        with CaptureQueriesContext(connection) as consultas_poucos:
+            self.resolver((conflito, 'novo') for conflito in poucos)
+        ConflitoDados.objects.all().delete()
+        muitos = self.conflitos(6)
+        with CaptureQueriesContext(connection) as consultas_muitos:
+            self.resolver((conflito, 'novo') for conflito in muitos)
+        
+        self.assertEqual(len(consultas_muitos), len(consultas_poucos))
+        self.ana.refresh_from_db()
+        self.assertEqual([getattr(self.ana, campo) for campo in self.CAMPOS], [f'{campo} novo' for campo in self.CAMPOS])
+    
+    def test_mesmo_campo_prevalece_a_ultima_escolha_e_so_os_enviados_sao_resolvidos(self):
+        manter = ConflitoDados.objects.create(paciente=self.ana, campo='sangue', valor_existente='a', valor_novo='b')
+        aceitar = ConflitoDados.objects.create(paciente=self.ana, campo='sangue', valor_existente='a', valor_novo='c')
+        projeto = ConflitoDados.objects.create(paciente=self.ana, campo='id_projeto', valor_existente='P1', valor_novo='P2')
+        fora_da_pagina = ConflitoDados.objects.create(paciente=self.ana, campo='soro', valor_existente='', valor_novo='x')
+        
+        self.resolver([(manter, 'existente'), (aceitar, 'novo'), (projeto, 'novo')])
+        
+        self.ana.refresh_from_db()
+        self.assertEqual((self.ana.sangue, self.ana.soro, self.ana.id_projeto), ('c', None, 'P2'))
+        self.assertEqual(list(Projeto.objects.values_list('codigo', flat=True)), ['P2'])
+        self.assertEqual(
+            dict(ConflitoDados.objects.values_list('pk', 'valor_escolhido')),
+            {manter.pk: 'a', aceitar.pk: 'c', projeto.pk: 'P2', fora_da_pagina.pk: None}
+        )
+
+
+class LeituraEmBlocosTests(SimpleTestCase):
+    
+    def xlsx(self, *linhas):
+        livro = Workbook()
+        for linha in linhas:
+            livro.active.append(linha)
+        conteudo = BytesIO()
+        livro.save(conteudo)
+        return SimpleUploadedFile('amostras.xlsx', conteudo.getvalue())
+    
+    def test_csv_em_blocos_equivale_a_leitura_inteira(self):
+        arquivo = planilha(*(f'Paciente {indice},01/01/2000,Mae,P1,F,{indice:03d},,,,,,' for indice in range(5)))
+        
+        blocos = list(ler_planilha_em_blocos(arquivo, tamanho_bloco=2))
+        
+        self.assertEqual([len(bloco) for bloco in blocos], [2, 2, 1])
+        arquivo.seek(0)
+        pd.testing.assert_frame_equal(pd.concat(blocos), pd.read_csv(arquivo, dtype=str))
+        # Lido como texto: zeros à esquerda não dependem do bloco
+        self.assertEqual(blocos[0]['CPF'].tolist(), ['000', '001'])
+        arquivo.seek(0)
+        self.assertEqual(estimar_total_linhas(arquivo), 5)
+    
+    def test_xlsx_em_blocos_mantem_linhas_vazias_do_meio_e_numeracao(self):
+        arquivo = self.xlsx(
+            ('Nome', 'Data', None, 'Nome'),
+            ('Ana', datetime(2000, 1, 1), 1, 'x'),
+            (None, None, None, None),
+            ('Bruno', datetime(2001, 2, 3), 2.5, None),
+            ('Carla', None, None, 'y'),
+            (None, None, None, None),
+        )
+        
+        blocos = list(ler_planilha_em_blocos(arquivo, tamanho_bloco=2))
+        
+        self.assertEqual([bloco.index.tolist() for bloco in blocos], [[0, 1], [2, 3]])
+        df = pd.concat(blocos)
+        self.assertEqual(df.columns.tolist(), ['Nome', 'Data', 'Unnamed: 2', 'Nome.1'])
+        self.assertEqual(df['Nome'].tolist(), ['Ana', None, 'Bruno', 'Carla'])
+        self.assertEqual(df['Unnamed: 2'].tolist(), [1, None, 2.5, None])
+    
+    def test_planilha_so_com_cabecalho_gera_um_bloco_vazio(self):
+        for arquivo in (planilha(), self.xlsx(CABECALHO_AMOSTRAS.split(','))):
+            with self.subTest(arquivo=arquivo.name):
+                blocos = list(ler_planilha_em_blocos(arquivo))
+                self.assertEqual(len(blocos), 1)
+                self.assertTrue(blocos[0].empty)
+                self.assertEqual(blocos[0].columns.tolist(), CABECALHO_AMOSTRAS.split(','))
+
+
+class TransacoesImportacaoTests(TestCase):
+    
+    linhas = (
+        'Ana Souza,01/01/2000,Maria,P1,F,,,,,,,',
+        'Bruno Lima,02/02/2000,Clara,P2,M,,,,,,,',
+        'Ana Souza,01/01/2000,Maria,P3,F,,,,,,,',
+        ',03/03/2000,Rita,P1,F,,,,,,,',
+        'Carla Dias,04/04/2000,Joana,P1,F,,,,,,,',
+    )
+    
+    def test_erro_numa_linha_nao_desfaz_as_demais_e_o_progresso_e_por_transacao(self):
+        for em_lote in (False, True):
+            with self.subTest(em_lote=em_lote):
+                progresso = []
+                resultados = importar_planilha(
+                    planilha(*self.linhas), 'amostras', em_lote=em_lote, linhas_por_transacao=2,
+                    progresso=lambda processadas, total: progresso.append(processadas)
+                )
+                
+                self.assertEqual((resultados['novos'], resultados['conflitos'], resultados['erros']), (3, 1, 1))
+                self.assertEqual(Paciente.objects.count(), 3)
+                self.assertEqual(progresso, [0, 2, 4, 5])
+                Paciente.objects.all().delete()
+                AssinaturaLinha.objects.all().delete()
+    
+    def test_tudo_ou_nada_desfaz_a_planilha_inteira_se_alguma_linha_falhar(self):
+        resultados = importar_planilha(planilha(*self.linhas), 'amostras', em_lote=True, tudo_ou_nada=True)
+        
+        self.assertEqual(resultados, {'erro': '1 linha(s) com erro; nada foi importado. Linha 5: Campos obrigatórios ausentes'})
+        self.assertFalse(Paciente.objects.exists())
+        self.assertFalse(ConflitoDados.objects.exists())
+        self.assertFalse(Projeto.objects.exists())
+        self.assertFalse(AssinaturaLinha.objects.exists())
+    
+    def test_tudo_ou_nada_sem_erros_grava_tudo(self):
+        linhas = [linha for linha in self.linhas if not linha.startswith(',')]
+        
+        resultados = importar_planilha(planilha(*linhas), 'amostras', em_lote=True, tudo_ou_nada=True)
+        
+        self.assertNotIn('erro', resultados)
+        self.assertEqual((resultados['novos'], resultados['conflitos']), (3, 1))
+        self.assertEqual(Paciente.objects.count(), 3)
+        self.assertEqual(list(Projeto.objects.values_list('codigo', flat=True)), ['P1', 'P2'])
+
+
+class PreVisualizacaoTests(TransactionTestCase):
+    # A pré-visualização abre a própria transação (BEGIN DEFERRED), o que não
+    # é possível dentro da transação de cada teste do TestCase
+    
+    linhas = (
+        'Ana Souza,01/01/2000,Maria,P1,F,,,,,,,',
+        'Ana Souza,01/01/2000,Maria,P1,F,,,,,,,',
+        'Bruno Lima,02/02/2000,Clara,P2,M,,x,,,,,',
+        'Bruno Lima,02/02/2000,Clara,P3,M,,,,,,,',
+        ',03/03/2000,Rita,P1,F,,,,,,,',
+    )
+    
+    def setUp(self):
+        importar_planilha(planilha('Bruno Lima,02/02/2000,Clara,P2,M,,,,,,,'), 'amostras')
+    
+    def gravado(self):
+        return (
+            estado_do_banco(),
+            sorted(AssinaturaLinha.objects.values_list('assinatura', flat=True)),
+            list(Projeto.objects.values_list('codigo', flat=True)),
+            ImportacaoPlanilha.objects.count(),
+        )
+    
+    def test_preve_as_contagens_da_importacao_sem_gravar_nada(self):
+        antes = self.gravado()
+        
+        previa = previsualizar_planilha(planilha(*self.linhas), 'amostras')
+        
+        self.assertEqual(self.gravado(), antes)
+        self.assertEqual(previa['amostra']['erro'], [{'linha': 6, 'mensagem': 'Campos obrigatórios ausentes'}])
+        self.assertEqual(
+            previa['amostra']['conflito'][0]['diferencas'], [('id_projeto', 'P2', 'P3')]
+        )
+        resultados = importar_planilha(planilha(*self.linhas), 'amostras', em_lote=True)
+        for chave in ('total', 'novos', 'atualizados', 'conflitos', 'erros', 'inalteradas'):
+            self.assertEqual(previa[chave], resultados[chave], chave)
+    
+    def test_botao_previsualizar_nao_enfileira_a_planilha(self):
+        antes = self.gravado()
+        
+        resposta = self.client.post(reverse('upload_planilha'), {
+            'arquivo': planilha(*self.linhas), 'tipo_planilha': 'amostras', 'previsualizar': '1',
+        })
+        
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual((resposta.context['previa']['novos'], resposta.context['previa']['erros']), (1, 1))
+        self.assertContains(resposta, 'Nada foi gravado')
+        self.assertEqual(self.gravado(), antes)
+    
+    def test_snapshot_recusa_escritas_e_libera_a_conexao_ao_sair(self):
+        with self.assertRaises(DatabaseError):
+            with snapshot_somente_leitura():
+                Paciente.objects.create(nome_paciente='Carla', data_nascimento='2000-01-01', nome_mae='Rita')
+        
+        Paciente.objects.create(nome_paciente='Carla', data_nascimento='2000-01-01', nome_mae='Rita')
+        self.assertEqual(Paciente.objects.count(), 2)
@@ -9,7 +9,10 @@ urlpatterns = [
     path('pacientes/<int:pk>/editar/', views.editar_paciente, name='editar_paciente'),
     path('pacientes/<int:pk>/deletar/', views.deletar_paciente, name='deletar_paciente'),
     path('upload/', views.upload_planilha, name='upload_planilha'),
+    path('importacoes/<int:pk>/', views.acompanhar_importacao, name='acompanhar_importacao'),
+    path('importacoes/<int:pk>/status/', views.status_importacao, name='status_importacao'),
     path('conflitos/', views.resolver_conflitos, name='resolver_conflitos'),
+    path('duplicatas/', views.revisar_duplicatas, name='revisar_duplicatas'),
     path('exportar/', views.exportar_dados, name='exportar_dados'),
 ]
 
@@ -1,9 +1,37 @@
+import hashlib
+import re
+import numpy as np
+import openpyxl
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime
+from itertools import chain
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
 from django.utils import timezone
-from .models import Paciente, ConflitoDados
+from .models import (
+    Paciente, ConflitoDados, ImportacaoPlanilha, Projeto, ResultadoLinha, AssinaturaLinha, normalizar_texto
+)
+from .estatisticas import invalidar_estatisticas
 
 
+# Quantidade de linhas gravadas por vez no modo de importação em lote
+TAMANHO_LOTE = 1000
+
+# Linhas lidas e mapeadas por vez (blocos menores deixam o mapeamento
+# vetorizado lento, pelo custo fixo do pandas por coluna)
+TAMANHO_BLOCO_LEITURA = 10000
+
+# Limite de parâmetros por consulta IN (o SQLite aceita no máximo 999)
+TAMANHO_CONSULTA_IN = 500
+
+# Linhas de exemplo de cada tipo de resultado na pré-visualização
+TAMANHO_AMOSTRA_PREVIA = 20
+
+# Planilhas Excel lidas em streaming pelo openpyxl (as demais, como .xls,
+# são lidas inteiras pelo pandas)
+EXTENSOES_OPENPYXL = ('.xlsx', '.xlsm')
+
 def detectar_tipo_planilha(df):
     """
     Detecta automaticamente o tipo de planilha com base nas colunas.
@@ -43,8 +71,7 @@ def normalizar_data(valor):
     
     if isinstance(valor, str):
         # Tenta vários formatos comuns
-        formatos = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d']
-        for formato in formatos:
+        for formato in FORMATOS_DATA:
             try:
                 return datetime.strptime(valor, formato).date()
             except ValueError:
@@ -68,244 +95,1334 @@ def normalizar_valor(valor):
     return str(valor)
 
 
-def mapear_colunas_amostras(row):
+# Mapeamento declarativo: (coluna da planilha, campo do modelo)
+COLUNAS_AMOSTRAS = [
+    ('Nome paciente', 'nome_paciente'),
+    ('Data de nascimento', 'data_nascimento'),
+    ('Nome da mãe', 'nome_mae'),
+    ('ID_Projeto', 'id_projeto'),
+    ('Sexo', 'sexo'),
+    ('RG', 'rg'),
+    ('CPF', 'cpf'),
+    ('CID10', 'cid10'),
+    ('Data de nascimento da mãe', 'data_nascimento_mae'),
+    ('ID_Familiar', 'id_familiar'),
+    ('ID_LPC_BIOB', 'id_lpc_biob'),
+    ('Amostra_biologica', 'amostra_biologica'),
+    ('Sangue', 'sangue'),
+    ('Plasma', 'plasma'),
+    ('Soro', 'soro'),
+    ('PaxGene', 'pax_gene'),
+    ('Saliva', 'saliva'),
+    ('SCU', 'scu'),
+    ('Placenta', 'placenta'),
+    ('Placenta_FFPE', 'placenta_ffpe'),
+    ('DNA', 'dna'),
+    ('RNA', 'rna'),
+    ('Proteína', 'proteina'),
+]
+
+COLUNAS_BIOINFO = [
+    ('Nome paciente', 'nome_paciente'),
+    ('Data de nascimento', 'data_nascimento'),
+    ('Nome da mãe', 'nome_mae'),
+    ('ID_Projeto', 'id_projeto'),
+    ('Sexo', 'sexo'),
+    ('Data de nascimento da mãe', 'data_nascimento_mae'),
+    ('Metiloma', 'metiloma'),
+    ('DNAm_gene', 'dnam_gene'),
+    ('DNA_Seq', 'dna_seq'),
+    ('Exoma', 'exoma'),
+    ('RNA_Seq', 'rna_seq'),
+    ('miRNA', 'mi_rna'),
+    ('Comprimento_telomerico', 'comprimento_telomerico'),
+    ('Citocinas', 'citocinas'),
+    ('Cortisol', 'cortisol'),
+    ('Exossomos', 'exossomos'),
+    ('PRS', 'prs'),
+    ('Outros', 'outros_bioinfo'),
+]
+
+COLUNAS_CLINICOS = [
+    ('Nome paciente', 'nome_paciente'),
+    ('Data de nascimento', 'data_nascimento'),
+    ('Nome da mãe', 'nome_mae'),
+    ('ID_Unico', 'id_unico'),
+    ('Projeto_originall', 'projeto_original'),
+    ('ID_Projeto', 'id_projeto'),
+    ('Sexo', 'sexo'),
+    ('RG', 'rg'),
+    ('CPF', 'cpf'),
+    ('CID10', 'cid10'),
+    ('Data de nascimento da mãe', 'data_nascimento_mae'),
+    ('ID_Familiar', 'id_familiar'),
+    ('Historico_materno', 'historico_materno'),
+    ('Historico_gravidez', 'historico_gravidez'),
+    ('Historico_familiar', 'historico_familiar'),
+    ('Info_parto', 'info_parto'),
+    ('CARS', 'cars'),
+    ('QI', 'qi'),
+    ('comunicação_Vineland', 'comunicacao_vineland'),
+    ('Hab.dia a dia_Vineland', 'hab_dia_vineland'),
+    ('Socialização_Vineland', 'socializacao_vineland'),
+    ('ADI_total', 'adi_total'),
+    ('CBCL_Internal', 'cbcl_internal'),
+    ('CBCL_External', 'cbcl_external'),
+    ('Score_Psiquiatruci_mãe', 'score_psiquiatrico_mae'),
+    ('Score exposição ambiental na gestação', 'score_exposicao_ambiental'),
+    ('Score estresse materno', 'score_estresse_materno'),
+    ('Escolaridade materna', 'escolaridade_materna'),
+    ('Renda familiar', 'renda_familiar'),
+]
+
+MAPEAMENTOS = {
+    'amostras': COLUNAS_AMOSTRAS,
+    'bioinformatica': COLUNAS_BIOINFO,
+    'dados_clinicos': COLUNAS_CLINICOS,
+}
+
+# Campos que passam por normalizar_data em vez de normalizar_valor
+CAMPOS_DATA = {'data_nascimento', 'data_nascimento_mae'}
+
+# Campos usados para identificar o paciente na importação (não geram conflito)
+CAMPOS_IDENTIFICACAO = ('nome_paciente', 'data_nascimento')
+
+# Formatos de data aceitos, na ordem de tentativa
+FORMATOS_DATA = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%Y/%m/%d']
+
+# Valor inteiro como lido hoje da planilha (texto, sem conversão de tipo)
+PADRAO_INTEIRO = re.compile(r'-?\d+')
+
+
+def _mapear_linha(row, colunas):
     """
-    Mapeia colunas da planilha Amostras Biológicas para o modelo.
+    Mapeia uma linha da planilha para o modelo, célula a célula.
     """
     return {
-        'nome_paciente': normalizar_valor(row.get('Nome paciente')),
-        'data_nascimento': normalizar_data(row.get('Data de nascimento')),
-        'nome_mae': normalizar_valor(row.get('Nome da mãe')),
-        'id_projeto': normalizar_valor(row.get('ID_Projeto')),
-        'sexo': normalizar_valor(row.get('Sexo')),
-        'rg': normalizar_valor(row.get('RG')),
-        'cpf': normalizar_valor(row.get('CPF')),
-        'cid10': normalizar_valor(row.get('CID10')),
-        'data_nascimento_mae': normalizar_data(row.get('Data de nascimento da mãe')),
-        'id_familiar': normalizar_valor(row.get('ID_Familiar')),
-        'id_lpc_biob': normalizar_valor(row.get('ID_LPC_BIOB')),
-        'amostra_biologica': normalizar_valor(row.get('Amostra_biologica')),
-        'sangue': normalizar_valor(row.get('Sangue')),
-        'plasma': normalizar_valor(row.get('Plasma')),
-        'soro': normalizar_valor(row.get('Soro')),
-        'pax_gene': normalizar_valor(row.get('PaxGene')),
-        'saliva': normalizar_valor(row.get('Saliva')),
-        'scu': normalizar_valor(row.get('SCU')),
-        'placenta': normalizar_valor(row.get('Placenta')),
-        'placenta_ffpe': normalizar_valor(row.get('Placenta_FFPE')),
-        'dna': normalizar_valor(row.get('DNA')),
-        'rna': normalizar_valor(row.get('RNA')),
-        'proteina': normalizar_valor(row.get('Proteína'))
+        campo: normalizar_data(row.get(coluna)) if campo in CAMPOS_DATA else normalizar_valor(row.get(coluna))
+        for coluna, campo in colunas
     }
 
 
+def mapear_colunas_amostras(row):
+    """
+    Mapeia colunas da planilha Amostras Biológicas para o modelo.
+    """
+    return _mapear_linha(row, COLUNAS_AMOSTRAS)
+
+
 def mapear_colunas_bioinfo(row):
     """
     Mapeia colunas da planilha Bioinformática para o modelo.
     """
-    return {
-        'nome_paciente': normalizar_valor(row.get('Nome paciente')),
-        'data_nascimento': normalizar_data(row.get('Data de nascimento')),
-        'nome_mae': normalizar_valor(row.get('Nome da mãe')),
-        'id_projeto': normalizar_valor(row.get('ID_Projeto')),
-        'sexo': normalizar_valor(row.get('Sexo')),
-        'data_nascimento_mae': normalizar_data(row.get('Data de nascimento da mãe')),
-        'metiloma': normalizar_valor(row.get('Metiloma')),
-        'dnam_gene': normalizar_valor(row.get('DNAm_gene')),
-        'dna_seq': normalizar_valor(row.get('DNA_Seq')),
-        'exoma': normalizar_valor(row.get('Exoma')),
-        'rna_seq': normalizar_valor(row.get('RNA_Seq')),
-        'mi_rna': normalizar_valor(row.get('miRNA')),
-        'comprimento_telomerico': normalizar_valor(row.get('Comprimento_telomerico')),
-        'citocinas': normalizar_valor(row.get('Citocinas')),
-        'cortisol': normalizar_valor(row.get('Cortisol')),
-        'exossomos': normalizar_valor(row.get('Exossomos')),
-        'prs': normalizar_valor(row.get('PRS')),
-        'outros_bioinfo': normalizar_valor(row.get('Outros'))
-    }
+    return _mapear_linha(row, COLUNAS_BIOINFO)
 
 
 def mapear_colunas_clinicos(row):
     """
     Mapeia colunas da planilha Dados Clínicos para o modelo.
     """
+    return _mapear_linha(row, COLUNAS_CLINICOS)
+
+
+def _coluna_vazia(tamanho):
+    """
+    Array de objetos preenchido com None.
+    """
+    return np.full(tamanho, None, dtype=object)
+
+
+def normalizar_coluna_valor(serie):
+    """
+    Versão vetorizada de normalizar_valor para uma coluna inteira.
+    Retorna um array de objetos (str ou None).
+    """
+    resultado = _coluna_vazia(len(serie))
+    preenchidos = serie.notna().to_numpy()
+    if not preenchidos.any():
+        return resultado
+    
+    valores = serie[preenchidos]
+    if pd.api.types.is_datetime64_any_dtype(valores.dtype):
+        # astype(str) omite o horário; str() de cada Timestamp não
+        texto = valores.map(str)
+    else:
+        texto = valores.astype(str)
+    texto = texto.str.strip()
+    resultado[preenchidos] = texto.where(texto != '', None).to_numpy(dtype=object)
+    return resultado
+
+
+def normalizar_coluna_data(serie):
+    """
+    Versão vetorizada de normalizar_data para uma coluna inteira.
+    Retorna um array de objetos (date ou None).
+    """
+    resultado = _coluna_vazia(len(serie))
+    
+    if pd.api.types.is_datetime64_any_dtype(serie.dtype):
+        preenchidos = serie.notna().to_numpy()
+        resultado[preenchidos] = serie[preenchidos].dt.date.to_numpy(dtype=object)
+        return resultado
+    
+    pendentes = (serie.map(type) == str).to_numpy()
+    restantes = ~pendentes
+    for formato in FORMATOS_DATA:
+        if not pendentes.any():
+            break
+        convertidas = pd.to_datetime(serie[pendentes], format=formato, errors='coerce')
+        ok = convertidas.notna().to_numpy()
+        posicoes = np.flatnonzero(pendentes)[ok]
+        resultado[posicoes] = convertidas[ok].dt.date.to_numpy(dtype=object)
+        pendentes[posicoes] = False
+    
+    # O que sobrou (objetos datetime, datas fora do intervalo do pandas,
+    # formatos que o pandas não aceita) segue pelo caminho célula a célula
+    restantes |= pendentes
+    if restantes.any():
+        resultado[restantes] = serie[restantes].map(normalizar_data).to_numpy(dtype=object)
+    return resultado
+
+
+def mapear_planilha(df, tipo_planilha):
+    """
+    Mapeia a planilha inteira para o modelo, coluna a coluna.
+    Produz a mesma lista de dicionários que aplicar mapear_colunas_* em cada linha.
+    """
+    colunas = MAPEAMENTOS[tipo_planilha]
+    vazia = pd.Series(_coluna_vazia(len(df)), index=df.index)
+    
+    valores = []
+    for coluna, campo in colunas:
+        serie = df[coluna] if coluna in df.columns else vazia
+        if campo in CAMPOS_DATA:
+            valores.append(normalizar_coluna_data(serie))
+        else:
+            valores.append(normalizar_coluna_valor(serie))
+    
+    campos = [campo for _, campo in colunas]
+    return [dict(zip(campos, linha)) for linha in zip(*valores)]
+
+
+def mesmo_valor(valor_existente, valor_novo):
+    """
+    Compara um valor gravado com o valor novo da planilha.
+    Até a leitura em blocos, as planilhas eram lidas com os tipos inferidos
+    pelo pandas, e colunas numéricas com alguma célula vazia viravam float:
+    '10' era gravado como '10.0' e o CPF '01234567890' como '1234567890.0'.
+    Esses valores antigos são considerados iguais ao texto lido hoje, para
+    que reimportar a mesma planilha não gere conflitos.
+    """
+    valor_existente, valor_novo = str(valor_existente), str(valor_novo)
+    if valor_existente == valor_novo:
+        return True
+    return bool(PADRAO_INTEIRO.fullmatch(valor_novo)) and valor_existente == str(float(valor_novo))
+
+
+def comparar_dados(paciente_existente, dados, criar_conflitos=True, importacao=None,
+                   campos_ignorados=CAMPOS_IDENTIFICACAO):
+    """
+    Compara os dados de uma linha com um paciente já cadastrado.
+    Os conflitos ficam associados à importação de origem, se informada.
+    Preenche (em memória) os campos vazios e retorna:
+    - lista de campos atualizados
+    - lista de conflitos (ConflitoDados ainda não salvos)
+    """
+    conflitos_encontrados = []
+    campos_atualizados = []
+    
+    for campo, valor_novo in dados.items():
+        if campo in campos_ignorados:
+            # Pula os campos de identificação (nome e data), que já coincidem
+            # na busca de duplicata; nome_mae pode gerar conflito
+            continue
+        
+        valor_existente = getattr(paciente_existente, campo, None)
+        
+        # Se o valor novo é None ou vazio, não faz nada
+        if valor_novo is None or valor_novo == '':
+            continue
+        
+        # Se o campo existente está vazio, preenche
+        if valor_existente is None or valor_existente == '':
+            setattr(paciente_existente, campo, valor_novo)
+            campos_atualizados.append(campo)
+        
+        # Se os valores são diferentes, cria conflito
+        elif not mesmo_valor(valor_existente, valor_novo):
+            if criar_conflitos:
+                conflitos_encontrados.append(ConflitoDados(
+                    paciente=paciente_existente,
+                    importacao=importacao,
+                    campo=campo,
+                    valor_existente=str(valor_existente),
+                    valor_novo=str(valor_novo),
+                    status='novo'
+                ))
+    
+    return campos_atualizados, conflitos_encontrados
+
+
+def montar_resultado(paciente, novo, campos_atualizados, conflitos):
+    """
+    Monta o dicionário de resultado de uma linha (mesmo formato de processar_linha).
+    """
+    if novo:
+        return {
+            'status': 'novo',
+            'paciente': paciente,
+            'mensagem': f'Paciente {paciente.nome_paciente} cadastrado com sucesso'
+        }
+    
+    if conflitos:
+        return {
+            'status': 'conflito',
+            'paciente': paciente,
+            'conflitos': conflitos,
+            'mensagem': f'{len(conflitos)} conflito(s) encontrado(s)'
+        }
+    
     return {
-        'nome_paciente': normalizar_valor(row.get('Nome paciente')),
-        'data_nascimento': normalizar_data(row.get('Data de nascimento')),
-        'nome_mae': normalizar_valor(row.get('Nome da mãe')),
-        'id_unico': normalizar_valor(row.get('ID_Unico')),
-        'projeto_original': normalizar_valor(row.get('Projeto_originall')),
-        'id_projeto': normalizar_valor(row.get('ID_Projeto')),
-        'sexo': normalizar_valor(row.get('Sexo')),
-        'rg': normalizar_valor(row.get('RG')),
-        'cpf': normalizar_valor(row.get('CPF')),
-        'cid10': normalizar_valor(row.get('CID10')),
-        'data_nascimento_mae': normalizar_data(row.get('Data de nascimento da mãe')),
-        'id_familiar': normalizar_valor(row.get('ID_Familiar')),
-        'historico_materno': normalizar_valor(row.get('Historico_materno')),
-        'historico_gravidez': normalizar_valor(row.get('Historico_gravidez')),
-        'historico_familiar': normalizar_valor(row.get('Historico_familiar')),
-        'info_parto': normalizar_valor(row.get('Info_parto')),
-        'cars': normalizar_valor(row.get('CARS')),
-        'qi': normalizar_valor(row.get('QI')),
-        'comunicacao_vineland': normalizar_valor(row.get('comunicação_Vineland')),
-        'hab_dia_vineland': normalizar_valor(row.get('Hab.dia a dia_Vineland')),
-        'socializacao_vineland': normalizar_valor(row.get('Socialização_Vineland')),
-        'adi_total': normalizar_valor(row.get('ADI_total')),
-        'cbcl_internal': normalizar_valor(row.get('CBCL_Internal')),
-        'cbcl_external': normalizar_valor(row.get('CBCL_External')),
-        'score_psiquiatrico_mae': normalizar_valor(row.get('Score_Psiquiatruci_mãe')),
-        'score_exposicao_ambiental': normalizar_valor(row.get('Score exposição ambiental na gestação')),
-        'score_estresse_materno': normalizar_valor(row.get('Score estresse materno')),
-        'escolaridade_materna': normalizar_valor(row.get('Escolaridade materna')),
-        'renda_familiar': normalizar_valor(row.get('Renda familiar'))
+        'status': 'atualizado',
+        'paciente': paciente,
+        'campos_atualizados': campos_atualizados,
+        'mensagem': f'{len(campos_atualizados)} campo(s) atualizado(s)'
     }
 
 
-def processar_linha(dados, criar_conflitos=True):
+def gravar_conflitos(conflitos, importacao=None):
+    """
+    Grava os conflitos encontrados. Um conflito pendente igual já gravado
+    (reimportação) não é duplicado, mas passa a apontar para `importacao`,
+    para que a fila filtrada por importação o atribua à planilha atual.
+    """
+    ConflitoDados.objects.bulk_create(conflitos, batch_size=TAMANHO_LOTE, ignore_conflicts=True)
+    if importacao is None:
+        return
+    
+    # O INSERT OR IGNORE não diz quais linhas foram ignoradas; os pendentes
+    # de outra importação com o mesmo (paciente, campo, valor novo) são elas
+    chaves = {(c.paciente_id, c.campo, c.valor_novo) for c in conflitos}
+    pacientes = sorted({paciente_id for paciente_id, _, _ in chaves})
+    reimportados = []
+    for inicio in range(0, len(pacientes), TAMANHO_CONSULTA_IN):
+        pendentes = (
+            ConflitoDados.objects
+            .filter(status='novo', paciente_id__in=pacientes[inicio:inicio + TAMANHO_CONSULTA_IN])
+            .exclude(importacao=importacao)
+            .values_list('id', 'paciente_id', 'campo', 'valor_novo')
+        )
+        reimportados.extend(pk for pk, *chave in pendentes if tuple(chave) in chaves)
+    
+    for inicio in range(0, len(reimportados), TAMANHO_CONSULTA_IN):
+        ConflitoDados.objects.filter(
+            pk__in=reimportados[inicio:inicio + TAMANHO_CONSULTA_IN]
+        ).update(importacao=importacao)
+
+
+def processar_linha(dados, criar_conflitos=True, importacao=None, indice=None):
     """
     Processa uma linha de dados e retorna:
     - 'novo': paciente foi criado
     - 'atualizado': paciente existente foi atualizado
     - 'conflito': há conflitos que precisam ser resolvidos
     - 'erro': erro ao processar
+    Com um índice de duplicatas (ver carregar_candidatos), a busca é feita
+    em memória e o paciente criado entra no índice.
+    A linha é gravada num savepoint: dentro de uma transação maior (ver
+    importar_planilha), um erro nela não desfaz as demais.
     """
     try:
         # Verifica se os campos obrigatórios estão presentes
         if not all([dados.get('nome_paciente'), dados.get('data_nascimento'), dados.get('nome_mae')]):
             return {'status': 'erro', 'mensagem': 'Campos obrigatórios ausentes'}
         
-        # Busca duplicata
-        paciente_existente = Paciente.buscar_duplicata(
+        # Savepoint: se a linha falhar, só o que ela gravou é desfeito
+        with transaction.atomic():
+            # Busca duplicata
+            if indice is None:
+                paciente_existente = Paciente.buscar_duplicata(
+                    dados['nome_paciente'],
+                    dados['data_nascimento'],
+                    dados['nome_mae']
+                )
+            else:
+                carregar_candidatos([_chave_duplicata(dados['nome_paciente'], dados['data_nascimento'])], indice)
+                candidato = buscar_duplicata_no_indice(
+                    indice,
+                    dados['nome_paciente'],
+                    dados['data_nascimento'],
+                    dados['nome_mae']
+                )
+                paciente_existente = None
+                if candidato:
+                    paciente_existente = candidato.paciente or Paciente.objects.get(pk=candidato.id)
+            
+            if not paciente_existente:
+                # Caso Negativo: Criar novo paciente
+                paciente = Paciente.objects.create(**dados)
+                if indice is not None:
+                    registrar_no_indice(indice, paciente, manter_paciente=False)
+                return montar_resultado(paciente, True, [], [])
+            
+            # Caso Positivo ou Especial: Paciente já existe
+            campos_atualizados, conflitos_encontrados = comparar_dados(
+                paciente_existente, dados, criar_conflitos, importacao
+            )
+            
+            if campos_atualizados:
+                paciente_existente.save()
+            
+            if conflitos_encontrados:
+                gravar_conflitos(conflitos_encontrados, importacao)
+                transaction.on_commit(invalidar_estatisticas)
+            
+            return montar_resultado(paciente_existente, False, campos_atualizados, conflitos_encontrados)
+    
+    except Exception as e:
+        return {
+            'status': 'erro',
+            'mensagem': f'Erro ao processar: {str(e)}'
+        }
+
+
+def _chave_duplicata(nome_paciente, data_nascimento):
+    """
+    Chave usada para agrupar candidatos a duplicata: nome normalizado
+    (como em Paciente.buscar_duplicata) + data de nascimento.
+    """
+    return (normalizar_texto(nome_paciente), data_nascimento)
+
+
+class Candidato:
+    """
+    Entrada do índice de duplicatas: só o necessário para decidir a
+    duplicata. O paciente completo só é carregado (ou mantido, se foi criado
+    no lote atual) quando a linha corresponde a ele.
+    """
+    __slots__ = ('id', 'nome_mae_normalizado', 'paciente')
+    
+    def __init__(self, id, nome_mae_normalizado, paciente=None):
+        self.id = id
+        self.nome_mae_normalizado = nome_mae_normalizado
+        self.paciente = paciente
+
+
+def carregar_candidatos(chaves, indice):
+    """
+    Carrega de uma vez os pacientes com as chaves (nome normalizado, data de
+    nascimento) informadas que ainda não estão no índice, agrupando-os em
+    {chave: [Candidato, mais recentes primeiro]}. Chaves sem pacientes ficam
+    com uma lista vazia, para não serem consultadas de novo.
+    """
+    pendentes = {chave for chave in chaves if chave not in indice}
+    for chave in pendentes:
+        indice[chave] = []
+    
+    pendentes = sorted(pendentes, key=lambda chave: (chave[0], str(chave[1])))
+    # Cada bloco vira duas listas IN (nomes e datas): metade do limite para cada
+    tamanho_bloco = TAMANHO_CONSULTA_IN // 2
+    for inicio in range(0, len(pendentes), tamanho_bloco):
+        bloco = pendentes[inicio:inicio + tamanho_bloco]
+        # Nomes x datas do bloco usa o índice (nome normalizado, data); as
+        # combinações que não estão no bloco são descartadas abaixo
+        pacientes = Paciente.objects.filter(
+            nome_paciente_normalizado__in={nome for nome, _ in bloco},
+            data_nascimento__in={data for _, data in bloco}
+        ).order_by('-data_cadastro', '-id').values_list(
+            'id', 'nome_paciente_normalizado', 'data_nascimento', 'nome_mae_normalizado'
+        )
+        bloco = set(bloco)
+        for id_paciente, nome, data, nome_mae in pacientes:
+            if (nome, data) in bloco:
+                indice[(nome, data)].append(Candidato(id_paciente, nome_mae))
+    return indice
+
+
+def registrar_no_indice(indice, paciente, manter_paciente=True):
+    """
+    Coloca um paciente recém-criado no índice (como o mais recente da chave),
+    para que as próximas linhas da planilha o encontrem. Pacientes já
+    gravados não precisam ficar em memória (manter_paciente=False).
+    Retorna o Candidato.
+    """
+    candidato = Candidato(paciente.pk, paciente.nome_mae_normalizado, paciente if manter_paciente else None)
+    chave = (paciente.nome_paciente_normalizado, paciente.data_nascimento)
+    indice.setdefault(chave, []).insert(0, candidato)
+    return candidato
+
+
+def buscar_duplicata_no_indice(indice, nome_paciente, data_nascimento, nome_mae):
+    """
+    Equivalente em memória de Paciente.buscar_duplicata. Retorna o Candidato.
+    """
+    candidatos = indice.get(_chave_duplicata(nome_paciente, data_nascimento))
+    if not candidatos:
+        return None
+    if len(candidatos) == 1:
+        return candidatos[0]
+    # Se houver múltiplos, desempata pelo nome da mãe
+    nome_mae_normalizado = normalizar_texto(nome_mae)
+    for candidato in candidatos:
+        if candidato.nome_mae_normalizado == nome_mae_normalizado:
+            return candidato
+    return None
+
+
+def _gravar_lote(novos, atualizados, conflitos, importacao=None):
+    """
+    Grava um lote processado em memória usando bulk_create/bulk_update.
+    """
+    with transaction.atomic():
+        if novos:
+            # bulk_create não chama save(), então o ID único é gerado aqui
+            sem_id_unico = [p for p in novos if not p.id_unico]
+            for paciente, id_unico in zip(sem_id_unico, Paciente.gerar_ids_unicos(len(sem_id_unico))):
+                paciente.id_unico = id_unico
+            Paciente.objects.bulk_create(novos, batch_size=TAMANHO_LOTE)
+        
+        if atualizados:
+            agora = timezone.now()
+            campos = {'data_atualizacao'}
+            for paciente, campos_paciente in atualizados.values():
+                paciente.data_atualizacao = agora
+                paciente.atualizar_campos_normalizados()
+                campos.update(campos_paciente)
+            if 'nome_mae' in campos:
+                campos.add('nome_mae_normalizado')
+            Paciente.objects.bulk_update(
+                [paciente for paciente, _ in atualizados.values()],
+                sorted(campos),
+                batch_size=TAMANHO_LOTE
+            )
+        
+        if conflitos:
+            gravar_conflitos(conflitos, importacao)
+        
+        # Projetos novos (o preenchimento de campos vazios nunca remove um projeto)
+        Projeto.registrar(
+            [p.id_projeto for p in novos] +
+            [p.id_projeto for p, campos_paciente in atualizados.values() if 'id_projeto' in campos_paciente]
+        )
+    
+    # bulk_create/bulk_update não disparam os sinais que invalidam o dashboard;
+    # dentro da transação do lote, o cache só é limpo depois do commit
+    transaction.on_commit(invalidar_estatisticas)
+
+
+def _chaves_do_lote(lista_dados):
+    """
+    Chaves de duplicata das linhas do lote que têm nome e data de nascimento.
+    """
+    return {
+        _chave_duplicata(dados['nome_paciente'], dados['data_nascimento'])
+        for dados in lista_dados
+        if dados.get('nome_paciente') and dados.get('data_nascimento')
+    }
+
+
+def _resolver_lote(lista_dados, chaves_lote, indice, criar_conflitos=True, importacao=None):
+    """
+    Parte de processar_lote feita em memória, sem gravar nada:
+    - carrega de uma vez os candidatos a duplicata das chaves do lote
+    - resolve as duplicatas (inclusive dentro da própria planilha); os
+      pacientes novos entram no índice, ainda sem id
+    - carrega de uma vez os pacientes existentes encontrados e compara os dados
+    Retorna (resultados, pacientes novos, {id: (paciente, campos atualizados)},
+    conflitos).
+    """
+    carregar_candidatos(chaves_lote, indice)
+    
+    # Resolve as duplicatas; pacientes novos entram no índice para as próximas linhas
+    correspondencias = []
+    for dados in lista_dados:
+        if not all([dados.get('nome_paciente'), dados.get('data_nascimento'), dados.get('nome_mae')]):
+            correspondencias.append(None)
+            continue
+        
+        candidato = buscar_duplicata_no_indice(
+            indice,
             dados['nome_paciente'],
             dados['data_nascimento'],
             dados['nome_mae']
         )
+        if candidato:
+            correspondencias.append((candidato, False))
+        else:
+            paciente = Paciente(**dados)
+            paciente.atualizar_campos_normalizados()
+            correspondencias.append((registrar_no_indice(indice, paciente), True))
+    
+    # Pacientes existentes encontrados, carregados completos em uma consulta por bloco
+    ids = sorted({item[0].id for item in correspondencias if item and item[0].paciente is None})
+    for inicio in range(0, len(ids), TAMANHO_CONSULTA_IN):
+        carregados = Paciente.objects.in_bulk(ids[inicio:inicio + TAMANHO_CONSULTA_IN])
+        for item in correspondencias:
+            if item and item[0].paciente is None and item[0].id in carregados:
+                item[0].paciente = carregados[item[0].id]
+    
+    resultados = []
+    novos = []
+    atualizados = {}
+    conflitos = []
+    
+    for dados, item in zip(lista_dados, correspondencias):
+        if item is None:
+            resultados.append({'status': 'erro', 'mensagem': 'Campos obrigatórios ausentes'})
+            continue
         
-        if not paciente_existente:
-            # Caso Negativo: Criar novo paciente
-            paciente = Paciente.objects.create(**dados)
-            return {
-                'status': 'novo',
-                'paciente': paciente,
-                'mensagem': f'Paciente {paciente.nome_paciente} cadastrado com sucesso'
-            }
+        candidato, novo = item
+        if novo:
+            novos.append(candidato.paciente)
+            resultados.append(montar_resultado(candidato.paciente, True, [], []))
+            continue
         
-        # Caso Positivo ou Especial: Paciente já existe
-        conflitos_encontrados = []
-        campos_atualizados = []
+        paciente_existente = candidato.paciente
+        campos_atualizados, conflitos_encontrados = comparar_dados(
+            paciente_existente, dados, criar_conflitos, importacao
+        )
         
-        for campo, valor_novo in dados.items():
-            if campo in ['nome_paciente', 'data_nascimento']:
-                # Pula APENAS os campos de identificação (nome e data)
-                # nome_mae agora pode gerar conflito
-                continue
-            
-            valor_existente = getattr(paciente_existente, campo, None)
-            
-            # Se o valor novo é None ou vazio, não faz nada
-            if valor_novo is None or valor_novo == '':
-                continue
-            
-            # Se o campo existente está vazio, preenche
-            if valor_existente is None or valor_existente == '':
-                setattr(paciente_existente, campo, valor_novo)
-                campos_atualizados.append(campo)
-            
-            # Se os valores são diferentes, cria conflito
-            elif str(valor_existente) != str(valor_novo):
-                if criar_conflitos:
-                    conflito = ConflitoDados.objects.create(
-                        paciente=paciente_existente,
-                        campo=campo,
-                        valor_existente=str(valor_existente),
-                        valor_novo=str(valor_novo),
-                        status='novo'
-                    )
-                    conflitos_encontrados.append(conflito)
+        # Pacientes criados neste lote já serão gravados com os campos preenchidos
+        if campos_atualizados and paciente_existente.pk:
+            _, campos_paciente = atualizados.setdefault(
+                paciente_existente.pk, (paciente_existente, set())
+            )
+            campos_paciente.update(campos_atualizados)
         
-        if campos_atualizados:
-            paciente_existente.save()
+        conflitos.extend(conflitos_encontrados)
+        resultados.append(montar_resultado(
+            paciente_existente, False, campos_atualizados, conflitos_encontrados
+        ))
+    
+    return resultados, novos, atualizados, conflitos
+
+
+def processar_lote(lista_dados, indice, criar_conflitos=True, importacao=None):
+    """
+    Processa um lote de linhas já mapeadas com poucas consultas: resolve o
+    lote em memória (ver _resolver_lote) e grava tudo com bulk_create/bulk_update.
+    Retorna a lista de resultados, na mesma ordem e formato de processar_linha.
+    Se a gravação em lote falhar, o lote é reprocessado linha a linha.
+    """
+    chaves_lote = _chaves_do_lote(lista_dados)
+    resultados, novos, atualizados, conflitos = _resolver_lote(
+        lista_dados, chaves_lote, indice, criar_conflitos, importacao
+    )
+    
+    try:
+        _gravar_lote(novos, atualizados, conflitos, importacao)
+    except Exception:
+        # Descarta o estado em memória das chaves deste lote e refaz linha a linha,
+        # para que apenas as linhas problemáticas sejam reportadas como erro
+        for chave in chaves_lote:
+            indice.pop(chave, None)
+        return [processar_linha(dados, criar_conflitos, importacao, indice) for dados in lista_dados]
+    
+    # Depois de gravados, os pacientes não precisam ficar no índice (só o id)
+    for chave in chaves_lote:
+        for candidato in indice.get(chave, []):
+            if candidato.paciente is not None:
+                candidato.id = candidato.paciente.pk
+                candidato.paciente = None
+    
+    return resultados
+
+
+def assinatura_linha(dados):
+    """
+    Hash do conteúdo normalizado de uma linha (ver mapear_planilha): linhas
+    com os mesmos valores em todos os campos têm a mesma assinatura.
+    """
+    return hashlib.blake2b(repr(tuple(dados.items())).encode(), digest_size=16).hexdigest()
+
+
+def assinaturas_gravadas(assinaturas, tipo_planilha):
+    """
+    Quais das assinaturas informadas já estão gravadas para o tipo de
+    planilha, ou seja, correspondem a linhas já importadas sem alteração.
+    Retorna {assinatura: id do paciente}.
+    """
+    assinaturas = sorted(set(assinaturas))
+    gravadas = {}
+    for inicio in range(0, len(assinaturas), TAMANHO_CONSULTA_IN):
+        gravadas.update(AssinaturaLinha.objects.filter(
+            tipo_planilha=tipo_planilha,
+            assinatura__in=assinaturas[inicio:inicio + TAMANHO_CONSULTA_IN]
+        ).values_list('assinatura', 'paciente_id'))
+    return gravadas
+
+
+def gravar_assinaturas(resultados_lote, assinaturas, tipo_planilha):
+    """
+    Grava as assinaturas das linhas do lote aplicadas ao cadastro (todas,
+    menos as com erro), para o paciente de cada uma. Assinaturas já
+    gravadas para o paciente são ignoradas.
+    """
+    AssinaturaLinha.objects.bulk_create(
+        [
+            AssinaturaLinha(
+                paciente_id=resultado['paciente'].pk,
+                tipo_planilha=tipo_planilha,
+                assinatura=assinatura
+            )
+            for resultado, assinatura in zip(resultados_lote, assinaturas)
+            if resultado['status'] != 'erro'
+        ],
+        ignore_conflicts=True
+    )
+
+
+def _separar_inalteradas(assinaturas, tipo_planilha, vistas=None, agrupar_repetidas=True):
+    """
+    Classifica as linhas de um lote pela assinatura, retornando as posições:
+    - alteradas: [posição] das linhas a processar
+    - inalteradas: [(posição, id do paciente)] das já gravadas (ou em
+      `vistas`, {assinatura: id do paciente})
+    - repetidas: [(posição, posição da primeira)] das iguais a uma linha
+      anterior do lote, que será processada (com agrupar_repetidas)
+    As repetidas recebem o resultado que teriam se a primeira tivesse sido
+    gravada antes delas (ver _completar_resultados): assim as contagens não
+    dependem do tamanho do lote.
+    """
+    gravadas = assinaturas_gravadas(assinaturas, tipo_planilha)
+    if vistas:
+        gravadas.update(vistas)
+    
+    alteradas = []
+    inalteradas = []
+    repetidas = []
+    primeiras = {}
+    for posicao, assinatura in enumerate(assinaturas):
+        if assinatura in gravadas:
+            inalteradas.append((posicao, gravadas[assinatura]))
+        elif agrupar_repetidas and assinatura in primeiras:
+            repetidas.append((posicao, primeiras[assinatura]))
+        else:
+            primeiras[assinatura] = posicao
+            alteradas.append(posicao)
+    return alteradas, inalteradas, repetidas
+
+
+def _resultado_inalterada(paciente_id):
+    return {
+        'status': 'inalterada',
+        'paciente_id': paciente_id,
+        'mensagem': 'Linha igual à já importada'
+    }
+
+
+def _completar_resultados(tamanho, alteradas, resultados_alteradas, inalteradas, repetidas):
+    """
+    Resultados de todas as linhas do lote, na ordem da planilha, a partir
+    dos resultados das alteradas (ver _separar_inalteradas). Uma repetida
+    fica inalterada, ou com o mesmo erro da primeira (que não é gravada).
+    """
+    resultados_lote = [None] * tamanho
+    for posicao, resultado in zip(alteradas, resultados_alteradas):
+        resultados_lote[posicao] = resultado
+    for posicao, paciente_id in inalteradas:
+        resultados_lote[posicao] = _resultado_inalterada(paciente_id)
+    for posicao, primeira in repetidas:
+        resultado = resultados_lote[primeira]
+        if resultado['status'] == 'erro':
+            resultados_lote[posicao] = resultado
+        else:
+            resultados_lote[posicao] = _resultado_inalterada(resultado['paciente'].pk)
+    return resultados_lote
+
+
+def _nomes_colunas(cabecalho):
+    """
+    Nomes das colunas a partir da linha de cabeçalho, como o pandas faria:
+    células vazias viram 'Unnamed: N' e nomes repetidos ganham '.1', '.2'...
+    """
+    colunas = []
+    vistos = {}
+    for posicao, nome in enumerate(cabecalho):
+        if nome is None:
+            nome = f'Unnamed: {posicao}'
+        if nome in vistos:
+            vistos[nome] += 1
+            nome = f'{nome}.{vistos[nome]}'
+        else:
+            vistos[nome] = 0
+        colunas.append(nome)
+    return colunas
+
+
+def _blocos_xlsx(arquivo, tamanho_bloco):
+    """
+    Lê a primeira aba de um .xlsx linha a linha (openpyxl em modo read_only).
+    Linhas vazias no meio da planilha são mantidas, como no pd.read_excel,
+    para não alterar a numeração; as do final são descartadas.
+    """
+    livro = openpyxl.load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = livro.worksheets[0].iter_rows(values_only=True)
+        colunas = _nomes_colunas(next(linhas, ()))
+        largura = len(colunas)
+        vazia = (None,) * largura
         
-        if conflitos_encontrados:
-            return {
-                'status': 'conflito',
-                'paciente': paciente_existente,
-                'conflitos': conflitos_encontrados,
-                'mensagem': f'{len(conflitos_encontrados)} conflito(s) encontrado(s)'
-            }
+        bloco = []
+        inicio = 0
+        vazias_pendentes = 0
         
+        def montar():
+            return pd.DataFrame(
+                bloco,
+                columns=colunas,
+                index=range(inicio, inicio + len(bloco)),
+                dtype=object
+            )
+        
+        for linha in linhas:
+            linha = linha[:largura]
+            if all(valor is None for valor in linha):
+                vazias_pendentes += 1
+                continue
+            
+            for linha_bloco in chain((vazia,) * vazias_pendentes, [linha + vazia[len(linha):]]):
+                bloco.append(linha_bloco)
+                if len(bloco) == tamanho_bloco:
+                    yield montar()
+                    inicio += len(bloco)
+                    bloco = []
+            vazias_pendentes = 0
+        
+        if bloco or not inicio:
+            yield montar()
+    finally:
+        livro.close()
+
+
+def ler_planilha_em_blocos(arquivo, tamanho_bloco=TAMANHO_BLOCO_LEITURA):
+    """
+    Lê a planilha em DataFrames de até `tamanho_bloco` linhas, sem carregar o
+    arquivo inteiro: CSV com read_csv(chunksize=...) e .xlsx pelo openpyxl em
+    modo read_only. O índice de cada DataFrame é a posição da linha na
+    planilha (0 = primeira linha de dados). Sempre há pelo menos um bloco
+    (vazio se a planilha só tiver o cabeçalho), com as colunas da planilha.
+    
+    Os valores não passam pela inferência de tipos por coluna do pandas (CSV
+    é lido como texto e Excel como está na célula): assim o resultado não
+    depende de onde caem os limites dos blocos.
+    """
+    if arquivo.name.endswith('.csv'):
+        vazio = True
+        for bloco in pd.read_csv(arquivo, chunksize=tamanho_bloco, dtype=str):
+            vazio = False
+            yield bloco
+        if vazio:
+            arquivo.seek(0)
+            yield pd.read_csv(arquivo, nrows=0, dtype=str)
+    elif arquivo.name.endswith(EXTENSOES_OPENPYXL):
+        yield from _blocos_xlsx(arquivo, tamanho_bloco)
+    else:
+        df = pd.read_excel(arquivo, dtype=object)
+        for inicio in range(0, max(len(df), 1), tamanho_bloco):
+            yield df.iloc[inicio:inicio + tamanho_bloco]
+
+
+def estimar_total_linhas(arquivo):
+    """
+    Estimativa do número de linhas de dados, usada só para o progresso:
+    quebras de linha do CSV (lido em blocos de bytes) ou a dimensão
+    declarada da aba do .xlsx. Retorna 0 quando não dá para estimar.
+    """
+    if arquivo.name.endswith('.csv'):
+        linhas = 0
+        ultimo = b''
+        for pedaco in iter(lambda: arquivo.read(1024 * 1024), b''):
+            linhas += pedaco.count(b'\n')
+            ultimo = pedaco[-1:]
+        arquivo.seek(0)
+        if ultimo not in (b'', b'\n'):
+            linhas += 1
+        return max(linhas - 1, 0)
+    
+    if arquivo.name.endswith(EXTENSOES_OPENPYXL):
+        livro = openpyxl.load_workbook(arquivo, read_only=True)
+        try:
+            total = livro.worksheets[0].max_row
+        finally:
+            livro.close()
+        arquivo.seek(0)
+        return max((total or 0) - 1, 0)
+    
+    return 0
+
+
+def importar_planilha(arquivo, tipo_planilha='auto', criar_conflitos=True, em_lote=False, progresso=None,
+                      importacao=None, linhas_por_transacao=TAMANHO_LOTE, tudo_ou_nada=False,
+                      pular_inalteradas=True):
+    """
+    Importa uma planilha Excel ou CSV, lida em blocos de TAMANHO_BLOCO_LEITURA
+    linhas (ver ler_planilha_em_blocos): a memória usada não depende do
+    tamanho do arquivo.
+    As linhas são gravadas em transações de `linhas_por_transacao` linhas,
+    com um savepoint por linha: uma linha com erro é reportada como 'erro'
+    sem desfazer o restante da transação, e se o processo for interrompido
+    só a transação em andamento é perdida.
+    Com em_lote=True, cada transação é processada de uma vez (ver
+    processar_lote), com o mesmo resultado do processamento linha a linha.
+    Com tudo_ou_nada=True, a planilha inteira é gravada numa única transação,
+    desfeita se alguma linha der erro (o retorno traz então a chave 'erro').
+    Se informado, progresso(linhas_processadas, total) é chamado a cada
+    transação, dentro dela (o total é estimado até o fim da leitura).
+    Se `importacao` (ImportacaoPlanilha) for informada, os conflitos criados
+    ficam associados a ela e o resultado de cada linha é gravado como
+    ResultadoLinha, no mesmo lote: nada é acumulado em memória, que fica
+    proporcional ao lote e não ao arquivo.
+    A assinatura de cada linha importada (ver assinatura_linha) é gravada
+    para o paciente e o tipo de planilha. Com pular_inalteradas=True, as
+    linhas cuja assinatura já está gravada, ou igual à de uma linha
+    anterior da mesma planilha, não são processadas e ficam com o resultado
+    'inalterada': reenviar uma planilha acumulada custa a leitura do
+    arquivo mais o processamento das linhas novas ou alteradas. Sem
+    criar_conflitos as divergências não são registradas, então as
+    assinaturas não são gravadas.
+    Retorna as contagens da importação.
+    """
+    total_estimado = estimar_total_linhas(arquivo)
+    blocos = ler_planilha_em_blocos(arquivo)
+    primeiro = next(blocos)
+    
+    # Detecta o tipo pelas colunas se for 'auto'
+    if tipo_planilha == 'auto':
+        tipo_planilha = detectar_tipo_planilha(primeiro)
+    
+    if tipo_planilha not in MAPEAMENTOS:
+        blocos.close()
         return {
-            'status': 'atualizado',
-            'paciente': paciente_existente,
-            'campos_atualizados': campos_atualizados,
-            'mensagem': f'{len(campos_atualizados)} campo(s) atualizado(s)'
+            'erro': f'Tipo de planilha inválido: {tipo_planilha}'
         }
     
-    except Exception as e:
+    resultados = {
+        'total': 0,
+        'novos': 0,
+        'atualizados': 0,
+        'conflitos': 0,
+        'erros': 0,
+        'inalteradas': 0,
+    }
+    contadores = {
+        'novo': 'novos', 'atualizado': 'atualizados', 'conflito': 'conflitos', 'erro': 'erros',
+        'inalterada': 'inalteradas',
+    }
+    usar_assinaturas = pular_inalteradas or criar_conflitos
+    # Linhas com erro (só no modo tudo ou nada, para a mensagem e para
+    # registrá-las de novo depois que a transação for desfeita)
+    linhas_com_erro = []
+    
+    def registrar_lote(linhas, resultados_lote):
+        """
+        Conta os resultados do lote e grava um ResultadoLinha por linha.
+        """
+        resultados_linhas = []
+        for linha, resultado in zip(linhas, resultados_lote):
+            resultados[contadores[resultado['status']]] += 1
+            paciente = resultado.get('paciente')
+            resultado_linha = ResultadoLinha(
+                importacao=importacao,
+                linha=linha,
+                status=ResultadoLinha.CODIGOS[resultado['status']],
+                paciente_id=paciente.pk if paciente else resultado.get('paciente_id'),
+                mensagem=resultado['mensagem'] if resultado['status'] == 'erro' else None,
+            )
+            resultados_linhas.append(resultado_linha)
+            if tudo_ou_nada and resultado['status'] == 'erro':
+                linhas_com_erro.append(resultado_linha)
+        
+        if importacao is not None:
+            ResultadoLinha.objects.bulk_create(resultados_linhas)
+    
+    if progresso:
+        progresso(0, total_estimado)
+    
+    def processar_blocos():
+        for bloco in chain([primeiro], blocos):
+            lista_dados = mapear_planilha(bloco, tipo_planilha)
+            # Número da linha na planilha (+2: índice começa do 0 e há o cabeçalho)
+            linhas = (bloco.index + 2).tolist()
+            
+            for inicio in range(0, len(lista_dados), linhas_por_transacao):
+                lote = lista_dados[inicio:inicio + linhas_por_transacao]
+                linhas_lote = linhas[inicio:inicio + linhas_por_transacao]
+                tamanho_lote = len(lote)
+                assinaturas = [assinatura_linha(dados) for dados in lote] if usar_assinaturas else []
+                # Índice de duplicatas: {(nome normalizado, data): [Candidato]}.
+                # Os lotes anteriores já estão gravados (e visíveis nesta
+                # conexão), então o índice só precisa das chaves deste lote
+                indice = {}
+                
+                with transaction.atomic():
+                    alteradas = range(tamanho_lote)
+                    if pular_inalteradas:
+                        # Repetidas só são puladas se a primeira tiver a assinatura gravada
+                        alteradas, inalteradas, repetidas = _separar_inalteradas(
+                            assinaturas, tipo_planilha, agrupar_repetidas=criar_conflitos
+                        )
+                    lote_alterado = [lote[posicao] for posicao in alteradas]
+                    
+                    if not lote_alterado:
+                        resultados_alteradas = []
+                    elif em_lote:
+                        resultados_alteradas = processar_lote(lote_alterado, indice, criar_conflitos, importacao)
+                    else:
+                        # Carrega de uma vez os candidatos de todas as chaves do lote
+                        carregar_candidatos(_chaves_do_lote(lote_alterado), indice)
+                        resultados_alteradas = [
+                            processar_linha(dados, criar_conflitos, importacao, indice)
+                            for dados in lote_alterado
+                        ]
+                    
+                    if criar_conflitos:
+                        gravar_assinaturas(
+                            resultados_alteradas,
+                            [assinaturas[posicao] for posicao in alteradas],
+                            tipo_planilha
+                        )
+                    
+                    if pular_inalteradas:
+                        resultados_lote = _completar_resultados(
+                            tamanho_lote, alteradas, resultados_alteradas, inalteradas, repetidas
+                        )
+                    else:
+                        resultados_lote = resultados_alteradas
+                    registrar_lote(linhas_lote, resultados_lote)
+                    
+                    resultados['total'] += tamanho_lote
+                    if progresso:
+                        progresso(resultados['total'], max(total_estimado, resultados['total']))
+    
+    if not tudo_ou_nada:
+        processar_blocos()
+        return resultados
+    
+    with transaction.atomic():
+        processar_blocos()
+        if resultados['erros']:
+            transaction.set_rollback(True)
+    
+    if resultados['erros']:
+        # Os resultados das linhas foram desfeitos junto com a importação;
+        # as linhas com erro são registradas de novo para consulta
+        if importacao is not None:
+            for resultado_linha in linhas_com_erro:
+                resultado_linha.pk = None
+            ResultadoLinha.objects.bulk_create(linhas_com_erro)
         return {
-            'status': 'erro',
-            'mensagem': f'Erro ao processar: {str(e)}'
+            'erro': (
+                f"{resultados['erros']} linha(s) com erro; nada foi importado. "
+                f"Linha {linhas_com_erro[0].linha}: {linhas_com_erro[0].mensagem}"
+            )
         }
+    
+    return resultados
 
 
-def importar_planilha(arquivo, tipo_planilha='auto', criar_conflitos=True):
+@contextmanager
+def snapshot_somente_leitura():
     """
-    Importa uma planilha Excel ou CSV.
-    Retorna estatísticas da importação.
+    Transação só de leitura: todas as consultas do bloco veem o mesmo estado
+    do banco e qualquer escrita falha (PRAGMA query_only). É aberta com BEGIN
+    DEFERRED, fora do transaction.atomic (que usa BEGIN IMMEDIATE no perfil
+    de produção e pegaria o lock de escrita): no modo WAL, não bloqueia nem
+    espera as importações em andamento.
     """
-    # Lê o arquivo
-    if arquivo.name.endswith('.csv'):
-        df = pd.read_csv(arquivo)
-    else:
-        df = pd.read_excel(arquivo)
+    connection.ensure_connection()
+    iniciada = False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA query_only = ON')
+            # Falha se já houver uma transação aberta, que não é desfeita abaixo
+            cursor.execute('BEGIN DEFERRED')
+        iniciada = True
+        yield
+    finally:
+        # A conexão é persistente (CONN_MAX_AGE): não pode continuar só de leitura
+        with connection.cursor() as cursor:
+            if iniciada:
+                cursor.execute('ROLLBACK')
+            cursor.execute('PRAGMA query_only = OFF')
+
+
+def _diferencas(resultado):
+    """
+    Diferenças de uma linha da pré-visualização: [(campo, valor atual, valor da planilha)].
+    """
+    if resultado['status'] == 'conflito':
+        return [
+            (conflito.campo, conflito.valor_existente, conflito.valor_novo)
+            for conflito in resultado['conflitos']
+        ]
+    paciente = resultado['paciente']
+    return [(campo, None, getattr(paciente, campo)) for campo in resultado['campos_atualizados']]
+
+
+def previsualizar_planilha(arquivo, tipo_planilha='auto', criar_conflitos=True,
+                           tamanho_amostra=TAMANHO_AMOSTRA_PREVIA, pular_inalteradas=True):
+    """
+    Mostra o que importar_planilha faria, sem gravar nada: mapeia a planilha
+    e resolve as duplicatas como na importação em lote (ver _resolver_lote),
+    num snapshot só de leitura do banco (ver snapshot_somente_leitura).
+    Retorna as contagens de linhas novas, atualizadas, com conflito, com
+    erro e inalteradas (puladas, como na importação, se pular_inalteradas),
+    e até `tamanho_amostra` linhas de exemplo de cada tipo com as
+    diferenças em relação ao cadastro:
+    {'atualizado' | 'conflito' | 'erro': [{'linha', 'paciente', 'diferencas' | 'mensagem'}]}.
+    Os pacientes novos e os já comparados (e as assinaturas das linhas
+    processadas) ficam em memória até o fim (como
+    o banco não muda, é ali que a planilha "grava" o que as linhas seguintes
+    precisam ver).
+    """
+    blocos = ler_planilha_em_blocos(arquivo)
+    primeiro = next(blocos)
     
-    # Detecta o tipo se for 'auto'
     if tipo_planilha == 'auto':
-        tipo_planilha = detectar_tipo_planilha(df)
+        tipo_planilha = detectar_tipo_planilha(primeiro)
     
-    # Escolhe a função de mapeamento
-    mapear_funcoes = {
-        'amostras': mapear_colunas_amostras,
-        'bioinformatica': mapear_colunas_bioinfo,
-        'dados_clinicos': mapear_colunas_clinicos,
-    }
-    
-    mapear = mapear_funcoes.get(tipo_planilha)
-    if not mapear:
+    if tipo_planilha not in MAPEAMENTOS:
+        blocos.close()
         return {
             'erro': f'Tipo de planilha inválido: {tipo_planilha}'
         }
     
-    # Processa cada linha
     resultados = {
-        'total': len(df),
+        'tipo_planilha': tipo_planilha,
+        'total': 0,
         'novos': 0,
         'atualizados': 0,
         'conflitos': 0,
         'erros': 0,
-        'detalhes': [],
-        'conflitos_lista': []
+        'inalteradas': 0,
+        'amostra': {'atualizado': [], 'conflito': [], 'erro': []},
+    }
+    contadores = {
+        'novo': 'novos', 'atualizado': 'atualizados', 'conflito': 'conflitos', 'erro': 'erros',
+        'inalterada': 'inalteradas',
     }
+    indice = {}
+    # Assinaturas que a importação gravaria nos lotes anteriores: {assinatura: id do paciente}
+    vistas = {}
+    
+    with snapshot_somente_leitura():
+        for bloco in chain([primeiro], blocos):
+            lista_dados = mapear_planilha(bloco, tipo_planilha)
+            linhas = (bloco.index + 2).tolist()
+            
+            for inicio in range(0, len(lista_dados), TAMANHO_LOTE):
+                lote = lista_dados[inicio:inicio + TAMANHO_LOTE]
+                linhas_lote = linhas[inicio:inicio + TAMANHO_LOTE]
+                tamanho_lote = len(lote)
+                alteradas = range(tamanho_lote)
+                if pular_inalteradas:
+                    assinaturas = [assinatura_linha(dados) for dados in lote]
+                    alteradas, inalteradas, repetidas = _separar_inalteradas(
+                        assinaturas, tipo_planilha, vistas, agrupar_repetidas=criar_conflitos
+                    )
+                lote_alterado = [lote[posicao] for posicao in alteradas]
+                
+                resultados_alteradas, _, _, _ = _resolver_lote(
+                    lote_alterado, _chaves_do_lote(lote_alterado), indice, criar_conflitos
+                )
+                
+                if pular_inalteradas:
+                    resultados_lote = _completar_resultados(
+                        tamanho_lote, alteradas, resultados_alteradas, inalteradas, repetidas
+                    )
+                else:
+                    resultados_lote = resultados_alteradas
+                
+                for linha, resultado in zip(linhas_lote, resultados_lote):
+                    status = resultado['status']
+                    resultados[contadores[status]] += 1
+                    
+                    amostra = resultados['amostra'].get(status)
+                    if amostra is None or len(amostra) >= tamanho_amostra:
+                        continue
+                    exemplo = {'linha': linha}
+                    if status == 'erro':
+                        exemplo['mensagem'] = resultado['mensagem']
+                    else:
+                        exemplo['paciente'] = resultado['paciente']
+                        exemplo['diferencas'] = _diferencas(resultado)
+                    amostra.append(exemplo)
+                
+                if pular_inalteradas and criar_conflitos:
+                    vistas.update(
+                        (assinaturas[posicao], resultado['paciente'].pk)
+                        for posicao, resultado in zip(alteradas, resultados_alteradas)
+                        if resultado['status'] != 'erro'
+                    )
+                
+                resultados['total'] += tamanho_lote
+    
+    return resultados
+
+
+def processar_importacao(importacao):
+    """
+    Processa uma ImportacaoPlanilha já reservada pelo worker, atualizando o
+    progresso (e o sinal de vida do worker) no banco a cada lote e gravando
+    o resultado final. Ao terminar, o arquivo enviado é apagado.
+    """
+    def atualizar_progresso(processadas, total):
+        ImportacaoPlanilha.objects.filter(pk=importacao.pk).update(
+            linhas_processadas=processadas,
+            total_linhas=total,
+            ultima_atividade=timezone.now()
+        )
     
-    for idx, row in df.iterrows():
-        dados = mapear(row)
-        resultado = processar_linha(dados, criar_conflitos)
+    try:
+        with importacao.arquivo.open('rb') as arquivo:
+            resultados = importar_planilha(
+                arquivo,
+                importacao.tipo_planilha,
+                importacao.criar_conflitos,
+                em_lote=True,
+                progresso=atualizar_progresso,
+                importacao=importacao,
+                tudo_ou_nada=importacao.tudo_ou_nada,
+                pular_inalteradas=importacao.pular_inalteradas
+            )
+    except Exception as e:
+        resultados = {'erro': str(e)}
+    
+    importacao.refresh_from_db()
+    if 'erro' in resultados:
+        importacao.status = 'erro'
+        importacao.mensagem_erro = resultados['erro']
+    else:
+        importacao.status = 'concluida'
+        importacao.total_linhas = resultados['total']
+        importacao.linhas_processadas = resultados['total']
+        importacao.novos = resultados['novos']
+        importacao.atualizados = resultados['atualizados']
+        importacao.conflitos = resultados['conflitos']
+        importacao.erros = resultados['erros']
+        importacao.inalteradas = resultados['inalteradas']
+    importacao.data_conclusao = timezone.now()
+    importacao.apagar_arquivo()
+    importacao.save()
+    
+    return importacao
+
+
+def resolver_conflitos_em_lote(conflitos, escolhas):
+    """
+    Resolve uma lista de conflitos (carregados com select_related('paciente'))
+    de acordo com as escolhas ({id do conflito: 'existente' | 'novo'}).
+    
+    As mudanças são agrupadas por paciente: cada paciente recebe uma única
+    gravação com update_fields e os conflitos são gravados com um bulk_update,
+    tudo na mesma transação.
+    """
+    agora = timezone.now()
+    alteracoes = {}
+    
+    for conflito in conflitos:
+        escolha = escolhas.get(conflito.id)
         
-        resultados['detalhes'].append({
-            'linha': idx + 2,  # +2 porque começa do 0 e tem cabeçalho
-            'resultado': resultado
-        })
+        if escolha == 'existente':
+            conflito.valor_escolhido = conflito.valor_existente
+        elif escolha == 'novo':
+            conflito.valor_escolhido = conflito.valor_novo
+            # A última escolha para o mesmo campo prevalece, como na gravação linha a linha
+            paciente, campos = alteracoes.setdefault(conflito.paciente_id, (conflito.paciente, set()))
+            setattr(paciente, conflito.campo, conflito.valor_novo)
+            campos.add(conflito.campo)
         
-        if resultado['status'] == 'novo':
-            resultados['novos'] += 1
-        elif resultado['status'] == 'atualizado':
-            resultados['atualizados'] += 1
-        elif resultado['status'] == 'conflito':
-            resultados['conflitos'] += 1
-            resultados['conflitos_lista'].extend(resultado.get('conflitos', []))
-        else:
-            resultados['erros'] += 1
+        conflito.status = 'resolvido'
+        conflito.data_resolucao = agora
     
-    return resultados
+    with transaction.atomic():
+        for paciente, campos in alteracoes.values():
+            # save() dispara os sinais de projeto e estatísticas
+            paciente.save(update_fields=sorted(campos | {'data_atualizacao'}))
+        
+        ConflitoDados.objects.bulk_update(
+            conflitos,
+            ['valor_escolhido', 'status', 'data_resolucao'],
+            batch_size=TAMANHO_LOTE
+        )
+    
+    # bulk_update não dispara o sinal que invalida o dashboard
+    transaction.on_commit(invalidar_estatisticas)
+    
+    return len(alteracoes)
+
 
+def resolver_conflitos_filtrados(conflitos, escolha):
+    """
+    Resolve todos os conflitos pendentes de um queryset já filtrado, sem
+    carregá-los em memória:
+    - 'existente': mantém os valores do banco (um único UPDATE nos conflitos)
+    - 'novo': aplica os valores novos nos pacientes com um UPDATE por campo
+      (se houver mais de um valor novo para o mesmo campo, vale o mais recente)
+    Retorna a quantidade de conflitos resolvidos.
+    """
+    conflitos = conflitos.filter(status='novo').order_by()
+    agora = timezone.now()
+    projetos_novos = {}
+    
+    with transaction.atomic():
+        if escolha == 'novo':
+            campos = set(conflitos.values_list('campo', flat=True).distinct())
+            
+            # A troca de projeto é gravada por último: o filtro por projeto da fila
+            # depende do valor atual, então os novos valores são lidos antes
+            if 'id_projeto' in campos:
+                campos.discard('id_projeto')
+                projetos_novos = dict(
+                    conflitos.filter(campo='id_projeto')
+                    .order_by('data_conflito', 'id')
+                    .values_list('paciente_id', 'valor_novo')
+                )
+            
+            for campo in sorted(campos):
+                do_campo = conflitos.filter(campo=campo)
+                valor_novo = (
+                    do_campo.filter(paciente=OuterRef('pk'))
+                    .order_by('-data_conflito', '-id')
+                    .values('valor_novo')[:1]
+                )
+                pacientes = Paciente.objects.filter(pk__in=do_campo.values('paciente_id'))
+                pacientes.update(**{campo: Subquery(valor_novo), 'data_atualizacao': agora})
+                
+                # O UPDATE não passa pelo save(), então o nome normalizado é refeito aqui
+                if campo in ('nome_paciente', 'nome_mae'):
+                    alterados = list(pacientes.only('id', 'nome_paciente', 'nome_mae'))
+                    for paciente in alterados:
+                        paciente.atualizar_campos_normalizados()
+                    Paciente.objects.bulk_update(
+                        alterados,
+                        ['nome_paciente_normalizado', 'nome_mae_normalizado'],
+                        batch_size=TAMANHO_LOTE
+                    )
+        
+        total = conflitos.update(
+            status='resolvido',
+            valor_escolhido=F('valor_novo') if escolha == 'novo' else F('valor_existente'),
+            data_resolucao=agora
+        )
+        
+        if projetos_novos:
+            por_projeto = {}
+            for paciente_id, codigo in projetos_novos.items():
+                por_projeto.setdefault(codigo, []).append(paciente_id)
+            
+            projetos_antigos = set()
+            for codigo, ids in por_projeto.items():
+                for inicio in range(0, len(ids), TAMANHO_CONSULTA_IN):
+                    pacientes = Paciente.objects.filter(pk__in=ids[inicio:inicio + TAMANHO_CONSULTA_IN])
+                    projetos_antigos.update(pacientes.values_list('id_projeto', flat=True).distinct())
+                    pacientes.update(id_projeto=codigo, data_atualizacao=agora)
+            
+            # UPDATE em massa não dispara os sinais da lista de projetos
+            Projeto.registrar(por_projeto)
+            Projeto.limpar(projetos_antigos)
+    
+    transaction.on_commit(invalidar_estatisticas)
+    
+    return total
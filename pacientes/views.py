@@ -1,28 +1,46 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
-from django.http import HttpResponse, JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse, FileResponse
+from django.core.exceptions import ValidationError
+from django.db import connection, DatabaseError
 from django.db.models import Q
 from django.utils import timezone
 from datetime import datetime
-import pandas as pd
-from io import BytesIO
+from urllib.parse import urlencode
+import csv
+import tempfile
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
 
-from .models import Paciente, ConflitoDados
+from .models import Paciente, ConflitoDados, ImportacaoPlanilha, Projeto, CandidatoDuplicata, ResultadoLinha
 from .forms import PacienteForm, UploadPlanilhaForm, ResolverConflitoForm, FiltroExportacaoForm
-from .utils import importar_planilha
+from .exportacao import campos_exportacao, cabecalhos, iterar_linhas
+from .paginacao import paginar_por_chave, paginar_por_posicao
+from .busca_textual import filtrar_por_historico
+from .estatisticas import obter_estatisticas
+from .utils import resolver_conflitos_em_lote, resolver_conflitos_filtrados, previsualizar_planilha
+from .mesclagem import mesclar_em_lote, mesclar_candidatos
+
+
+# Quantidade de pacientes por página na listagem
+PACIENTES_POR_PAGINA = 100
 
 
 def index(request):
     """
     Página inicial com dashboard de estatísticas.
     """
-    total_pacientes = Paciente.objects.count()
-    conflitos_pendentes = ConflitoDados.objects.filter(status='novo').count()
+    # Contagens vêm do cache (ver estatisticas.py), sem varrer as tabelas
+    estatisticas = obter_estatisticas()
     ultimos_cadastros = Paciente.objects.order_by('-data_cadastro')[:10]
     
     context = {
-        'total_pacientes': total_pacientes,
-        'conflitos_pendentes': conflitos_pendentes,
+        'total_pacientes': estatisticas['total_pacientes'],
+        'conflitos_pendentes': estatisticas['conflitos_pendentes'],
+        'por_projeto': estatisticas['por_projeto'],
+        'por_amostra': estatisticas['por_amostra'],
         'ultimos_cadastros': ultimos_cadastros,
     }
     
@@ -32,42 +50,75 @@ def index(request):
 def listar_pacientes(request):
     """
     Lista todos os pacientes com opções de busca e filtro.
-    Busca pelos 3 campos-chave separadamente.
+    Busca pelos 3 campos-chave separadamente; os nomes são buscados pelo
+    início, ignorando acentos e maiúsculas/minúsculas, ou em qualquer parte
+    do nome quando nenhum começa com o texto (ver Paciente.buscar_por_nome).
     """
     pacientes = Paciente.objects.all()
+    # Campos buscados em qualquer parte do nome, avisados na página
+    buscas_parciais = []
     
-    # Busca por Nome do Paciente
+    # Busca por Nome do Paciente (início do nome, sem acentos/maiúsculas)
     busca_nome = request.GET.get('busca_nome', '')
     if busca_nome:
-        pacientes = pacientes.filter(nome_paciente__icontains=busca_nome)
+        pacientes, parcial = Paciente.buscar_por_nome(pacientes, 'nome_paciente_normalizado', busca_nome)
+        if parcial:
+            buscas_parciais.append('Nome do Paciente')
     
     # Busca por Data de Nascimento
     busca_data = request.GET.get('busca_data', '')
     if busca_data:
         pacientes = pacientes.filter(data_nascimento=busca_data)
     
-    # Busca por Nome da Mãe
+    # Busca por Nome da Mãe (início do nome, sem acentos/maiúsculas)
     busca_mae = request.GET.get('busca_mae', '')
     if busca_mae:
-        pacientes = pacientes.filter(nome_mae__icontains=busca_mae)
+        pacientes, parcial = Paciente.buscar_por_nome(pacientes, 'nome_mae_normalizado', busca_mae)
+        if parcial:
+            buscas_parciais.append('Nome da Mãe')
     
-    # Filtro adicional por projeto
+    # Filtro adicional por projeto (valor exato da lista, usa o índice)
     projeto = request.GET.get('projeto', '')
     if projeto:
-        pacientes = pacientes.filter(id_projeto__icontains=projeto)
-    
-    # Paginação simples (top 100)
-    pacientes = pacientes[:100]
-    
-    # Lista de projetos únicos para o filtro
-    projetos = Paciente.objects.values_list('id_projeto', flat=True).distinct()
-    projetos = [p for p in projetos if p]
+        pacientes = pacientes.filter(id_projeto=projeto)
+    
+    # Busca no histórico clínico (FTS5), ordenada por relevância
+    busca_historico = request.GET.get('busca_historico', '')
+    if busca_historico:
+        pacientes = filtrar_por_historico(pacientes, busca_historico, connection)
+        pagina = paginar_por_posicao(
+            pacientes,
+            cursor=request.GET.get('cursor'),
+            tamanho=PACIENTES_POR_PAGINA
+        )
+    else:
+        # Paginação por chave em (data_cadastro, id)
+        pagina = paginar_por_chave(
+            pacientes,
+            'data_cadastro',
+            cursor=request.GET.get('cursor'),
+            anterior=request.GET.get('direcao') == 'anterior',
+            tamanho=PACIENTES_POR_PAGINA
+        )
+    
+    # Filtros atuais, para manter nos links de navegação
+    filtros = request.GET.copy()
+    filtros.pop('cursor', None)
+    filtros.pop('direcao', None)
+    
+    # Lista de projetos para o filtro (materializada, ver Projeto)
+    projetos = Projeto.objects.values_list('codigo', flat=True)
     
     context = {
-        'pacientes': pacientes,
+        'pacientes': pagina['itens'],
+        'cursor_proximo': pagina['cursor_proximo'],
+        'cursor_anterior': pagina['cursor_anterior'],
+        'filtros': filtros.urlencode(),
         'busca_nome': busca_nome,
         'busca_data': busca_data,
         'busca_mae': busca_mae,
+        'buscas_parciais': buscas_parciais,
+        'busca_historico': busca_historico,
         'projeto': projeto,
         'projetos': projetos,
     }
@@ -152,99 +203,191 @@ def editar_paciente(request, pk):
 
 def upload_planilha(request):
     """
-    Upload e processamento de planilhas Excel/CSV.
+    Upload de planilhas Excel/CSV.
+    O arquivo é gravado e colocado na fila; o processamento é feito pelo
+    worker (manage.py processar_importacoes) e acompanhado por polling.
+    Com o botão "Pré-visualizar", a planilha é só analisada (nada é gravado)
+    e o resultado previsto é exibido na própria página.
     """
+    previa = None
+    
     if request.method == 'POST':
         form = UploadPlanilhaForm(request.POST, request.FILES)
-        if form.is_valid():
+        if form.is_valid() and 'previsualizar' in request.POST:
             arquivo = request.FILES['arquivo']
-            tipo_planilha = form.cleaned_data['tipo_planilha']
-            criar_conflitos = not form.cleaned_data['substituir_duplicatas']
-            
             try:
-                resultados = importar_planilha(arquivo, tipo_planilha, criar_conflitos)
-                
-                if 'erro' in resultados:
-                    messages.error(request, f'Erro ao importar: {resultados["erro"]}')
-                else:
-                    # Armazena resultados na sessão para exibir
-                    request.session['resultados_importacao'] = {
-                        'total': resultados['total'],
-                        'novos': resultados['novos'],
-                        'atualizados': resultados['atualizados'],
-                        'conflitos': resultados['conflitos'],
-                        'erros': resultados['erros'],
-                    }
-                    
-                    # Se houver conflitos, redireciona para resolver
-                    if resultados['conflitos'] > 0:
-                        conflitos_ids = [c.id for c in resultados['conflitos_lista']]
-                        request.session['conflitos_pendentes'] = conflitos_ids
-                        messages.warning(
-                            request,
-                            f'Importação concluída com {resultados["conflitos"]} conflito(s). Resolva os conflitos abaixo.'
-                        )
-                        return redirect('resolver_conflitos')
-                    
-                    messages.success(
-                        request,
-                        f'Importação concluída! Novos: {resultados["novos"]}, '
-                        f'Atualizados: {resultados["atualizados"]}, '
-                        f'Erros: {resultados["erros"]}'
-                    )
-                    return redirect('listar_pacientes')
-            
+                previa = previsualizar_planilha(
+                    arquivo,
+                    form.cleaned_data['tipo_planilha'],
+                    criar_conflitos=not form.cleaned_data['substituir_duplicatas'],
+                    pular_inalteradas=form.cleaned_data['pular_inalteradas']
+                )
             except Exception as e:
-                messages.error(request, f'Erro ao processar arquivo: {str(e)}')
+                previa = {'erro': str(e)}
+            previa['nome_arquivo'] = arquivo.name
+        elif form.is_valid():
+            arquivo = request.FILES['arquivo']
+            
+            importacao = ImportacaoPlanilha.objects.create(
+                arquivo=arquivo,
+                nome_arquivo=arquivo.name,
+                tipo_planilha=form.cleaned_data['tipo_planilha'],
+                criar_conflitos=not form.cleaned_data['substituir_duplicatas'],
+                tudo_ou_nada=form.cleaned_data['tudo_ou_nada'],
+                pular_inalteradas=form.cleaned_data['pular_inalteradas'],
+            )
+            
+            messages.info(request, f'Planilha {arquivo.name} enviada! O processamento começará em instantes.')
+            return redirect('acompanhar_importacao', pk=importacao.pk)
     else:
         form = UploadPlanilhaForm()
     
     context = {
-        'form': form
+        'form': form,
+        'previa': previa,
+        'importacoes': ImportacaoPlanilha.objects.all()[:10],
     }
     
     return render(request, 'pacientes/upload.html', context)
 
 
-def resolver_conflitos(request):
+# Quantidade de linhas com erro listadas na página da importação
+ERROS_POR_IMPORTACAO = 100
+
+
+def acompanhar_importacao(request, pk):
     """
-    Interface para resolver conflitos de dados.
+    Página que acompanha o progresso de uma importação e, ao final, lista
+    as linhas com erro (ResultadoLinha).
     """
-    # Busca conflitos pendentes (da sessão ou todos)
-    conflitos_ids = request.session.get('conflitos_pendentes')
+    importacao = get_object_or_404(ImportacaoPlanilha, pk=pk)
+    
+    linhas_com_erro = []
+    if importacao.finalizada:
+        linhas_com_erro = importacao.resultados_linhas.filter(
+            status=ResultadoLinha.ERRO
+        ).order_by('linha')[:ERROS_POR_IMPORTACAO]
+    
+    context = {
+        'importacao': importacao,
+        'linhas_com_erro': linhas_com_erro,
+    }
     
-    if conflitos_ids:
-        conflitos = ConflitoDados.objects.filter(id__in=conflitos_ids, status='novo')
+    return render(request, 'pacientes/importacao.html', context)
+
+
+def status_importacao(request, pk):
+    """
+    Retorna o progresso de uma importação em JSON (usado pelo polling da página).
+    Se o worker que a processava morreu e nenhum outro está rodando, ela é
+    encerrada aqui, para que a página não fique esperando para sempre.
+    """
+    importacao = get_object_or_404(ImportacaoPlanilha, pk=pk)
+    if importacao.abandonada:
+        ImportacaoPlanilha.encerrar_abandonadas()
+        importacao.refresh_from_db()
+    
+    return JsonResponse({
+        'status': importacao.status,
+        'status_display': importacao.get_status_display(),
+        'finalizada': importacao.finalizada,
+        'total': importacao.total_linhas,
+        'processadas': importacao.linhas_processadas,
+        'percentual': importacao.percentual,
+        'novos': importacao.novos,
+        'atualizados': importacao.atualizados,
+        'conflitos': importacao.conflitos,
+        'erros': importacao.erros,
+        'inalteradas': importacao.inalteradas,
+        'mensagem_erro': importacao.mensagem_erro,
+    })
+
+
+# Quantidade de conflitos por página na fila de revisão
+CONFLITOS_POR_PAGINA = 50
+
+
+def filtrar_conflitos(parametros):
+    """
+    Aplica os filtros da fila de conflitos (campo, projeto e importação)
+    sobre os conflitos pendentes. Retorna (queryset, filtros aplicados).
+    """
+    conflitos = ConflitoDados.objects.filter(status='novo')
+    filtros = {
+        'campo': parametros.get('campo', ''),
+        'projeto': parametros.get('projeto', ''),
+        'importacao': parametros.get('importacao', ''),
+    }
+    
+    if filtros['campo']:
+        conflitos = conflitos.filter(campo=filtros['campo'])
+    if filtros['projeto']:
+        conflitos = conflitos.filter(paciente__id_projeto=filtros['projeto'])
+    if filtros['importacao'].isdigit():
+        conflitos = conflitos.filter(importacao_id=filtros['importacao'])
     else:
-        conflitos = ConflitoDados.objects.filter(status='novo')[:50]  # Limita a 50 por vez
+        filtros['importacao'] = ''
     
+    return conflitos, filtros
+
+
+def resolver_conflitos(request):
+    """
+    Fila paginada de conflitos pendentes, filtrável por campo, projeto e
+    importação. Os conflitos da página podem ser resolvidos um a um, ou todo
+    o conjunto filtrado de uma vez (aceitar todos os novos / manter todos os
+    existentes) sem carregar os conflitos.
+    """
     if request.method == 'POST':
-        for conflito in conflitos:
-            escolha = request.POST.get(f'conflito_{conflito.id}')
-            
-            if escolha == 'existente':
-                conflito.valor_escolhido = conflito.valor_existente
-            elif escolha == 'novo':
-                conflito.valor_escolhido = conflito.valor_novo
-                # Atualiza o paciente com o novo valor
-                setattr(conflito.paciente, conflito.campo, conflito.valor_novo)
-                conflito.paciente.save()
-            
-            conflito.status = 'resolvido'
-            conflito.data_resolucao = timezone.now()
-            conflito.save()
+        conflitos, filtros = filtrar_conflitos(request.POST)
+        acao = request.POST.get('acao')
         
-        # Limpa a sessão
-        if 'conflitos_pendentes' in request.session:
-            del request.session['conflitos_pendentes']
+        try:
+            if acao in ('aceitar_novos', 'manter_existentes'):
+                # Resolve o conjunto filtrado inteiro com UPDATEs em massa
+                total = resolver_conflitos_filtrados(
+                    conflitos,
+                    'novo' if acao == 'aceitar_novos' else 'existente'
+                )
+            else:
+                # Resolve apenas os conflitos da página enviada
+                ids = [
+                    int(chave[len('conflito_'):]) for chave in request.POST
+                    if chave.startswith('conflito_') and chave[len('conflito_'):].isdigit()
+                ]
+                conflitos = list(conflitos.filter(id__in=ids).select_related('paciente'))
+                escolhas = {
+                    conflito.id: request.POST.get(f'conflito_{conflito.id}')
+                    for conflito in conflitos
+                }
+                resolver_conflitos_em_lote(conflitos, escolhas)
+                total = len(conflitos)
+        except (DatabaseError, ValidationError) as e:
+            # Valor novo inválido ou que viola uma restrição (ex.: ID único
+            # repetido): a transação é desfeita e nenhum conflito é resolvido
+            messages.error(request, f'Nenhum conflito foi resolvido: {e}')
+        else:
+            messages.success(request, f'{total} conflito(s) resolvido(s) com sucesso!')
         
-        messages.success(request, f'{len(conflitos)} conflito(s) resolvido(s) com sucesso!')
-        return redirect('listar_pacientes')
+        filtros = urlencode({chave: valor for chave, valor in filtros.items() if valor})
+        return redirect(f"{reverse('resolver_conflitos')}?{filtros}" if filtros else 'resolver_conflitos')
+    
+    conflitos, filtros = filtrar_conflitos(request.GET)
+    total_conflitos = conflitos.count()
+    
+    # Paginação por chave em (data_conflito, id), mais recentes primeiro
+    pagina = paginar_por_chave(
+        conflitos.select_related('paciente'),
+        'data_conflito',
+        cursor=request.GET.get('cursor'),
+        anterior=request.GET.get('direcao') == 'anterior',
+        tamanho=CONFLITOS_POR_PAGINA
+    )
     
-    # Agrupa conflitos por paciente
+    # Agrupa conflitos da página por paciente
     conflitos_por_paciente = {}
-    for conflito in conflitos:
-        paciente_id = conflito.paciente.id
+    for conflito in pagina['itens']:
+        paciente_id = conflito.paciente_id
         if paciente_id not in conflitos_por_paciente:
             conflitos_por_paciente[paciente_id] = {
                 'paciente': conflito.paciente,
@@ -252,14 +395,99 @@ def resolver_conflitos(request):
             }
         conflitos_por_paciente[paciente_id]['conflitos'].append(conflito)
     
+    # Opções dos filtros
+    campos = (
+        ConflitoDados.objects.filter(status='novo')
+        .order_by('campo').values_list('campo', flat=True).distinct()
+    )
+    projetos = Projeto.objects.values_list('codigo', flat=True)
+    importacoes = ImportacaoPlanilha.objects.filter(conflitos__gt=0)[:20]
+    
     context = {
         'conflitos_por_paciente': conflitos_por_paciente.values(),
-        'total_conflitos': len(conflitos)
+        'total_conflitos': total_conflitos,
+        'total_pagina': len(pagina['itens']),
+        'cursor_proximo': pagina['cursor_proximo'],
+        'cursor_anterior': pagina['cursor_anterior'],
+        'filtros': urlencode({chave: valor for chave, valor in filtros.items() if valor}),
+        'filtro': filtros,
+        'campos': campos,
+        'projetos': projetos,
+        'importacoes': importacoes,
     }
     
     return render(request, 'pacientes/resolver_conflitos.html', context)
 
 
+# Quantidade de pares por página na revisão de duplicatas
+DUPLICATAS_POR_PAGINA = 25
+
+
+def revisar_duplicatas(request):
+    """
+    Lista os pares de pacientes que provavelmente são a mesma pessoa
+    (encontrados pelo comando `manage.py buscar_duplicatas`), do mais para o
+    menos provável, para revisão: cada par pode ser descartado ou mesclado
+    (ver mesclagem.py), e vários pares podem ser mesclados de uma vez.
+    """
+    if request.method == 'POST':
+        acao = request.POST.get('acao')
+        
+        if acao == 'mesclar_selecionados':
+            # Mescla vários pares numa única transação, mantendo o cadastro mais antigo
+            ids = [pk for pk in request.POST.getlist('candidatos') if pk.isdigit()]
+            candidatos = CandidatoDuplicata.objects.filter(pk__in=ids)
+            try:
+                resultados = mesclar_candidatos(candidatos)
+            except Exception as e:
+                messages.error(request, f'Nenhuma mesclagem foi gravada: {e}')
+            else:
+                messages.success(request, f'{len(resultados)} paciente(s) mesclado(s) com sucesso!')
+            return redirect('revisar_duplicatas')
+        
+        candidato = get_object_or_404(CandidatoDuplicata, pk=request.POST.get('candidato'), status='pendente')
+        
+        if acao == 'descartar':
+            candidato.status = 'descartado'
+            candidato.data_revisao = timezone.now()
+            candidato.save(update_fields=['status', 'data_revisao'])
+            messages.success(request, 'Par marcado como pessoas diferentes.')
+        
+        elif acao in ('mesclar:paciente', 'mesclar:duplicata'):
+            # O revisor escolhe qual dos dois cadastros permanece
+            par = (candidato.paciente_id, candidato.duplicata_id)
+            if acao == 'mesclar:duplicata':
+                par = par[::-1]
+            try:
+                [(principal, _, campos_atualizados, conflitos)] = mesclar_em_lote([par])
+            except Exception as e:
+                messages.error(request, f'Erro ao mesclar: {e}')
+            else:
+                messages.success(
+                    request,
+                    f'Pacientes mesclados em {principal.nome_paciente}: '
+                    f'{len(campos_atualizados)} campo(s) preenchido(s), {len(conflitos)} conflito(s) para revisar.'
+                )
+        
+        return redirect('revisar_duplicatas')
+    
+    candidatos = CandidatoDuplicata.objects.filter(status='pendente').select_related('paciente', 'duplicata')
+    pagina = paginar_por_posicao(
+        candidatos,
+        cursor=request.GET.get('cursor'),
+        tamanho=DUPLICATAS_POR_PAGINA
+    )
+    
+    context = {
+        'candidatos': pagina['itens'],
+        'cursor_proximo': pagina['cursor_proximo'],
+        'cursor_anterior': pagina['cursor_anterior'],
+        'total_candidatos': candidatos.count(),
+    }
+    
+    return render(request, 'pacientes/duplicatas.html', context)
+
+
 def exportar_dados(request):
     """
     Exporta dados em formato Excel, CSV ou PDF.
@@ -300,109 +528,44 @@ def exportar_dados(request):
     return render(request, 'pacientes/exportar.html', context)
 
 
+class Echo:
+    """
+    Pseudo-buffer para o csv.writer: devolve o texto em vez de gravá-lo,
+    permitindo gerar o CSV sob demanda em um StreamingHttpResponse.
+    """
+    def write(self, valor):
+        return valor
+
+
 def exportar_excel(pacientes, campos_selecionados=None):
     """
     Gera arquivo Excel com os dados dos pacientes.
     Se nenhum campo selecionado, exporta apenas os 3 campos-chave.
     """
-    # Mapeamento de campos internos para labels amigáveis
-    campo_labels = {
-        'id': 'ID',
-        'nome_paciente': 'Nome Paciente',
-        'data_nascimento': 'Data Nascimento',
-        'nome_mae': 'Nome Mãe',
-        'id_projeto': 'ID Projeto',
-        'id_unico': 'ID Único',
-        'projeto_original': 'Projeto Original',
-        'sexo': 'Sexo',
-        'rg': 'RG',
-        'cpf': 'CPF',
-        'cid10': 'CID10',
-        'data_nascimento_mae': 'Data Nascimento Mãe',
-        'id_familiar': 'ID Familiar',
-        'id_lpc_biob': 'ID LPC BIOB',
-        'amostra_biologica': 'Amostra Biológica',
-        'sangue': 'Sangue',
-        'plasma': 'Plasma',
-        'soro': 'Soro',
-        'pax_gene': 'PaxGene',
-        'saliva': 'Saliva',
-        'scu': 'SCU',
-        'placenta': 'Placenta',
-        'placenta_ffpe': 'Placenta FFPE',
-        'dna': 'DNA',
-        'rna': 'RNA',
-        'proteina': 'Proteína',
-        'metiloma': 'Metiloma',
-        'dnam_gene': 'DNAm Gene',
-        'dna_seq': 'DNA Seq',
-        'exoma': 'Exoma',
-        'rna_seq': 'RNA Seq',
-        'mi_rna': 'miRNA',
-        'comprimento_telomerico': 'Comprimento Telomérico',
-        'citocinas': 'Citocinas',
-        'cortisol': 'Cortisol',
-        'exossomos': 'Exossomos',
-        'prs': 'PRS',
-        'outros_bioinfo': 'Outros (Bioinfo)',
-        'historico_materno': 'Histórico Materno',
-        'historico_gravidez': 'Histórico Gravidez',
-        'historico_familiar': 'Histórico Familiar',
-        'info_parto': 'Info Parto',
-        'cars': 'CARS',
-        'qi': 'QI',
-        'comunicacao_vineland': 'Comunicação Vineland',
-        'hab_dia_vineland': 'Hab. Dia a Dia Vineland',
-        'socializacao_vineland': 'Socialização Vineland',
-        'adi_total': 'ADI Total',
-        'cbcl_internal': 'CBCL Internal',
-        'cbcl_external': 'CBCL External',
-        'score_psiquiatrico_mae': 'Score Psiquiátrico Mãe',
-        'score_exposicao_ambiental': 'Score Exposição Ambiental',
-        'score_estresse_materno': 'Score Estresse Materno',
-        'escolaridade_materna': 'Escolaridade Materna',
-        'renda_familiar': 'Renda Familiar',
-        'data_cadastro': 'Data Cadastro',
-        'data_atualizacao': 'Data Atualização',
-    }
+    campos_exportar = campos_exportacao(campos_selecionados)
     
-    # Define quais campos exportar
-    if campos_selecionados:
-        campos_exportar = ['id'] + list(campos_selecionados)
-    else:
-        # Se nenhum campo selecionado, exporta apenas os 3 campos-chave
-        campos_exportar = ['id', 'nome_paciente', 'data_nascimento', 'nome_mae']
-    
-    # Prepara dados para DataFrame
-    dados = []
-    for p in pacientes:
-        linha = {}
-        for campo in campos_exportar:
-            if campo == 'id':
-                linha[campo_labels[campo]] = p.id
-            else:
-                valor = getattr(p, campo, None)
-                # Formata datas
-                if campo in ['data_nascimento', 'data_nascimento_mae'] and valor:
-                    linha[campo_labels[campo]] = valor.strftime('%d/%m/%Y')
-                elif campo in ['data_cadastro', 'data_atualizacao'] and valor:
-                    linha[campo_labels[campo]] = valor.strftime('%d/%m/%Y %H:%M')
-                else:
-                    linha[campo_labels[campo]] = valor if valor else ''
-        dados.append(linha)
-    
-    df = pd.DataFrame(dados)
-    
-    # Cria arquivo Excel em memória
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Pacientes')
+    # Workbook em modo write-only: as linhas vão direto para o arquivo
+    # temporário em disco, sem manter a planilha inteira em memória
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Pacientes')
     
+    cabecalho = []
+    for rotulo in cabecalhos(campos_exportar):
+        celula = WriteOnlyCell(ws, value=rotulo)
+        celula.font = Font(bold=True)
+        cabecalho.append(celula)
+    ws.append(cabecalho)
+    
+    for linha in iterar_linhas(pacientes, campos_exportar, vazio=None):
+        ws.append(linha)
+    
+    output = tempfile.TemporaryFile()
+    wb.save(output)
     output.seek(0)
     
-    # Retorna como resposta HTTP
-    response = HttpResponse(
-        output.read(),
+    # Retorna como resposta HTTP, enviando o arquivo em blocos
+    response = FileResponse(
+        output,
         content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
     )
     response['Content-Disposition'] = f'attachment; filename=pacientes_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
@@ -415,101 +578,18 @@ def exportar_csv(pacientes, campos_selecionados=None):
     Gera arquivo CSV com os dados dos pacientes.
     Se nenhum campo selecionado, exporta apenas os 3 campos-chave.
     """
-    # Usa a mesma lógica do Excel para consistência
-    # Mapeamento de campos internos para labels amigáveis
-    campo_labels = {
-        'id': 'ID',
-        'nome_paciente': 'Nome Paciente',
-        'data_nascimento': 'Data Nascimento',
-        'nome_mae': 'Nome Mãe',
-        'id_projeto': 'ID Projeto',
-        'id_unico': 'ID Único',
-        'projeto_original': 'Projeto Original',
-        'sexo': 'Sexo',
-        'rg': 'RG',
-        'cpf': 'CPF',
-        'cid10': 'CID10',
-        'data_nascimento_mae': 'Data Nascimento Mãe',
-        'id_familiar': 'ID Familiar',
-        'id_lpc_biob': 'ID LPC BIOB',
-        'amostra_biologica': 'Amostra Biológica',
-        'sangue': 'Sangue',
-        'plasma': 'Plasma',
-        'soro': 'Soro',
-        'pax_gene': 'PaxGene',
-        'saliva': 'Saliva',
-        'scu': 'SCU',
-        'placenta': 'Placenta',
-        'placenta_ffpe': 'Placenta FFPE',
-        'dna': 'DNA',
-        'rna': 'RNA',
-        'proteina': 'Proteína',
-        'metiloma': 'Metiloma',
-        'dnam_gene': 'DNAm Gene',
-        'dna_seq': 'DNA Seq',
-        'exoma': 'Exoma',
-        'rna_seq': 'RNA Seq',
-        'mi_rna': 'miRNA',
-        'comprimento_telomerico': 'Comprimento Telomérico',
-        'citocinas': 'Citocinas',
-        'cortisol': 'Cortisol',
-        'exossomos': 'Exossomos',
-        'prs': 'PRS',
-        'outros_bioinfo': 'Outros (Bioinfo)',
-        'historico_materno': 'Histórico Materno',
-        'historico_gravidez': 'Histórico Gravidez',
-        'historico_familiar': 'Histórico Familiar',
-        'info_parto': 'Info Parto',
-        'cars': 'CARS',
-        'qi': 'QI',
-        'comunicacao_vineland': 'Comunicação Vineland',
-        'hab_dia_vineland': 'Hab. Dia a Dia Vineland',
-        'socializacao_vineland': 'Socialização Vineland',
-        'adi_total': 'ADI Total',
-        'cbcl_internal': 'CBCL Internal',
-        'cbcl_external': 'CBCL External',
-        'score_psiquiatrico_mae': 'Score Psiquiátrico Mãe',
-        'score_exposicao_ambiental': 'Score Exposição Ambiental',
-        'score_estresse_materno': 'Score Estresse Materno',
-        'escolaridade_materna': 'Escolaridade Materna',
-        'renda_familiar': 'Renda Familiar',
-        'data_cadastro': 'Data Cadastro',
-        'data_atualizacao': 'Data Atualização',
-    }
-    
-    # Define quais campos exportar
-    if campos_selecionados:
-        campos_exportar = ['id'] + list(campos_selecionados)
-    else:
-        # Se nenhum campo selecionado, exporta apenas os 3 campos-chave
-        campos_exportar = ['id', 'nome_paciente', 'data_nascimento', 'nome_mae']
-    
-    # Prepara dados para DataFrame
-    dados = []
-    for p in pacientes:
-        linha = {}
-        for campo in campos_exportar:
-            if campo == 'id':
-                linha[campo_labels[campo]] = p.id
-            else:
-                valor = getattr(p, campo, None)
-                if campo in ['data_nascimento', 'data_nascimento_mae'] and valor:
-                    linha[campo_labels[campo]] = valor.strftime('%d/%m/%Y')
-                elif campo in ['data_cadastro', 'data_atualizacao'] and valor:
-                    linha[campo_labels[campo]] = valor.strftime('%d/%m/%Y %H:%M')
-                else:
-                    linha[campo_labels[campo]] = valor if valor else ''
-        dados.append(linha)
-    
-    df = pd.DataFrame(dados)
-    
-    # Cria CSV em memória
-    output = BytesIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig')
-    output.seek(0)
-    
-    # Retorna como resposta HTTP
-    response = HttpResponse(output.read(), content_type='text/csv')
+    campos_exportar = campos_exportacao(campos_selecionados)
+    
+    def gerar_linhas():
+        # Gera o CSV linha a linha, buscando só as colunas selecionadas
+        writer = csv.writer(Echo(), lineterminator='\n')
+        # BOM para o Excel reconhecer o arquivo como UTF-8
+        yield '\ufeff' + writer.writerow(cabecalhos(campos_exportar))
+        for linha in iterar_linhas(pacientes, campos_exportar):
+            yield writer.writerow(linha)
+    
+    # Retorna como resposta HTTP em streaming (memória constante)
+    response = StreamingHttpResponse(gerar_linhas(), content_type='text/csv')
     response['Content-Disposition'] = f'attachment; filename=pacientes_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
     
     return response
@@ -520,102 +600,16 @@ def visualizar_dados(request, pacientes, campos_selecionados=None):
     Renderiza página de visualização formatada para impressão.
     Abre em nova aba com layout paisagem.
     """
-    # Mapeamento de campos internos para labels amigáveis
-    campo_labels = {
-        'id': 'ID',
-        'nome_paciente': 'Nome Paciente',
-        'data_nascimento': 'Data Nascimento',
-        'nome_mae': 'Nome Mãe',
-        'id_projeto': 'ID Projeto',
-        'id_unico': 'ID Único',
-        'projeto_original': 'Projeto Original',
-        'sexo': 'Sexo',
-        'rg': 'RG',
-        'cpf': 'CPF',
-        'cid10': 'CID10',
-        'data_nascimento_mae': 'Data Nascimento Mãe',
-        'id_familiar': 'ID Familiar',
-        'id_lpc_biob': 'ID LPC BIOB',
-        'amostra_biologica': 'Amostra Biológica',
-        'sangue': 'Sangue',
-        'plasma': 'Plasma',
-        'soro': 'Soro',
-        'pax_gene': 'PaxGene',
-        'saliva': 'Saliva',
-        'scu': 'SCU',
-        'placenta': 'Placenta',
-        'placenta_ffpe': 'Placenta FFPE',
-        'dna': 'DNA',
-        'rna': 'RNA',
-        'proteina': 'Proteína',
-        'metiloma': 'Metiloma',
-        'dnam_gene': 'DNAm Gene',
-        'dna_seq': 'DNA Seq',
-        'exoma': 'Exoma',
-        'rna_seq': 'RNA Seq',
-        'mi_rna': 'miRNA',
-        'comprimento_telomerico': 'Compr. Telomérico',
-        'citocinas': 'Citocinas',
-        'cortisol': 'Cortisol',
-        'exossomos': 'Exossomos',
-        'prs': 'PRS',
-        'outros_bioinfo': 'Outros (Bioinfo)',
-        'historico_materno': 'Histórico Materno',
-        'historico_gravidez': 'Histórico Gravidez',
-        'historico_familiar': 'Histórico Familiar',
-        'info_parto': 'Info Parto',
-        'cars': 'CARS',
-        'qi': 'QI',
-        'comunicacao_vineland': 'Com. Vineland',
-        'hab_dia_vineland': 'Hab. Dia Vineland',
-        'socializacao_vineland': 'Soc. Vineland',
-        'adi_total': 'ADI Total',
-        'cbcl_internal': 'CBCL Internal',
-        'cbcl_external': 'CBCL External',
-        'score_psiquiatrico_mae': 'Score Psiq. Mãe',
-        'score_exposicao_ambiental': 'Score Exp. Amb.',
-        'score_estresse_materno': 'Score Estresse Mat.',
-        'escolaridade_materna': 'Escolaridade Mat.',
-        'renda_familiar': 'Renda Familiar',
-        'data_cadastro': 'Data Cadastro',
-        'data_atualizacao': 'Data Atualização',
-    }
+    campos_exibir = campos_exportacao(campos_selecionados)
     
-    # Define quais campos exibir
-    if campos_selecionados:
-        campos_exibir = ['id'] + list(campos_selecionados)
-    else:
-        # Se nenhum campo selecionado, exibe apenas os 3 campos-chave
-        campos_exibir = ['id', 'nome_paciente', 'data_nascimento', 'nome_mae']
-    
-    # Prepara cabeçalhos
-    cabecalhos = [campo_labels.get(campo, campo) for campo in campos_exibir]
-    
-    # Prepara dados
-    dados_tabela = []
-    for p in pacientes:
-        linha = []
-        for campo in campos_exibir:
-            if campo == 'id':
-                valor = p.id
-            else:
-                valor = getattr(p, campo, None)
-                # Formata datas
-                if campo in ['data_nascimento', 'data_nascimento_mae'] and valor:
-                    valor = valor.strftime('%d/%m/%Y')
-                elif campo in ['data_cadastro', 'data_atualizacao'] and valor:
-                    valor = valor.strftime('%d/%m/%Y %H:%M')
-                # Limita tamanho de textos longos
-                elif isinstance(valor, str) and len(valor) > 50:
-                    valor = valor[:47] + '...'
-            linha.append(valor if valor else '-')
-        dados_tabela.append(linha)
+    # Textos longos são limitados a 50 caracteres
+    dados_tabela = list(iterar_linhas(pacientes, campos_exibir, vazio='-', limite_texto=50))
     
     context = {
-        'cabecalhos': cabecalhos,
+        'cabecalhos': cabecalhos(campos_exibir, curtos=True),
         'dados': dados_tabela,
         'total_registros': len(dados_tabela),
-        'total_campos': len(cabecalhos),
+        'total_campos': len(campos_exibir),
         'data_geracao': datetime.now(),
     }
     
@@ -0,0 +1,370 @@
+"""
+Vinculação de registros (record linkage) para encontrar pacientes duplicados
+que a busca exata (Paciente.buscar_duplicata) não encontra: erros de
+digitação, acentos faltando, nomes abreviados etc.
+
+Para não comparar todos os pares (quadrático), os pacientes são agrupados em
+blocos e só são comparados dentro do mesmo bloco:
+- ano de nascimento + chave fonética do primeiro nome
+- ano de nascimento + chave fonética do último sobrenome
+- CPF igual (qualquer ano)
+Blocos grandes são comparados por vizinhança ordenada (cada registro só com
+os próximos JANELA_VIZINHANCA em ordem alfabética).
+
+Pares com CPFs diferentes ou com primeiros nomes diferentes (irmãos têm a
+mesma mãe e os mesmos sobrenomes) têm a pontuação reduzida à metade.
+
+Os pares com pontuação acima do limiar são gravados como CandidatoDuplicata
+para revisão; nada é mesclado automaticamente.
+"""
+import re
+from collections import namedtuple
+from itertools import combinations, groupby
+
+from django.db.models import Count
+
+from .models import Paciente, CandidatoDuplicata
+
+
+# Pesos de cada critério na pontuação final (critérios ausentes não contam)
+PESOS = {
+    'nome': 0.4,
+    'mae': 0.3,
+    'data': 0.2,
+    'cpf': 0.1,
+}
+
+# Pontuação mínima para um par virar candidato a duplicata
+LIMIAR_PADRAO = 0.85
+
+# Abaixo desta similaridade os primeiros nomes são considerados diferentes
+# (ver similaridade_primeiro_nome)
+MINIMO_PRIMEIRO_NOME = 0.8
+
+# Blocos até este tamanho comparam todos os pares; acima, vizinhança ordenada
+TAMANHO_MAXIMO_BLOCO = 50
+JANELA_VIZINHANCA = 20
+
+TAMANHO_LOTE = 1000
+
+Registro = namedtuple('Registro', 'id nome mae data cpf')
+
+
+# Regras fonéticas para português, aplicadas em ordem sobre o texto já
+# normalizado (sem acentos e em minúsculas)
+REGRAS_FONETICAS = [
+    (re.compile(r'ph'), 'f'),
+    (re.compile(r'th'), 't'),
+    (re.compile(r'[cs]h'), 'x'),
+    (re.compile(r'lh'), 'l'),
+    (re.compile(r'nh'), 'n'),
+    (re.compile(r'h'), ''),
+    (re.compile(r'q[u]?'), 'k'),
+    (re.compile(r'c(?=[eiy])'), 's'),
+    (re.compile(r'g(?=[eiy])'), 'j'),
+    (re.compile(r'c'), 'k'),
+    (re.compile(r'[zç]'), 's'),
+    (re.compile(r'w'), 'v'),
+    (re.compile(r'y'), 'i'),
+    (re.compile(r'n(?=[bp])'), 'm'),
+    (re.compile(r'(.)\1+'), r'\1'),
+]
+
+
+def chave_fonetica(palavra):
+    """
+    Chave fonética simplificada para nomes em português: aplica as regras
+    de REGRAS_FONETICAS e mantém a primeira letra seguida das consoantes.
+    Ex.: 'luiza', 'luisa' e 'luyza' têm a mesma chave.
+    """
+    for regra, substituto in REGRAS_FONETICAS:
+        palavra = regra.sub(substituto, palavra)
+    if not palavra:
+        return ''
+    return palavra[0] + re.sub(r'[aeiou]', '', palavra[1:])
+
+
+def jaro_winkler(a, b):
+    """
+    Similaridade de Jaro-Winkler entre duas strings (0 a 1).
+    """
+    if a == b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    
+    alcance = max(max(len(a), len(b)) // 2 - 1, 0)
+    marcados_a = [False] * len(a)
+    marcados_b = [False] * len(b)
+    iguais = 0
+    
+    for i, letra in enumerate(a):
+        fim = min(i + alcance + 1, len(b))
+        j = b.find(letra, max(0, i - alcance), fim)
+        while j != -1 and marcados_b[j]:
+            j = b.find(letra, j + 1, fim)
+        if j != -1:
+            marcados_a[i] = marcados_b[j] = True
+            iguais += 1
+    
+    if not iguais:
+        return 0.0
+    
+    transposicoes = 0
+    j = 0
+    for i, letra in enumerate(a):
+        if marcados_a[i]:
+            while not marcados_b[j]:
+                j += 1
+            if letra != b[j]:
+                transposicoes += 1
+            j += 1
+    
+    jaro = (iguais / len(a) + iguais / len(b) + (iguais - transposicoes // 2) / iguais) / 3
+    
+    # Bônus para prefixo comum (até 4 letras)
+    prefixo = 0
+    for letra_a, letra_b in zip(a[:4], b[:4]):
+        if letra_a != letra_b:
+            break
+        prefixo += 1
+    
+    return jaro + prefixo * 0.1 * (1 - jaro)
+
+
+def similaridade_nome(a, b):
+    """
+    Similaridade entre dois nomes normalizados, tolerando a troca de ordem
+    das palavras (ex.: 'silva maria' x 'maria silva').
+    """
+    if not a or not b:
+        return None
+    similaridade = jaro_winkler(a, b)
+    if similaridade >= 0.9:
+        return similaridade
+    return max(
+        similaridade,
+        jaro_winkler(' '.join(sorted(a.split())), ' '.join(sorted(b.split())))
+    )
+
+
+def similaridade_primeiro_nome(a, b):
+    """
+    Similaridade entre o primeiro nome de cada um e a palavra mais parecida
+    do outro nome (tolera a troca de ordem, como similaridade_nome). Uma
+    inicial equivale a qualquer palavra que comece com ela ('m' x 'maria').
+    Irmãos têm sobrenomes e mãe iguais; o que os distingue é o primeiro nome.
+    """
+    palavras_a, palavras_b = a.split() if a else [], b.split() if b else []
+    if not palavras_a or not palavras_b:
+        return None
+    
+    def melhor(palavra, palavras):
+        if len(palavra) == 1:
+            return 1.0 if any(outra[0] == palavra for outra in palavras) else 0.0
+        return max(
+            1.0 if len(outra) == 1 and outra == palavra[0] else jaro_winkler(palavra, outra)
+            for outra in palavras
+        )
+    
+    return max(melhor(palavras_a[0], palavras_b), melhor(palavras_b[0], palavras_a))
+
+
+def similaridade_data(a, b):
+    """
+    1 para datas iguais, 0.8 para dia e mês trocados, 0.6 quando só um dos
+    componentes (dia, mês ou ano) difere; 0 nos demais casos.
+    """
+    if not a or not b:
+        return None
+    if a == b:
+        return 1.0
+    if (a.day, a.month, a.year) == (b.month, b.day, b.year):
+        return 0.8
+    iguais = (a.day == b.day) + (a.month == b.month) + (a.year == b.year)
+    return 0.6 if iguais == 2 else 0.0
+
+
+def normalizar_cpf(cpf):
+    """
+    Só os dígitos do CPF (ou '' se não houver).
+    """
+    return re.sub(r'\D', '', cpf or '')
+
+
+def pontuar(registro_a, registro_b, limiar=0.0):
+    """
+    Pontuação ponderada (0 a 1) de um par de registros. Retorna
+    (pontuação, similaridades de cada critério).
+    Os critérios baratos (CPF e data) são calculados primeiro: se nem com
+    similaridade máxima nos restantes o par alcançaria o limiar, os nomes não
+    são comparados e a pontuação retornada é esse limite (abaixo do limiar).
+    """
+    similaridades = {
+        'cpf': (
+            float(registro_a.cpf == registro_b.cpf)
+            if registro_a.cpf and registro_b.cpf else None
+        ),
+        'data': similaridade_data(registro_a.data, registro_b.data),
+    }
+    
+    # CPFs diferentes são evidência forte de pessoas diferentes
+    fator = 0.5 if similaridades['cpf'] == 0.0 else 1.0
+    
+    def pontuacao(pendentes=()):
+        # Critérios pendentes entram com similaridade máxima (limite superior)
+        pesos = {
+            criterio: PESOS[criterio] for criterio, valor in similaridades.items()
+            if valor is not None
+        }
+        pesos.update({criterio: PESOS[criterio] for criterio in pendentes})
+        if not pesos:
+            return 0.0
+        total = sum(similaridades.get(criterio, 1.0) * peso for criterio, peso in pesos.items())
+        return fator * total / sum(pesos.values())
+    
+    for criterio, campo, pendentes in (('nome', 'nome', ('nome', 'mae')), ('mae', 'mae', ('mae',))):
+        limite = pontuacao(pendentes)
+        if limite < limiar:
+            return limite, similaridades
+        similaridades[criterio] = similaridade_nome(getattr(registro_a, campo), getattr(registro_b, campo))
+        
+        # Primeiros nomes diferentes também (ex.: irmãos, com a mesma mãe e
+        # os mesmos sobrenomes), a menos que o CPF confirme a mesma pessoa
+        if criterio == 'nome' and similaridades['cpf'] != 1.0:
+            primeiro_nome = similaridade_primeiro_nome(registro_a.nome, registro_b.nome)
+            if primeiro_nome is not None and primeiro_nome < MINIMO_PRIMEIRO_NOME:
+                fator *= 0.5
+    
+    return pontuacao(), similaridades
+
+
+def chaves_de_bloco(registro):
+    """
+    Chaves de bloco de um registro (ver docstring do módulo).
+    """
+    palavras = registro.nome.split()
+    if not palavras or not registro.data:
+        return []
+    ano = registro.data.year
+    chaves = {('primeiro', ano, chave_fonetica(palavras[0]))}
+    if len(palavras) > 1:
+        chaves.add(('ultimo', ano, chave_fonetica(palavras[-1])))
+    return chaves
+
+
+def pares_do_bloco(registros):
+    """
+    Pares a comparar dentro de um bloco: todos, ou vizinhança ordenada para
+    blocos grandes.
+    """
+    if len(registros) <= TAMANHO_MAXIMO_BLOCO:
+        yield from combinations(registros, 2)
+        return
+    registros = sorted(registros, key=lambda registro: (registro.nome, registro.mae))
+    for posicao, registro in enumerate(registros):
+        for vizinho in registros[posicao + 1:posicao + 1 + JANELA_VIZINHANCA]:
+            yield registro, vizinho
+
+
+def _registro(id_paciente, nome, mae, data, cpf):
+    return Registro(id_paciente, nome, mae, data, normalizar_cpf(cpf))
+
+
+def iterar_anos():
+    """
+    Percorre os pacientes agrupados por ano de nascimento, em ordem, sem
+    carregar a tabela inteira: a memória usada é a do maior ano.
+    """
+    pacientes = Paciente.objects.order_by('data_nascimento', 'id').values_list(
+        'id', 'nome_paciente_normalizado', 'nome_mae_normalizado', 'data_nascimento', 'cpf'
+    ).iterator(chunk_size=TAMANHO_LOTE)
+    registros = (_registro(*linha) for linha in pacientes)
+    for ano, grupo in groupby(registros, key=lambda registro: registro.data.year if registro.data else None):
+        yield ano, list(grupo)
+
+
+def pares_por_cpf():
+    """
+    Pares de pacientes com o mesmo CPF, em qualquer ano de nascimento.
+    """
+    repetidos = (
+        Paciente.objects.exclude(cpf__isnull=True).exclude(cpf='')
+        .values('cpf').annotate(total=Count('id')).filter(total__gt=1)
+        .values_list('cpf', flat=True)
+    )
+    pacientes = Paciente.objects.filter(cpf__in=repetidos).order_by('cpf', 'id').values_list(
+        'id', 'nome_paciente_normalizado', 'nome_mae_normalizado', 'data_nascimento', 'cpf'
+    )
+    for _, grupo in groupby(pacientes.iterator(chunk_size=TAMANHO_LOTE), key=lambda linha: linha[4]):
+        yield from pares_do_bloco([_registro(*linha) for linha in grupo])
+
+
+def encontrar_candidatos(limiar=LIMIAR_PADRAO):
+    """
+    Gera (registro_a, registro_b, pontuação, similaridades) para cada par de
+    pacientes com pontuação >= limiar. Cada par é comparado uma única vez.
+    """
+    comparados = set()
+    
+    def avaliar(pares):
+        for registro_a, registro_b in pares:
+            par = (min(registro_a.id, registro_b.id), max(registro_a.id, registro_b.id))
+            if par in comparados:
+                continue
+            comparados.add(par)
+            pontuacao, similaridades = pontuar(registro_a, registro_b, limiar)
+            if pontuacao >= limiar:
+                yield registro_a, registro_b, pontuacao, similaridades
+    
+    for _, registros in iterar_anos():
+        blocos = {}
+        for registro in registros:
+            for chave in chaves_de_bloco(registro):
+                blocos.setdefault(chave, []).append(registro)
+        for bloco in blocos.values():
+            yield from avaliar(pares_do_bloco(bloco))
+        # Os blocos não cruzam anos: os pares deste ano já podem sair da memória
+        comparados.clear()
+    
+    # Pares com o mesmo CPF que não caíram em nenhum bloco em comum
+    yield from avaliar(
+        (registro_a, registro_b) for registro_a, registro_b in pares_por_cpf()
+        if not set(chaves_de_bloco(registro_a)) & set(chaves_de_bloco(registro_b))
+    )
+
+
+def gravar_candidatos(limiar=LIMIAR_PADRAO, progresso=None):
+    """
+    Roda a vinculação e grava os pares encontrados como CandidatoDuplicata
+    (pendentes). Pares já registrados, inclusive os descartados na revisão,
+    não são recriados. Retorna a quantidade de pares encontrados.
+    """
+    total = 0
+    lote = []
+    
+    def gravar():
+        CandidatoDuplicata.objects.bulk_create(lote, ignore_conflicts=True)
+        lote.clear()
+        if progresso:
+            progresso(total)
+    
+    for registro_a, registro_b, pontuacao, similaridades in encontrar_candidatos(limiar):
+        paciente_id, duplicata_id = sorted((registro_a.id, registro_b.id))
+        lote.append(CandidatoDuplicata(
+            paciente_id=paciente_id,
+            duplicata_id=duplicata_id,
+            pontuacao=round(pontuacao, 4),
+            similaridade_nome=similaridades['nome'],
+            similaridade_mae=similaridades['mae'],
+            similaridade_data=similaridades['data'],
+            cpf_igual=None if similaridades['cpf'] is None else bool(similaridades['cpf']),
+        ))
+        total += 1
+        if len(lote) >= TAMANHO_LOTE:
+            gravar()
+    
+    if lote:
+        gravar()
+    
+    return total
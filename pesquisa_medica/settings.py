@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -74,6 +75,34 @@ WSGI_APPLICATION = 'pesquisa_medica.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Perfil de produção do SQLite (ver pesquisa_medica/sqlite/base.py), ativado
+# com a variável de ambiente SQLITE_PERFIL_PRODUCAO=1 (em desenvolvimento e nos
+# testes fica a configuração padrão do Django):
+# - WAL: leituras (ex.: lista de pacientes) não esperam a importação que
+#   está escrevendo, e a escrita não espera as leituras
+# - synchronous=NORMAL: com WAL, não corrompe o banco em queda de energia
+#   (só pode perder as últimas transações)
+# - busy_timeout: escritas concorrentes (vários workers) esperam o lock
+#   em vez de falhar com "database is locked"
+# - BEGIN IMMEDIATE: ver o docstring do backend
+# - CONN_MAX_AGE: a conexão (e os PRAGMAs) é reaproveitada entre requisições
+
+SQLITE_PERFIL_PRODUCAO = {
+    'ENGINE': 'pesquisa_medica.sqlite',
+    'CONN_MAX_AGE': 600,
+    'CONN_HEALTH_CHECKS': True,
+    'OPTIONS': {
+        'transaction_mode': 'IMMEDIATE',
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 30000,  # ms
+            'mmap_size': 256 * 1024 * 1024,  # bytes
+            'cache_size': -64 * 1024,  # negativo = KiB (64 MB)
+        },
+    },
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -81,6 +110,21 @@ DATABASES = {
     }
 }
 
+if os.environ.get('SQLITE_PERFIL_PRODUCAO') == '1':
+    DATABASES['default'].update(SQLITE_PERFIL_PRODUCAO)
+
+
+# Cache
+# Compartilhado entre os processos web e o worker de importação
+# (usado pelas estatísticas do dashboard)
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / '.cache',
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -118,6 +162,11 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Uploaded files (planilhas aguardando importação)
+
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,36 @@
+"""
+Backend SQLite do projeto: o backend padrão do Django com o perfil de
+produção aplicado a cada conexão nova, configurado em DATABASES[...]['OPTIONS']:
+- 'pragmas': PRAGMAs executados ao abrir a conexão (journal_mode=WAL,
+  synchronous, busy_timeout, mmap_size, cache_size...)
+- 'transaction_mode': modo do BEGIN das transações (ex.: 'IMMEDIATE')
+
+Com BEGIN IMMEDIATE a transação pega o lock de escrita logo no início e,
+se ele estiver ocupado, espera o busy_timeout. Com o BEGIN padrão
+(DEFERRED), uma transação que lê e depois escreve (como os lotes da
+importação) recebe "database is locked" na hora, sem esperar, quando outra
+conexão escreveu no meio do caminho.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        parametros = super().get_connection_params()
+        # Opções deste backend, que não são parâmetros do sqlite3.connect
+        parametros.pop('pragmas', None)
+        parametros.pop('transaction_mode', None)
+        return parametros
+    
+    def get_new_connection(self, conn_params):
+        conexao = super().get_new_connection(conn_params)
+        for nome, valor in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conexao.execute(f'PRAGMA {nome} = {valor}')
+        return conexao
+    
+    def _start_transaction_under_autocommit(self):
+        modo = self.settings_dict['OPTIONS'].get('transaction_mode')
+        if modo:
+            self.cursor().execute(f'BEGIN {modo}')
+        else:
+            super()._start_transaction_under_autocommit()